@@ -0,0 +1,297 @@
+# ---------------------------------------------------------
+# Benchmark suite: scoring, strategy decisions, full rounds
+# and the cost of importing the core in a fresh process.
+#
+# Every benchmark uses fixed seeds, so two runs time exactly
+# the same work. Results are saved as JSON and can be compared
+# against a stored baseline to flag regressions. Timings only
+# compare on the same machine, so no baseline is committed:
+# save one first, and a check without one fails.
+#
+#   python benchmarks.py --output bench.json
+#   python benchmarks.py --save-baseline
+#   python benchmarks.py --baseline ../data/benchmark_baseline.json
+# ---------------------------------------------------------
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from strategies import *
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "benchmark_baseline.json")
+
+# Monte Carlo strategies search for as long as their time budget allows, which would only time the budget.
+# They are timed on a fixed number of sampled worlds per decision instead, over fewer calls.
+MONTE_CARLO_SAMPLES = 20
+MONTE_CARLO_CALLS = 20
+
+# (knock, pile, discard) used by both players
+PAIRINGS = {"conservative": ("Knock at 25", "Pile if Completes", "Discard Highest Useless"),
+            "near runs and sets": ("Knock at 25", "Turn 4 Near Runs and Sets Draw From Pile",
+                                   "Turn 4 Near Runs and Sets Discard"),
+            "min deadwood": ("Knock at 25", "Pile if Lowers Deadwood", "Discard Min Deadwood")}
+
+
+def timed(function, calls, repeat = 3):
+    """
+    Call function(i) for i in range(calls), repeat times, and return the best seconds per call.
+    Like timeit, the garbage collector is paused while timing so that earlier benchmarks' garbage
+    does not get billed to this one.
+    """
+    best = None
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for i in range(calls):
+                function(i)
+            elapsed = (time.perf_counter() - start) / calls
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        gc.enable()
+    return best
+
+
+def make_hands(n, size, seed, dense = False):
+    """
+    Deal n hands of the given size with a fixed seed.
+    Dense hands are drawn only from the ranks 3 - 7, so nearly every card fits several runs and sets,
+    which is the worst case for the scorer.
+    """
+    rng = random.Random(seed)
+    if dense:
+        pool = [c for c in CARD_TEMPLATE if c.rank in "34567"]
+    else:
+        pool = CARD_TEMPLATE
+    hands = []
+    for _ in range(n):
+        hand = Hand(rng)
+        hand.add_cards(rng.sample(pool, size))
+        hands.append(hand)
+    return hands
+
+
+def make_states(n, size, seed):
+    """Deal n mid-round positions: a hand of the given size, the rest of the deck, a pile and a turn number."""
+    rng = random.Random(seed)
+    states = []
+    for _ in range(n):
+        deck = Deck(rng)
+        hand = Hand(rng)
+        hand.add_cards(deck.draw(size))
+        pile = Pile()
+        pile.add_cards(deck.draw(rng.randint(1, 8)))
+        states.append((hand, deck, pile, rng.randint(1, 12)))
+    return states
+
+
+def bench_scoring(scale):
+    """Time the deadwood search behind Hand.score (without the cache), on random and on meld-dense hands."""
+    results = {}
+    n = 2000 * scale
+    for name, size, dense in [("score 9 cards", 9, False), ("score 10 cards", 10, False),
+                              ("score 9 dense cards", 9, True), ("score 10 dense cards", 10, True)]:
+        hands = make_hands(n, size, seed = size * 100 + dense, dense = dense)
+        # Time the scorer itself: the hands' TurnContexts are built before timing starts
+        for hand in hands:
+            hand.context()
+        results[name] = {"seconds_per_call": timed(lambda i: deadwood(hands[i].context().masks), n), "calls": n}
+    import numpy as np
+    index_hands = np.argsort(np.random.default_rng(9).random((20000 * scale, 52)), axis = 1)[:, :9]
+    results["score_many 9 cards"] = {"seconds_per_call": timed(lambda i: score_many(index_hands), 1) / len(index_hands),
+                                     "calls": len(index_hands)}
+    return results
+
+
+def bench_strategies(scale):
+    """Time one decision of every registered strategy (see StrategyRegistry.decision_names), on a fresh hand every call."""
+    results = {}
+    strategy_dict = make_strategy_dict()
+    for kind, size in [("knock", 9), ("pile", 9), ("discard", 10)]:
+        for name in strategy_dict.decision_names(kind):
+            strategy = strategy_dict[name]
+            n = 1000 * scale
+            if isinstance(strategy, MonteCarloStrategy):
+                strategy = MonteCarloStrategy(kind, time_budget = None, max_samples = MONTE_CARLO_SAMPLES)
+                n = MONTE_CARLO_CALLS * scale
+            per_call = []
+            # Fresh states for every repeat: a second pass would find every hand's TurnContext already built
+            for _ in range(3):
+                states = make_states(n, size, seed = 42)
+                SCORE_CACHE.clear()
+                per_call.append(timed(lambda i: strategy(states[i][0], states[i][1], states[i][2], False, states[i][3]),
+                                      n, repeat = 1))
+            results[kind + ": " + name] = {"seconds_per_call": min(per_call), "calls": n}
+    return results
+
+
+def new_game(pairing, total_rounds, seed):
+    knock, pile, discard = PAIRINGS[pairing]
+    return Game(player_names = ["Bailey", "Dan"], strategy_dict = make_strategy_dict(),
+                knock_strategies = [knock, knock], pile_strategies = [pile, pile],
+                discard_strategies = [discard, discard], target_score = None,
+                total_rounds = total_rounds, random_seed = seed, save_results = False)
+
+
+def bench_rounds(scale):
+    """Time Game.play_round for the common pairings, and a whole 500 round game."""
+    results = {}
+    n = 200 * scale
+    for pairing in PAIRINGS:
+        per_round = []
+        # A new game with the same seed for every repeat, so each repeat plays the same rounds
+        for _ in range(3):
+            game = new_game(pairing, n, seed = 7)
+            SCORE_CACHE.clear()
+            per_round.append(timed(game.play_round, n, repeat = 1))
+        results["round: " + pairing] = {"seconds_per_call": min(per_round), "calls": n}
+    game = new_game("conservative", 500, seed = 500)
+    SCORE_CACHE.clear()
+    start = time.perf_counter()
+    game.play_game()
+    elapsed = time.perf_counter() - start
+    results["game: 500 rounds"] = {"seconds_per_call": elapsed, "calls": 1, "rounds_per_second": 500 / elapsed}
+    return results
+
+
+# What a worker process (or a bot server) imports to play, and the heavy libraries it must not pull in
+CORE_MODULES = ["scoring", "gameLogic", "strategies", "stopping", "tournament", "server"]
+HEAVY_MODULES = ["numpy", "pandas", "numba"]
+
+_IMPORT_PROBE = """
+import json, sys, time
+try:
+    import resource
+    def peak_mb():
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+except ImportError:
+    def peak_mb():
+        return None
+before = peak_mb()
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+seconds = time.perf_counter() - start
+after = peak_mb()
+print(json.dumps({{"seconds": seconds, "rss_mb": None if after is None else after - before,
+                  "heavy_modules": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(modules = CORE_MODULES):
+    
+    '''
+    Import modules in a fresh interpreter, and return how long it took (seconds), how much it grew the
+    peak resident set (rss_mb, None where the resource module is missing) and which HEAVY_MODULES came with them.
+    '''
+    
+    code = _IMPORT_PROBE.format(modules = list(modules), heavy = HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], cwd = os.path.dirname(os.path.abspath(__file__)),
+                            capture_output = True, text = True, check = True).stdout
+    return json.loads(output)
+
+
+def bench_imports(scale):
+    """Time importing the core modules in a fresh process (the best of a few, as disk caches warm up)."""
+    runs = [measure_import() for _ in range(3 * scale)]
+    best = min(runs, key = lambda run: run["seconds"])
+    return {"import: core modules": {"seconds_per_call": best["seconds"], "calls": 1, "rss_mb": best["rss_mb"],
+                                     "heavy_modules": best["heavy_modules"]}}
+
+
+def run_benchmarks(scale = 1, kernels = False):
+    """
+    Run every benchmark and return the machine readable report.
+    With kernels, scoring uses the compiled kernels if Numba is installed (see kernels.py).
+    """
+    backend = "python"
+    if kernels:
+        from kernels import install_kernels, uninstall_kernels
+        backend = install_kernels()
+    results = {}
+    try:
+        for bench in [bench_scoring, bench_strategies, bench_rounds, bench_imports]:
+            results.update(bench(scale))
+    finally:
+        if kernels:
+            uninstall_kernels()
+    return {"timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": sys.version.split()[0], "machine": platform.platform(),
+            "processor": platform.processor(), "scale": scale, "kernels": backend, "results": results}
+
+
+def find_regressions(report, baseline, tolerance):
+    """
+    Return the benchmarks that got slower than the baseline by more than tolerance
+    (a fraction, e.g. 0.25 for 25%), as a list of (name, baseline seconds, current seconds).
+    """
+    regressions = []
+    for name, current in report["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        if current["seconds_per_call"] > previous["seconds_per_call"] * (1 + tolerance):
+            regressions.append((name, previous["seconds_per_call"], current["seconds_per_call"]))
+    return regressions
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmark scoring, strategies and rounds.")
+    parser.add_argument("--output", help = "Write the results as JSON to this file.")
+    parser.add_argument("--baseline", default = DEFAULT_BASELINE, help = "Baseline JSON to compare against.")
+    parser.add_argument("--save-baseline", action = "store_true", help = "Store these results as the new baseline.")
+    parser.add_argument("--tolerance", type = float, default = 0.25,
+                        help = "Slowdown (as a fraction) allowed before a benchmark counts as a regression.")
+    parser.add_argument("--scale", type = int, default = 1, help = "Multiply the number of calls timed.")
+    parser.add_argument("--kernels", action = "store_true",
+                        help = "Score with the compiled kernels, if Numba is installed (see kernels.py).")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.scale, args.kernels)
+    print("Scoring backend:", report["kernels"])
+    for name, result in report["results"].items():
+        print("{:<60} {:>12.2f} us".format(name, result["seconds_per_call"] * 1e6))
+    print("{:<60} {:>12.1f}".format("rounds per second (500 round game)",
+                                    report["results"]["game: 500 rounds"]["rounds_per_second"]))
+    imports = report["results"]["import: core modules"]
+    print("{:<60} {:>12}".format("core import resident set growth (MB)",
+                                 "n/a" if imports["rss_mb"] is None else round(imports["rss_mb"], 1)))
+    if imports["heavy_modules"]:
+        print("WARNING: the core imports", ", ".join(imports["heavy_modules"]))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent = 2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent = 2)
+        print("Saved baseline to", args.baseline)
+        return 0
+    if not os.path.exists(args.baseline):
+        # Baselines are machine specific, so none is stored with the code: make one with --save-baseline
+        print("ERROR: no baseline at", args.baseline + ", so nothing was checked for regressions. "
+              "Run with --save-baseline first.", file = sys.stderr)
+        return 2
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("machine") != report["machine"]:
+        print("WARNING: the baseline was measured on a different platform, so timings may not be comparable")
+    regressions = find_regressions(report, baseline, args.tolerance)
+    for name, before, after in regressions:
+        print("REGRESSION:", name, "went from", round(before * 1e6, 2), "us to", round(after * 1e6, 2), "us")
+    if regressions:
+        return 1
+    print("No regressions against", args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
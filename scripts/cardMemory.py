@@ -0,0 +1,116 @@
+# ---------------------------------------------------------
+# Perfect recall for a player: which cards have they seen?
+#
+# Each player's CardMemory keeps three sets of cards as 52 bit
+# masks (bit i is the card with index i, see Card.index):
+#   seen:           every card the player has held or seen
+#                   discarded. The rest are in the deck or
+#                   hidden in an opponent's hand.
+#   pile:           the cards in the discard pile right now.
+#   opponent_known: cards an opponent took from the pile and
+#                   still holds.
+# Game.play_round updates every player's memory after each
+# turn, a handful of bit operations regardless of how long
+# the pile is. Strategies read it from hand.memory.
+# ---------------------------------------------------------
+
+from scoring import NUM_RANKS, run_members, run_outs, ranks_held
+
+FULL_DECK_MASK = (1 << 52) - 1
+
+
+def deck_mask(masks):
+    """Join four 13-bit suit masks into one 52 bit mask."""
+    return masks[0] | masks[1] << NUM_RANKS | masks[2] << 2 * NUM_RANKS | masks[3] << 3 * NUM_RANKS
+
+
+def meld_outs(masks):
+    """
+    Return, as a 52 bit mask, every card missing from the hand (four suit masks) that would complete
+    a new run or set with it.
+    """
+    pairs = ranks_held(masks, 2)
+    outs = 0
+    for s in range(4):
+        outs |= (run_outs(masks[s]) | pairs & ~masks[s]) << s * NUM_RANKS
+    return outs
+
+
+def card_outs(masks, index):
+    """
+    Return, as a 52 bit mask, the cards missing from the hand (four suit masks) that would complete a run or
+    set including the hand's card index.
+    """
+    s, r = index // NUM_RANKS, index % NUM_RANKS
+    mask = masks[s]
+    outs = 0
+    for x in range(max(r - 2, 0), min(r + 3, NUM_RANKS)):
+        if not mask >> x & 1 and run_members(mask | 1 << x) >> r & 1:
+            outs |= 1 << (s * NUM_RANKS + x)
+    if sum(m >> r & 1 for m in masks) >= 2:
+        for t in range(4):
+            if not masks[t] >> r & 1:
+                outs |= 1 << (t * NUM_RANKS + r)
+    return outs
+
+
+class CardMemory:
+    """
+    What one player knows about where the cards are (see the module notes).
+    Every update is a constant number of bit operations.
+    """
+
+    def __init__(self):
+        self.seen = 0
+        self.pile = 0
+        self.opponent_known = 0
+
+    @classmethod
+    def from_view(cls, hand, pile):
+        """A memory of only what is in view now: the hand and the discard pile (for strategies used outside a Game)."""
+        memory = cls()
+        memory.saw_hand(hand.cards)
+        for card in pile.cards:
+            memory.seen |= 1 << card.index
+            memory.pile |= 1 << card.index
+        return memory
+
+    def saw_hand(self, cards):
+        """Remember the cards dealt to this player."""
+        for card in cards:
+            self.seen |= 1 << card.index
+
+    def saw_turn(self, mine, drawn, from_pile, discarded):
+        """
+        Remember a turn. mine: was it this player's turn? drawn: the Card drawn (only seen by the others if it
+        came from the pile). discarded: the Card thrown on the pile, or None.
+        """
+        bit = 1 << drawn.index
+        if from_pile:
+            self.pile &= ~bit
+            if not mine:
+                self.opponent_known |= bit
+        elif mine:
+            self.seen |= bit
+        if discarded is not None:
+            bit = 1 << discarded.index
+            self.seen |= bit
+            self.pile |= bit
+            if not mine:
+                self.opponent_known &= ~bit
+
+    def unseen(self):
+        """The cards this player has never seen: those left in the deck or hidden in an opponent's hand."""
+        return FULL_DECK_MASK & ~self.seen
+
+    def live_outs(self, masks):
+        """The unseen cards that would complete a new run or set with the hand (four suit masks)."""
+        return meld_outs(masks) & ~self.seen
+
+    def count_live_outs(self, masks):
+        """How many unseen cards would complete a new run or set with the hand."""
+        return self.live_outs(masks).bit_count()
+
+    def count_card_outs(self, masks, index):
+        """How many unseen cards would complete a run or set including the hand's card index."""
+        return (card_outs(masks, index) & ~self.seen).bit_count()
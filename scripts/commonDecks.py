@@ -0,0 +1,123 @@
+# ---------------------------------------------------------
+# Common random numbers: play matchups on shared deals.
+#
+# Every matchup of a paired tournament is dealt from the same
+# precomputed sequence of deck orders, and is played twice:
+# once as given and once with the players' seats swapped, so
+# each strategy gets both hands (and both seats) of every deal.
+# Deal luck then cancels out of the per-deal score differences,
+# so far fewer rounds separate two close strategies, and
+# differences between matchups are measured on the same deals.
+# ---------------------------------------------------------
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from gameLogic import make_rng
+from results import append_results
+from strategies import make_strategy_dict
+from tournament import cell_seed, make_game
+
+
+def deal_orders(num_deals, seed):
+    """
+    Shuffle num_deals decks from seed.
+    Returns a (num_deals, 52) array of card indices, top card first, for Game's deck_orders.
+    """
+    rng = make_rng(seed, "common decks")
+    orders = np.empty((num_deals, 52), dtype = np.uint8)
+    order = list(range(52))
+    for d in range(num_deals):
+        rng.shuffle(order)
+        orders[d] = order
+    return orders
+
+
+def swap_seats(matchup):
+    """The same matchup with player 0 and player 1 trading strategies (and so hands and seats)."""
+    swapped = dict(matchup)
+    for key in ["knock_strategies", "pile_strategies", "discard_strategies"]:
+        swapped[key] = list(reversed(matchup[key]))
+    swapped["extra_comments"] = (matchup.get("extra_comments", "") + " (seats swapped)").strip()
+    return swapped
+
+
+def play_both_seatings(matchup, strategy_factory = make_strategy_dict, player_names = ("Bailey", "Dan")):
+
+    '''
+    Play a 2 player matchup on its deck_orders as given and with the seats swapped.
+
+    Returns the result rows of both games and the paired difference of every deal: player 0's strategy's
+    score change minus player 1's strategy's, averaged over the two seatings.
+    '''
+
+    games = []
+    for cell in [matchup, swap_seats(matchup)]:
+        game = make_game(cell, strategy_factory, player_names)
+        game.play_game()
+        games.append(game)
+    as_given = np.diff(games[0].players[0].score) - np.diff(games[0].players[1].score)
+    swapped = np.diff(games[1].players[1].score) - np.diff(games[1].players[0].score)
+    return {"rows": [games[0].result_rows(), games[1].result_rows()],
+            "differences": (as_given + swapped) / 2}
+
+
+def paired_summary(differences):
+    """Return the mean paired difference per deal, its standard error and the number of deals."""
+    differences = np.asarray(differences, dtype = float)
+    n = len(differences)
+    return {"mean": float(differences.mean()), "standard_error": float(differences.std(ddof = 1) / np.sqrt(n)),
+            "deals": n}
+
+
+def run_paired_tournament(matchups, base_seed = 0, strategy_factory = make_strategy_dict,
+                          max_workers = None, data_path = None, verbose = False):
+
+    '''
+    Like tournament.run_tournament, but every matchup is dealt the same decks and is played in both seatings.
+
+    matchups: List of Dictionaries of 2 player matchups (see run_tournament). All of them play total_rounds
+              deals from one shared sequence of deck orders (any stopping_rule is ignored, so that every
+              matchup sees every deal). The random_seed of a matchup only seeds its players' own choices.
+    base_seed: Int. Seed of the shared decks and of the per cell seeds.
+    data_path: String. If entered, both seatings of every matchup are appended as their own sim_ids.
+
+    Returns a dictionary with, in matchup order, the result rows of both seatings, the paired differences
+    per deal and their summaries (see paired_summary), plus the total number of rounds played,
+    the elapsed seconds and the rounds per second.
+    '''
+
+    num_deals = max(matchup["total_rounds"] for matchup in matchups)
+    orders = deal_orders(num_deals, cell_seed(base_seed, "decks"))
+    cells = []
+    for index, matchup in enumerate(matchups):
+        cell = dict(matchup, target_score = None, stopping_rule = None,
+                    deck_orders = orders[:matchup["total_rounds"]])
+        if cell.get("random_seed") is None:
+            cell["random_seed"] = cell_seed(base_seed, index)
+        cells.append(cell)
+
+    start = time.perf_counter()
+    rows, differences, summaries = [], [], []
+    with ProcessPoolExecutor(max_workers = max_workers) as pool:
+        results = pool.map(play_both_seatings, cells, [strategy_factory] * len(cells))
+        for cell, result in zip(cells, results):
+            summary = paired_summary(result["differences"])
+            if verbose:
+                print(" v. ".join(cell["knock_strategies"]), "paired difference",
+                      round(summary["mean"], 2), "+/-", round(summary["standard_error"], 2))
+            if data_path is not None:
+                for game_rows in result["rows"]:
+                    sim_id = append_results(game_rows, data_path)
+                    for row in game_rows:
+                        row["sim_id"] = sim_id
+            rows.append(result["rows"])
+            differences.append(result["differences"])
+            summaries.append(summary)
+    elapsed = time.perf_counter() - start
+
+    total_rounds = 2 * sum(cell["total_rounds"] for cell in cells)
+    return {"rows": rows, "differences": differences, "summaries": summaries, "rounds": total_rounds,
+            "elapsed_seconds": elapsed, "rounds_per_second": total_rounds / elapsed if elapsed > 0 else float("inf")}
@@ -0,0 +1,155 @@
+# ---------------------------------------------------------
+# Compact binary log of every turn in a game.
+#
+# The file is a 16 byte header followed by fixed width 12 byte
+# records, one per turn, so it can be appended to while the
+# game runs and scanned later through a memory map without
+# re-simulating anything.
+# ---------------------------------------------------------
+
+import struct
+from observers import GameObserver
+
+MAGIC = b"9CARDLOG"
+VERSION = 1
+
+# magic, version, record size, number of players
+HEADER = struct.Struct("<8sHHI")
+
+# round, turn, player, draw source, discarded card index, deadwood after the turn, knocked
+RECORD = struct.Struct("<IHBBBHB")
+
+# Draw sources
+DRAW_DECK = 0
+DRAW_PILE = 1
+DRAW_NONE = 2 # the player knocked instead of drawing
+
+NO_DISCARD = 255
+
+# NumPy layout of one record, used when reading a log back
+EVENT_FIELDS = [("round", "<u4"), ("turn", "<u2"), ("player", "u1"), ("draw", "u1"),
+                ("discard", "u1"), ("deadwood", "<u2"), ("knocked", "u1")]
+
+
+class EventLog:
+    """
+    Writes one record per turn to a binary file.
+    
+    path: String. The file to write. It is overwritten.
+    num_players: Int. Number of players in the game, stored in the header.
+    buffer_bytes: Int. Records are buffered in memory and written once this many bytes are waiting.
+    """
+    
+    def __init__(self, path, num_players, buffer_bytes = 1 << 16):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, num_players))
+        self.buffer = bytearray()
+        self.buffer_bytes = buffer_bytes
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def record(self, round_number, turn, player, draw_source, discard_index, deadwood, knocked):
+        """Add one turn to the log. discard_index is a Card.index, or NO_DISCARD."""
+        self.buffer += RECORD.pack(round_number, turn, player, draw_source, discard_index, deadwood, knocked)
+        if len(self.buffer) >= self.buffer_bytes:
+            self.flush()
+    
+    def flush(self):
+        """Write any buffered records to the file."""
+        self.file.write(self.buffer)
+        self.buffer.clear()
+        self.file.flush()
+    
+    def close(self):
+        """Write any buffered records and close the file."""
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+class EventLogObserver(GameObserver):
+    """
+    Log every turn of a game to path (what Game(event_log_path = path) does).
+    The log is opened when the game starts and closed when it ends.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.log = None
+    
+    def on_game_start(self, game):
+        self.log = EventLog(self.path, game.num_players)
+    
+    def on_turn(self, game, round_number, turn, player_number):
+        player = game.players[player_number]
+        if player.drew_from_pile is None:
+            draw_source = DRAW_NONE
+        else:
+            draw_source = DRAW_PILE if player.drew_from_pile else DRAW_DECK
+        discard_index = NO_DISCARD if player.last_discard is None else player.last_discard.index
+        self.log.record(round_number, turn, player_number, draw_source, discard_index,
+                        player.hand.score(), player.knocked)
+    
+    def on_game_end(self, game):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+
+def read_header(path):
+    """Return (version, record size, number of players) from a log's header."""
+    with open(path, "rb") as f:
+        magic, version, record_size, num_players = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(path + " is not a Nine Card event log")
+    if version != VERSION or record_size != RECORD.size:
+        raise ValueError(path + " was written by an unsupported event log version")
+    return version, record_size, num_players
+
+
+def read_events(path):
+    """
+    Return every record of a log as a NumPy structured array (fields in EVENT_FIELDS).
+    The array is memory mapped, so even very long logs are not loaded into memory.
+    """
+    import numpy as np
+    import os
+    read_header(path)
+    dtype = np.dtype(EVENT_FIELDS)
+    if os.path.getsize(path) == HEADER.size:
+        return np.zeros(0, dtype = dtype)
+    return np.memmap(path, dtype = dtype, mode = "r", offset = HEADER.size)
+
+
+def turn_score_table(path, player = 0):
+    """
+    Rebuild the score-by-turn table of the 'turn score calculator' mode from a log.
+    
+    For each of the player's own turns (0 = their first turn of the round), summarizes the deadwood
+    they held after the turns on which they did not knock.
+    
+    Returns a dictionary of NumPy arrays: turn, mean, std, min, max and count.
+    """
+    import numpy as np
+    _, _, num_players = read_header(path)
+    events = read_events(path)
+    events = events[(events["player"] == player) & (events["knocked"] == 0)]
+    player_turn = (events["turn"].astype(np.int64) - 1) // num_players
+    deadwood = events["deadwood"].astype(np.float64)
+    turns = np.unique(player_turn)
+    table = {"turn": turns, "mean": [], "std": [], "min": [], "max": [], "count": []}
+    for t in turns:
+        d = deadwood[player_turn == t]
+        table["mean"].append(d.mean())
+        table["std"].append(d.std(ddof = 1) if len(d) > 1 else np.nan)
+        table["min"].append(d.min())
+        table["max"].append(d.max())
+        table["count"].append(len(d))
+    for key in ["mean", "std", "min", "max", "count"]:
+        table[key] = np.array(table[key])
+    return table
@@ -3,15 +3,40 @@
 # ---------------------------------------------------------
 
 import random
+import hashlib
+import json
 from scoring import *
-# Ideally we can remove this import. 
-# It's only used for setting the seed which is later used by the strategy functions
-import numpy as np
-import pandas as pd # :(
+from scoring import _set_splits
+# The core only imports the standard library, so workers start fast and small (see test_imports.py)
+from results import append_results, append_profile, stored_sim_id
+from eventLog import EventLogObserver
+from observers import VerbosePrinter, TurnScoreCollector
+from instrumentation import GameProfiler
+from cardMemory import CardMemory
+import time
 import os
 import sys
 from datetime import datetime, timedelta
 
+def _rng_state(state):
+    """A random.Random state read back from JSON (where its tuples became lists)."""
+    version, internal, gauss_next = state
+    return (version, tuple(internal), gauss_next)
+
+
+def make_rng(seed, *stream):
+    """
+    Return an independent random.Random for one stream of a seeded run, e.g. make_rng(seed, "deck").
+    The same seed and stream always give the same sequence, and different streams are unrelated,
+    so games (and the players within a game) never share or disturb each other's randomness.
+    If seed is None, the generator is seeded from fresh entropy.
+    """
+    if seed is None:
+        return random.Random()
+    material = repr((seed,) + tuple(stream)).encode()
+    return random.Random(int.from_bytes(hashlib.sha256(material).digest(), "big"))
+
+
 class Card:
     """
     Defines a card.
@@ -21,6 +46,7 @@ class Card:
     suit: String. Either C, H, S, D.
     value: Int. Value of the card. 1 - 10
     numeric_rank: Int. Order of the card, going from A = 1 to K = 13.
+    index: Int. Position of the card in the scoring engine's bitmasks, 0 - 51 (see scoring.CARD_INDEX).
     """
     
     def __init__(self, rank, suit):
@@ -36,6 +62,7 @@ class Card:
         else:
             self.value = int(rank)
             self.numeric_rank = int(rank)
+        self.index = CARD_INDEX[(rank, suit)]
             
     def __repr__(self):
         """Representation is of the form: 6 of S or Q of H."""
@@ -48,6 +75,14 @@ class Card:
         else:
             return self.rank == other.rank and self.suit == other.suit
 
+# One Card object per card, shared by every deck. Position i holds the card with index i.
+CARD_TEMPLATE = [None] * 52
+for _suit in suits:
+    for _rank in ranks:
+        _card = Card(_rank, _suit)
+        CARD_TEMPLATE[_card.index] = _card
+del _suit, _rank, _card
+
 class CardCollection:
     """
     An arbitrary collection of cards
@@ -99,27 +134,52 @@ class Deck(CardCollection):
 
     We can denote these face cards as 11, 12, 13 as those are their inherent ordering, and then we calculating 
     total points at the end, we can map 11, 12, 13 all to 10.
+    
+    The deck is a shuffled order of card indices over the shared CARD_TEMPLATE, plus a cursor 
+    pointing at the next card to draw, so drawing never copies the rest of the deck.
+    
+    rng: random.Random (or the random module, the default). Source of the shuffle.
+    order: Sequence of 52 card indices. If entered, the deck is stacked in this order (top card first)
+                                        instead of being shuffled.
     '''
-    def __init__(self):
-        super().__init__()
-        SUITS = ['C','D','H','S'] 
-        RANKS = ['A','2','3','4','5','6','7','8','9','T','J','Q','K']
-        for rank in RANKS:
-            for suit in SUITS:
-                self.cards.append(Card(rank, suit))
-                
-        # Randomize the order of the cards
-        self.cards = self.shuffle()
+    def __init__(self, rng = None, order = None):
+        self.rng = rng if rng is not None else random
+        self.position = 0
+        if order is not None:
+            self.order = [int(i) for i in order]
+        else:
+            self.order = list(range(52))
+            # Randomize the order of the cards
+            self.shuffle()
+    
+    @property
+    def cards(self):
+        """The cards left in the deck, top card first."""
+        return [CARD_TEMPLATE[i] for i in self.order[self.position:]]
+    
+    def add_cards(self, new_cards):
+        """A deck only deals cards: its order is fixed when it is made (see draw)."""
+        raise TypeError("Cards cannot be added to a Deck, make a new Deck with the order wanted")
+    
+    def remove_cards(self, cards_to_remove):
+        """A deck only deals cards from the top: use draw."""
+        raise TypeError("Cards cannot be removed from the middle of a Deck, use draw")
+    
+    def length(self):
+        """Return the number of cards left in the deck."""
+        return 52 - self.position
     
     def draw(self, n = 1):
         """Take off and return a list of the top n cards on the deck."""
-        drawn_cards = self.cards[:n]
-        self.cards = self.cards[n:]
+        drawn_cards = [CARD_TEMPLATE[i] for i in self.order[self.position:self.position + n]]
+        self.position = min(self.position + n, 52)
         return(drawn_cards)
         
     def shuffle(self):
-        """Randomize the order of the cards."""
-        self.cards = random.sample(self.cards, 52)
+        """Randomize the order of the cards left in the deck."""
+        remaining = self.order[self.position:]
+        self.rng.shuffle(remaining)
+        self.order[self.position:] = remaining
         return(self.cards)
 
 class Hand(CardCollection):
@@ -127,8 +187,34 @@ class Hand(CardCollection):
     This abstraction will be used for the player's hand. Will have 9 or 10 cards at any point.
     """
     
-    def __init__(self):
+    def __init__(self, rng = None):
         super().__init__()
+        self._context = None
+        # Strategies use this for their random tie-breaks, see Player
+        self.rng = rng if rng is not None else random
+        # Cards this hand has taken from the pile (the rest of pile.draws were the other players')
+        self.pile_draws = 0
+        # What the player holding this hand remembers seeing this round (a CardMemory, set by Player)
+        self.memory = None
+    
+    def add_cards(self, new_cards):
+        """Add either a card or a list of cards to the hand, invalidating its TurnContext."""
+        super().add_cards(new_cards)
+        self._context = None
+    
+    def remove_cards(self, cards_to_remove):
+        """Remove these cards from the hand, invalidating its TurnContext."""
+        super().remove_cards(cards_to_remove)
+        self._context = None
+    
+    def context(self):
+        """
+        Return the TurnContext describing the hand as it is right now.
+        It is built on first use and shared by every caller until the hand changes.
+        """
+        if self._context is None:
+            self._context = TurnContext(self.cards)
+        return self._context
         
     def score_basic(self):
         """Return the current score of the hand, without removing anything for runs or sets."""
@@ -147,15 +233,92 @@ class Hand(CardCollection):
         and forfeit the points for 4D and 4C (a total of 8 points). If you had chosen to stick with the three of a kind
         of fours, you would have to forfeit 5S and 6S (a total of 11 points).
 
+        Scores are memoized in the process-wide scoring.SCORE_CACHE (see set_score_cache_size).
         '''
         
-        hand_boof, suitStarts, sz = give_me_handBoof_suitStarts_and_sz(self) #creates 3 inputs to scoring algorithm
+        return self.context().score()
+    
+    def melds(self):
+        """
+        Return the runs and sets used to achieve the hand's score, 
+        as a list of melds where each meld is a list of Card objects from this hand.
+        """
+        _, melds = deadwood_and_melds(self.context().masks)
+        cards_by_name = {(c.rank, c.suit): c for c in self.cards}
+        return [[cards_by_name[(rank, suit)] for rank, suit in meld] for meld in melds]
+    
+    def deadwood_without_each(self):
+        """
+        Return the score of the hand after discarding each of its cards,
+        as a list in the same order as self.cards. All the candidates are scored in one pass.
+        """
+        after_discard = deadwood_without_each(self.context().masks)
+        return [after_discard[c.index] for c in self.cards]
+    
+    def deadwood_with(self, card):
+        """
+        Return the score the hand would have after adding card to it.
+        Reuses the hand's set enumeration (see TurnContext.set_splits), so trying several cards costs little more than one.
+        """
+        context = self.context()
+        return deadwood_with(context.masks, card.index, context.set_splits())
+
 
-        maxScore = F(sz, hand_boof, suitStarts) 
-        totalScore = sum([c.value for c in self.cards])
-        finalScore = totalScore - maxScore
+class TurnContext:
+    """
+    Features of a hand that the knock, draw and discard strategies all need.
+    Computed once from the hand's bitmasks and shared until the hand changes (see Hand.context).
+    
+    masks: List of Ints. The hand as four 13-bit suit masks (see scoring.hand_masks).
+    suits: List of Ints. Suit index (0 - 3, in scoring.suits order) of each card, in hand order.
+    ranks: List of Ints. Rank index (0 = A to 12 = K) of each card, in hand order.
+    values: List of Ints. Value of each card, in hand order.
+    in_run: List of Booleans. Is the card part of three or more consecutive cards in its suit?
+    in_set: List of Booleans. Does the hand hold the card's rank in three or more suits?
+    in_meld: List of Booleans. Is the card in a run or a set? (not necessarily both at once in the optimal melds)
+    near_meld: List of Booleans. Does the hand hold another card of the same rank, 
+               or of the next or previous rank in the same suit?
+    """
+    
+    def __init__(self, cards):
+        self.masks = [0, 0, 0, 0]
+        for c in cards:
+            self.masks[c.index // NUM_RANKS] |= 1 << (c.index % NUM_RANKS)
+        (self.run_masks, self.near_run_masks, self.set_ranks,
+         self.pair_ranks, self.any_ranks) = meld_features(self.masks)
         
-        return finalScore
+        self.suits = [c.index // NUM_RANKS for c in cards]
+        self.ranks = [c.index % NUM_RANKS for c in cards]
+        self.values = [c.value for c in cards]
+        self.in_run = [bool(self.run_masks[s] >> r & 1) for s, r in zip(self.suits, self.ranks)]
+        self.in_set = [bool(self.set_ranks >> r & 1) for r in self.ranks]
+        self.in_meld = [run or in_set for run, in_set in zip(self.in_run, self.in_set)]
+        self.near_meld = [bool((self.pair_ranks | self.near_run_masks[s]) >> r & 1)
+                          for s, r in zip(self.suits, self.ranks)]
+        self._score = None
+        self._splits = None
+    
+    def score(self):
+        """Return the hand's score after optimally removing runs and sets, computed at most once."""
+        if self._score is None:
+            self._score = cached_deadwood(self.masks)
+        return self._score
+    
+    def set_splits(self):
+        """Return the suit masks left for runs after every way of melding sets (see scoring._set_splits), computed at most once."""
+        if self._splits is None:
+            self._splits = _set_splits(self.masks)
+        return self._splits
+    
+    def completes_meld(self, card):
+        """Would adding card to the hand make a new run or set that includes it?"""
+        s, r = card.index // NUM_RANKS, card.index % NUM_RANKS
+        return bool((run_members(self.masks[s] | 1 << r) >> r & 1) or (self.pair_ranks >> r & 1))
+    
+    def near_meld_with(self, card):
+        """Does the hand hold a card of the same rank as card, or of the next or previous rank in its suit?"""
+        s, r = card.index // NUM_RANKS, card.index % NUM_RANKS
+        return bool((self.any_ranks | self.masks[s] << 1 | self.masks[s] >> 1) >> r & 1)
 
 
 class Pile(CardCollection):
@@ -163,10 +326,12 @@ class Pile(CardCollection):
     This represents the game's discard pile.
     Starts empty. Players can always see the top card of the pile and draw from it if they wish.
     Players add one card to the pile every turn, unless they decide to knock.
+    It counts how many cards have been drawn from it this round.
     """
     
     def __init__(self):
         super().__init__()
+        self.draws = 0
     
     def view_top_card(self):
         """Return the last card added to the hand without removing it."""
@@ -176,9 +341,8 @@ class Pile(CardCollection):
         """
         Return and remove the last card added to the pile.
         """
-        top_card = self.view_top_card()
-        self.cards = self.cards[:-1]
-        return(top_card)
+        self.draws += 1
+        return(self.cards.pop())
 
 
 
@@ -191,23 +355,38 @@ class Player:
     should_draw_pile_strategy: Function(hand, deck, pile, anyone_knocked, current_turn). Returns Boolean
     pick_discard_strategy: Function(hand, deck, pile, anyone_knocked, current_turn). Returns Card.
     
+    Strategies that need features of the hand (runs, sets, near runs/sets) should read them from
+    hand.context(), which is computed once and shared until the hand changes.
+    Strategies that need randomness should draw it from hand.rng, the player's own generator.
+    Strategies that need to remember the cards seen this round should read hand.memory (see cardMemory.py).
+    
+    verbose: Boolean. If true, print what the player does on each turn they take (a Game prints its
+                      players' turns itself, see Game's verbose).
+    rng: random.Random. The player's random stream, given by keyword. Defaults to the global random module.
     """
     
-    def __init__(self, name, should_knock_strategy, should_draw_pile_strategy, pick_discard_strategy, verbose = False):
+    def __init__(self, name, should_knock_strategy, should_draw_pile_strategy, pick_discard_strategy,
+                 verbose = False, *, rng = None):
         self.name = name
+        self.verbose = verbose
+        self.rng = rng if rng is not None else random
 
         self.should_knock_strategy = should_knock_strategy
         self.should_draw_pile_strategy = should_draw_pile_strategy
         self.pick_discard_strategy = pick_discard_strategy
         
         self.score = [0]        
-        self.hand = Hand()
+        self.hand = Hand(self.rng)
         self.knocked = False
-        self.verbose = verbose
+        # What happened on the player's last turn
+        self.drew_from_pile = None
+        self.last_draw = None
+        self.last_discard = None
         
     def reset_hand(self):
-        """Delete your hand and form a new, empty one"""
-        self.hand = Hand()
+        """Delete your hand (and your memory of the round) and form a new, empty one"""
+        self.hand = Hand(self.rng)
+        self.hand.memory = CardMemory()
         
     def draw_from_deck(self, deck, n = 1):
         """Draw n cards from the deck and add them to your hand."""
@@ -216,6 +395,7 @@ class Player:
     def draw_from_pile(self, pile):
         """Add the top card of the discard pile to your hand."""
         self.hand.add_cards(pile.remove_top_card())
+        self.hand.pile_draws += 1
         
     def discard_to_pile(self, card, pile):
         """
@@ -229,7 +409,23 @@ class Player:
         
         self.hand.remove_cards(card)
         pile.add_cards(card)
-            
+        self.last_discard = card
+    
+    def begin_turn(self, knock):
+        """Start a turn, knocking (and so ending it) if knock is true."""
+        self.drew_from_pile = None
+        self.last_draw = None
+        self.last_discard = None
+        self.knocked = knock
+    
+    def draw_card(self, deck, pile, from_pile):
+        """Draw the turn's card, from the top of the pile if from_pile is true and from the deck otherwise."""
+        self.drew_from_pile = bool(from_pile)
+        if from_pile:
+            self.draw_from_pile(pile)
+        else:
+            self.draw_from_deck(deck)
+        self.last_draw = self.hand.cards[-1]
         
     def take_turn(self, deck, pile, anyone_knocked, current_turn):
         """
@@ -243,36 +439,21 @@ class Player:
         anyone_knocked: Boolean. True if another player has alreay knocked,
                         thus signaling the end of the game and that this player cannot knock
         current_turn: Int. Current turn in the round (starts at 1)
+        
+        A turn whose decisions come from somewhere else (a person, see server.py) is taken with
+        begin_turn, draw_card and discard_to_pile directly.
         """
-    
+        
         # The player first decides if he is going to knock
         # The player cannot have knocked yet if he is taking a turn. 
-        self.knocked = self.should_knock_strategy(self.hand, deck, pile, anyone_knocked, current_turn)
-        
-        if self.verbose and self.knocked:
-            print(self.name, "decided to knock! (Score of", self.hand.score(), ")")
-        
+        self.begin_turn(self.should_knock_strategy(self.hand, deck, pile, anyone_knocked, current_turn))
         if not self.knocked:   
             # The player next decides whether to draw from the deck or the pile
-            if self.verbose: 
-                if pile.length():
-                    print("The top card on the pile is a", pile.view_top_card())
-                else:
-                    print("There are no cards in the discard pile.")
-            draw_from_pile = self.should_draw_pile_strategy(self.hand, deck, pile, anyone_knocked, current_turn)
-
-            if draw_from_pile:
-                if self.verbose: print(self.name, "drew the", pile.view_top_card(), "from the pile.")
-                self.draw_from_pile(pile)
-
-            else:
-                self.draw_from_deck(deck)
-                if self.verbose: print(self.name, "drew a", self.hand.cards[-1], "from the deck.")
-                
+            self.draw_card(deck, pile, self.should_draw_pile_strategy(self.hand, deck, pile, anyone_knocked, current_turn))
             # The player finally decides which card to discard and add to the pile
-            discard_card = self.pick_discard_strategy(self.hand, deck, pile, anyone_knocked, current_turn)
-            if self.verbose: print(self.name, "discards the", discard_card)
-            self.discard_to_pile(discard_card, pile)
+            self.discard_to_pile(self.pick_discard_strategy(self.hand, deck, pile, anyone_knocked, current_turn), pile)
+        if self.verbose:
+            VerbosePrinter.print_turn(self, pile)
         
     def update_score(self, round_score):
         "Update your global running score with your score for this round."
@@ -300,7 +481,9 @@ class Game:
     def __init__(self, player_names, strategy_dict, knock_strategies, pile_strategies,
                  discard_strategies, target_score, total_rounds = None,
                  verbose = False, random_seed = None, data_path = None,
-                  extra_comments = "", save_results = True, mode = 'compete'):
+                  extra_comments = "", save_results = True, mode = 'compete', event_log_path = None,
+                  profile = False, stopping_rule = None, deck_orders = None, observers = None,
+                  checkpoint_path = None, checkpoint_every = 100, checkpoint_temp_suffix = ".tmp"):
         """
         Create a new game to be played by players
         player_names: List of Strings. A list of the names of the game players
@@ -311,20 +494,41 @@ class Game:
         target_score: Int. Stopping condition for the game
         total_rounds: Int. If entered, will not play to the target score but instead just
                             this many total rounds, storing each value
-        verbose: Boolean. If true, will print messages to let the viewer know what's happening.
-        random_seed: Int. If entered, will set a seed for game reproducibility.
+        verbose: Boolean. If true, will print messages to let the viewer know what's happening
+                          (adds a VerbosePrinter observer).
+        random_seed: Int. If entered, will set a seed for game reproducibility. The game never touches
+                          the global random state: the deck and each player get their own stream (see make_rng).
         data_path: String. If entered, the path to save the results of the simulation. 
-                            Should be the path to a csv file.
+                            Either a csv file or a SQLite database ending in .db (see results.py).
         extra_comments: String. Any additional comments you'd like to store in the csv database.
         save_results: Boolean. Should we save the results of the simulation?
+        mode: String. 'compete', or 'turn score calculator' to collect every player's score after each turn
+                      (adds a TurnScoreCollector observer, whose scores play_game returns as self.turn_score_dict).
+        event_log_path: String. If entered, every turn is recorded to this binary file
+                                (adds an EventLogObserver, see eventLog.py).
+        profile: Boolean. If true, time every strategy call and game phase in self.profiler 
+                          (see instrumentation.py). The timings are saved next to the results.
+        stopping_rule: StoppingRule. If entered, total_rounds becomes the most rounds to play, and the game
+                                     stops as soon as the rule is satisfied (see stopping.py). The reason
+                                     is kept in self.stop_reason and the rounds actually played are saved.
+        deck_orders: Sequence of decks (each a sequence of 52 card indices). If entered, round r is dealt from
+                                deck_orders[r] instead of a fresh shuffle, so games can replay the same deals
+                                (see commonDecks.py).
+        observers: List of GameObservers. Told about every deal, turn, knock and round end (see observers.py).
+                                          A game without observers skips those calls entirely.
+        checkpoint_path: String. If entered, the game saves its state to this file every checkpoint_every rounds
+                                 and when it ends, and resumes from the file if it already exists, playing on
+                                 exactly as if it had never stopped (see Game.checkpoint). Event logs and
+                                 profiles are not checkpointed, so they cannot be combined with it.
+        checkpoint_every: Int. Rounds between checkpoints.
+        checkpoint_temp_suffix: String. Checkpoints are written to checkpoint_path + this suffix, then renamed.
+                                        Processes that may play the same game at once need different ones.
         """
         # Set the start time time
         self.start_time = datetime.now()
-        # If there is a random seed, set it for reproducibility
-        if random_seed is not None:
-            random.seed(random_seed)
-            np.random.seed(random_seed)
+        # Give the game its own random streams (seeded for reproducibility if there is a random seed)
         self.random_seed = random_seed
+        self.deck_rng = make_rng(random_seed, "deck")
         # Get a list of all the game players
         self.num_players = len(player_names)
         self.players = []
@@ -332,31 +536,52 @@ class Game:
         self.knock_strategies = knock_strategies
         self.pile_strategies = pile_strategies
         self.discard_strategies = discard_strategies
+        self.profiler = GameProfiler() if profile else None
         for i in range(self.num_players):
             name = player_names[i]
             knock_strat = strategy_dict[knock_strategies[i]]
             pile_strat = strategy_dict[pile_strategies[i]]
             discard_strat = strategy_dict[discard_strategies[i]]
-            self.players.append(Player(name, knock_strat, pile_strat, discard_strat, verbose))
+            if self.profiler is not None:
+                knock_strat = self.profiler.wrap(i, "knock", knock_strategies[i], knock_strat)
+                pile_strat = self.profiler.wrap(i, "draw", pile_strategies[i], pile_strat)
+                discard_strat = self.profiler.wrap(i, "discard", discard_strategies[i], discard_strat)
+            self.players.append(Player(name, knock_strat, pile_strat, discard_strat,
+                                       rng = make_rng(random_seed, "player", i)))
         # We will need to keep track of the next player who will take a turn. This will be
         self.curr_dealer = 0
         self.target_score = target_score
         self.verbose = verbose
         self.total_rounds = total_rounds
+        self.stopping_rule = stopping_rule
+        self.stop_reason = None
+        self.deck_orders = deck_orders
+        if stopping_rule is not None and (total_rounds is None or self.num_players != 2):
+            raise ValueError("A stopping rule needs 2 players and total_rounds as the most rounds to play")
         # Store some information about saving
         self.data_path = data_path
         self.extra_comments = extra_comments
         self.save_results = save_results
         self.mode = mode
+        self.event_log_path = event_log_path
+        self.observers = list(observers) if observers is not None else []
+        if self.verbose:
+            self.observers.append(VerbosePrinter())
         if self.mode == 'turn score calculator':
-            self.turn_score_dict = {'round': [], 'player0': [], 'player1': []}
-        if self.verbose: 
-            print("------------------------------------------------------------")
-            if total_rounds is not None:
-                print("New game started! Play", total_rounds, "total rounds")
-            else:
-                print("New game started! Play to", target_score)
-            print("------------------------------------------------------------")
+            collector = TurnScoreCollector(self.num_players)
+            self.turn_score_dict = collector.turn_scores
+            self.observers.append(collector)
+        if self.event_log_path is not None:
+            self.observers.append(EventLogObserver(self.event_log_path))
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_temp_suffix = checkpoint_temp_suffix
+        if checkpoint_path is not None and (event_log_path is not None or profile):
+            raise ValueError("Event logs and profiles are not checkpointed, so they cannot be combined with checkpoint_path")
+        self.rounds_played = 0
+        # The sim_id store_results saved this game under, and (with a checkpoint) the rows it saved
+        self.sim_id = None
+        self.stored_rows = None
         
         
     def play_round(self, round_number):
@@ -367,9 +592,34 @@ class Game:
         3) Until someone knocks or the deck runs out of cards, rotate turns.
         4) Once there are no more turns, score everyone's hand
         5) Compare the "knocker" to the scores of the other players, updating totals.
+        
+        The steps are also public (deal_round, next_turn, end_turn and score_round), so that a caller who
+        gets some decisions from elsewhere (a person, see server.py) can drive a round turn by turn.
         """
-        # Make a new shuffled deck
-        self.deck = Deck()
+        self.deal_round(round_number)
+        players = self.players
+        while True:
+            player_number = self.next_turn()
+            if player_number is None:
+                break
+            # This must destructively change the player's hand, knocked status, the deck, and the pile.
+            players[player_number].take_turn(self.deck, self.pile, self.anyone_knocked, self.current_turn)
+            self.end_turn(player_number)
+        return self.score_round()
+    
+    def deal_round(self, round_number):
+        """Start round round_number: shuffle (or stack) a new deck, empty the pile and deal everyone 9 cards."""
+        self.round_number = round_number
+        self.scores_before = [p.get_score() for p in self.players]
+        if self.profiler is not None:
+            phase_start = time.perf_counter()
+        # Make a new shuffled deck (or stack the next of the given decks)
+        if self.deck_orders is None:
+            self.deck = Deck(self.deck_rng)
+        elif round_number < len(self.deck_orders):
+            self.deck = Deck(order = self.deck_orders[round_number])
+        else:
+            raise ValueError("Round " + str(round_number) + " has no deck: only " + str(len(self.deck_orders)) + " were given")
         # Make an empty discard pile
         self.pile = Pile()
         # Deal to each player
@@ -377,55 +627,70 @@ class Game:
             player.reset_knock()
             player.reset_hand()
             player.draw_from_deck(self.deck, 9)   
-        # Play one whole round until no more turns can be taken
-        round_over = False
-        current_turn = 0
-        anyone_knocked = False
-        player_to_go = (self.curr_dealer + 1) % self.num_players
-        if self.verbose: print(self.players[self.curr_dealer].name, "is this round's dealer.")
-        while not round_over:
-            current_turn = current_turn + 1
-            curr_player = self.players[player_to_go]
-            if self.verbose: 
-                print("----------------------------------------")
-                print("It is", curr_player.name + "'s", "turn.")
-                print("----------------------------------------")
-                print(curr_player.name + "'s", "hand to start the turn is:", curr_player.hand)
-            if curr_player.knocked:
-                round_over = True
-                if self.verbose: print(curr_player.name, "has already knocked, the round is over.")
-            else:
-                # This must destructively change the player's hand, knocked status, the deck, and the pile.
-                curr_player.take_turn(self.deck, self.pile, anyone_knocked, current_turn)
-                if self.verbose: print(curr_player.hand.score(), "is their score after their turn.")
-                if curr_player.knocked:
-                    anyone_knocked = True
-                else:
-                    if self.mode == 'turn score calculator':
-                        if player_to_go == 0:
-                            if self.verbose: print("append player 0 turn dictionary")
-                            self.turn_score_dict['player0'][round_number].append(curr_player.hand.score())
-                        elif player_to_go == 1:
-                            if self.verbose: print("append player 1 turn dictionary")
-                            self.turn_score_dict['player1'][round_number].append(curr_player.hand.score())
-                player_to_go = (player_to_go + 1) % self.num_players
-                if not self.deck.length():
-                    if self.verbose: print("The deck is empty! This ends the round. We will score the round as if", curr_player.name, "knocked. (unless someone else already has)")
-                    round_over = True
-                    if not anyone_knocked:
-                        curr_player.knocked = True
-                        anyone_knocked = True
-        
+            player.hand.memory.saw_hand(player.hand.cards)
+        if self.profiler is not None:
+            self.profiler.add(None, "deal", "", time.perf_counter() - phase_start)
+        self.current_turn = 0
+        self.anyone_knocked = False
+        self.round_over = False
+        self.player_to_go = (self.curr_dealer + 1) % self.num_players
+        for observer in self.observers:
+            observer.on_deal(self, round_number)
+    
+    def next_turn(self):
+        """
+        Move on to the next turn. Returns the number of the player whose turn it is, or None once the round
+        is over (the deck ran out, or it has come back around to the player who knocked).
+        """
+        if self.round_over:
+            return None
+        self.current_turn += 1
+        for observer in self.observers:
+            observer.on_turn_start(self, self.round_number, self.current_turn, self.player_to_go)
+        if self.players[self.player_to_go].knocked:
+            self.round_over = True
+            return None
+        return self.player_to_go
+    
+    def end_turn(self, player_number):
+        """Finish the turn player_number has just taken: tell everyone what they saw and check for the end of the round."""
+        curr_player = self.players[player_number]
+        if curr_player.drew_from_pile is not None:
+            for player in self.players:
+                player.hand.memory.saw_turn(player is curr_player, curr_player.last_draw,
+                                            curr_player.drew_from_pile, curr_player.last_discard)
+        observers = self.observers
+        for observer in observers:
+            observer.on_turn(self, self.round_number, self.current_turn, player_number)
+        if curr_player.knocked:
+            self.anyone_knocked = True
+            for observer in observers:
+                observer.on_knock(self, self.round_number, self.current_turn, player_number, False)
+        if not self.deck.length():
+            # The deck is empty, which ends the round: it is scored as if this player knocked
+            # (unless someone already has)
+            self.round_over = True
+            if not self.anyone_knocked:
+                curr_player.knocked = True
+                self.anyone_knocked = True
+                for observer in observers:
+                    observer.on_knock(self, self.round_number, self.current_turn, player_number, True)
+        self.player_to_go = (player_number + 1) % self.num_players
+    
+    def score_round(self):
+        """Score the finished round, update everyone's running score and return the round's summary."""
         # Now that the round is over, we need to score the round for each player
-        for player in self.players:
-            if self.verbose: print("Scoring", player.name + "'s", "hand of:", player.hand)
-            player.round_score = player.hand.score()
-            if self.verbose: print(player.name + "'s", "hand scores a", player.round_score)
+        for i, player in enumerate(self.players):
+            if self.profiler is not None:
+                phase_start = time.perf_counter()
+                player.round_score = player.hand.score()
+                self.profiler.add(i, "scoring", "", time.perf_counter() - phase_start)
+            else:
+                player.round_score = player.hand.score()
         
         # Create a list of the players who did not knock and note the player who did knock
         non_knock_players = []
         for player in self.players:
-            if self.verbose: print(player.name + "Knocked?", player.knocked)
             if not player.knocked:
                 non_knock_players.append(player)
             else:
@@ -433,59 +698,183 @@ class Game:
         
         # Compare the knock player's round score to each of the other round scores and update player scores 
         for player in non_knock_players:
-            if self.verbose: 
-                print("Comparing knocker", knock_player.name + "'s",
-                      "score of", knock_player.round_score, "to",
-                      player.name + "'s", "score of", player.round_score)
-                print(knock_player.name + "'s", "score will change by", player.round_score - knock_player.round_score)
-                print(player.name + "'s", "score will change by", knock_player.round_score - player.round_score)
             knock_player.update_score(player.round_score - knock_player.round_score)
             player.update_score(knock_player.round_score - player.round_score)
-            
         
         # The next player will be the dealer in the next game
+        dealer = self.curr_dealer
         self.curr_dealer = (self.curr_dealer + 1) % self.num_players
         
-        if self.verbose:
-            for player in self.players:
-                print(player.name + "'s", "current score is", player.get_score())
+        summary = {"round": self.round_number, "dealer": dealer, "turns": self.current_turn,
+                   "knocker": self.players.index(knock_player),
+                   "round_scores": [p.round_score for p in self.players],
+                   "score_changes": [p.get_score() - before for p, before in zip(self.players, self.scores_before)],
+                   "scores": [p.get_score() for p in self.players]}
+        for observer in self.observers:
+            observer.on_round_end(self, summary)
+        return summary
 
 
-    def store_results(self):
+    def result_rows(self):
+        """
+        Return the rows that store_results saves for this game, one dictionary per player.
+        The sim_id is left as None; it is assigned when the rows are appended to the results.
+        """
         end_time = datetime.now()
         elapsed_seconds = (end_time - self.start_time).total_seconds()
-        new_results = pd.DataFrame({"sim_id": [], "seed": [], "player_number": [],
-                               "draw_strategy": [], "discard_strategy": [], "knock_strategy": [],
-                               "rounds": [], "wins": [], "avg_win": [], "var_win": [],
-                               "start_time": [], "elapsed_seconds": [],
-                               "notes": []})
-        csv_exists = os.path.exists(self.data_path)
-        if csv_exists:
-            old_results = pd.read_csv(self.data_path)
-            max_prev_id = max(old_results.sim_id)
-        else:
-            print("No data found in", self.data_path)
-            print("Creating new csv.")
-            max_prev_id = 0
-
+        rows = []
         for i in range(len(self.players)):
-            curr_row = {"sim_id": max_prev_id + 1, "seed": self.random_seed,
-                        "player_number": i,
-                        "draw_strategy": self.pile_strategies[i],
-                        "discard_strategy": self.discard_strategies[i],
-                        "knock_strategy": self.knock_strategies[i], 
-                        "rounds": self.total_rounds, "wins": sum(np.diff(np.array(self.players[i].score)) > 0),
-                        "avg_win": np.mean(np.diff(np.array(self.players[i].score))),
-                        "var_win": np.std(np.diff(np.array(self.players[i].score)))**2,
-                        "start_time": self.start_time.strftime("%Y-%m-%d %H:%M:%S"),
-                        "elapsed_seconds": elapsed_seconds,
-                        "notes": self.extra_comments}
-            new_results = new_results.append([curr_row], ignore_index = True)
-        if csv_exists:
-            all_results = old_results.append(new_results, ignore_index = True)
-            all_results.to_csv(self.data_path, index = False)
+            score = self.players[i].score
+            round_scores = [b - a for a, b in zip(score, score[1:])]
+            avg_win = sum(round_scores) / len(round_scores) if round_scores else float("nan")
+            rows.append({"sim_id": None, "seed": self.random_seed,
+                         "player_number": i,
+                         "draw_strategy": self.pile_strategies[i],
+                         "discard_strategy": self.discard_strategies[i],
+                         "knock_strategy": self.knock_strategies[i], 
+                         "rounds": len(round_scores), "wins": sum(r > 0 for r in round_scores),
+                         "avg_win": avg_win,
+                         "var_win": sum((r - avg_win) ** 2 for r in round_scores) / len(round_scores)
+                                    if round_scores else float("nan"),
+                         "start_time": self.start_time.strftime("%Y-%m-%d %H:%M:%S"),
+                         "elapsed_seconds": elapsed_seconds,
+                         "notes": self.extra_comments})
+        return rows
+
+    def store_results(self):
+        """
+        Append this game's results to data_path, either a results csv or,
+        for a path ending in .db, a SQLite ResultsStore (see results.py).
+        If the game was profiled, its timings are saved next to them under the same sim_id.
+        A game with a checkpoint records its sim_id there, so a resumed game never saves its results twice.
+        """
+        if self.profiler is not None:
+            phase_start = time.perf_counter()
+        if self.checkpoint_path is None:
+            sim_id = append_results(self.result_rows(), self.data_path)
+        elif self.stored_rows is None:
+            # Checkpoint the rows before appending them, so that a game resumed after stopping in between
+            # can find them (rather than saving them twice) and records their sim_id when it is done
+            self.stored_rows = self.result_rows()
+            self.save_checkpoint(self.checkpoint_path, self.checkpoint_temp_suffix)
+            sim_id = append_results(self.stored_rows, self.data_path)
         else:
-            new_results.to_csv(self.data_path, index = False)
+            sim_id = stored_sim_id(self.stored_rows, self.data_path)
+            if sim_id is None:
+                sim_id = append_results(self.stored_rows, self.data_path)
+        self.sim_id = sim_id
+        if self.checkpoint_path is not None:
+            self.save_checkpoint(self.checkpoint_path, self.checkpoint_temp_suffix)
+        if self.profiler is not None:
+            self.profiler.add(None, "store", "", time.perf_counter() - phase_start)
+            append_profile(self.profiler.rows(), self.data_path, sim_id)
+        return sim_id
+        
+    def iter_rounds(self):
+        """
+        Play the game one round at a time, yielding a summary of each round as soon as it is over.
+        
+        Stops after total_rounds rounds, or once someone reaches the target score. The consumer can
+        stop early simply by not asking for more rounds. Each summary is a dictionary with the round
+        number, the dealer's and the knocker's player numbers, the number of turns taken, and
+        everyone's round score, score change and running score (in player order).
+        """
+        if self.checkpoint_path is not None and os.path.exists(self.checkpoint_path):
+            self.load_checkpoint(self.checkpoint_path)
+        if self.profiler is not None:
+            self.profiler.start_search_stats()
+        for observer in self.observers:
+            observer.on_game_start(self)
+        try:
+            while self.stop_reason is None:
+                if self.total_rounds is not None:
+                    if self.rounds_played >= self.total_rounds:
+                        break
+                elif max([p.get_score() for p in self.players]) >= self.target_score:
+                    break
+                summary = self.play_round(self.rounds_played)
+                self.rounds_played += 1
+                self.should_stop(self.rounds_played)
+                if self.checkpoint_path is not None and self.rounds_played % self.checkpoint_every == 0:
+                    self.save_checkpoint(self.checkpoint_path, self.checkpoint_temp_suffix)
+                yield summary
+            if self.checkpoint_path is not None:
+                self.save_checkpoint(self.checkpoint_path, self.checkpoint_temp_suffix)
+        finally:
+            if self.profiler is not None:
+                self.profiler.stop_search_stats()
+            for observer in self.observers:
+                observer.on_game_end(self)
+        
+    def checkpoint_settings(self):
+        """The settings a checkpoint must have been made with to be restored into this game."""
+        return {"player_names": [p.name for p in self.players], "knock_strategies": list(self.knock_strategies),
+                "pile_strategies": list(self.pile_strategies), "discard_strategies": list(self.discard_strategies),
+                "random_seed": self.random_seed, "target_score": self.target_score, "total_rounds": self.total_rounds,
+                "mode": self.mode}
+    
+    def checkpoint(self):
+        """
+        Return the game's state between rounds, as a dictionary of plain (JSON) values: the rounds played,
+        every player's score list, the dealer, the state of every random stream, why the game stopped (if it
+        has), the turn scores of the 'turn score calculator' mode, the seconds played so far and, once the
+        game has saved its results, their rows and sim_id (see store_results).
+        Restoring it into a game made with the same settings (see restore) plays on exactly as this one would.
+        """
+        state = {"settings": self.checkpoint_settings(), "rounds_played": self.rounds_played,
+                 "scores": [list(p.score) for p in self.players], "curr_dealer": self.curr_dealer,
+                 "deck_rng": self.deck_rng.getstate(), "player_rngs": [p.rng.getstate() for p in self.players],
+                 "stop_reason": self.stop_reason,
+                 "elapsed_seconds": (datetime.now() - self.start_time).total_seconds(),
+                 "sim_id": self.sim_id, "stored_rows": self.stored_rows}
+        if self.mode == 'turn score calculator':
+            state["turn_scores"] = self.turn_score_dict
+        return state
+    
+    def restore(self, state):
+        """
+        Restore a state made by checkpoint, so the next round played is the one after it.
+        Raises a ValueError if the state was made by a game with different settings.
+        """
+        if state["settings"] != self.checkpoint_settings():
+            raise ValueError("The checkpoint was made by a game with different settings: " + repr(state["settings"]))
+        self.rounds_played = state["rounds_played"]
+        for player, score, rng_state in zip(self.players, state["scores"], state["player_rngs"]):
+            player.score = list(score)
+            player.rng.setstate(_rng_state(rng_state))
+        self.deck_rng.setstate(_rng_state(state["deck_rng"]))
+        self.curr_dealer = state["curr_dealer"]
+        self.stop_reason = state["stop_reason"]
+        self.sim_id = state.get("sim_id")
+        self.stored_rows = state.get("stored_rows")
+        self.start_time = datetime.now() - timedelta(seconds = state["elapsed_seconds"])
+        if "turn_scores" in state:
+            self.turn_score_dict.clear()
+            self.turn_score_dict.update(state["turn_scores"])
+    
+    def save_checkpoint(self, path, temp_suffix = ".tmp"):
+        """
+        Write checkpoint() to path as JSON. The file is replaced in one step (through path + temp_suffix),
+        so a crash never leaves half of one.
+        """
+        temp_path = path + temp_suffix
+        with open(temp_path, "w") as f:
+            json.dump(self.checkpoint(), f)
+        os.replace(temp_path, path)
+    
+    def load_checkpoint(self, path):
+        """Restore the checkpoint saved at path."""
+        with open(path) as f:
+            self.restore(json.load(f))
+        
+    def should_stop(self, rounds_played):
+        """Check the stopping rule (if any) after rounds_played rounds, recording why the game stops."""
+        if self.stopping_rule is None or rounds_played % self.stopping_rule.batch_size != 0:
+            return False
+        # The rule came from stopping.py, so it is already imported
+        from stopping import score_differences
+        self.stop_reason = self.stopping_rule.check(score_differences(self))
+        return self.stop_reason is not None
         
     def play_game(self):
         """
@@ -494,26 +883,11 @@ class Game:
             2) The total rounds are achieved,
         Thereby ending the game.
         """
-        if self.total_rounds is not None:
-            for round_num in range(self.total_rounds):
-                if self.mode == 'turn score calculator':
-                    self.turn_score_dict['round'].append(round_num)
-                    self.turn_score_dict['player0'].append([])
-                    self.turn_score_dict['player1'].append([])
-                self.play_round(round_num)
-
-
-        else:
-            while max([p.get_score() for p in self.players]) < self.target_score:
-                self.play_round(0)
-        if self.save_results:
+        for _ in self.iter_rounds():
+            pass
+        if self.save_results and self.sim_id is None:
             self.store_results()
         # Game is now over, return a dictionary mapping names to scores
         if self.mode == 'turn score calculator':
             return self.turn_score_dict
         return {p.name:p.score for p in self.players}
-
-
-
-
-
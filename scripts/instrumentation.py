@@ -0,0 +1,96 @@
+# ---------------------------------------------------------
+# Opt-in timing of where a game spends its time.
+#
+# Nothing here runs unless a Game is created with
+# profile = True. The strategies are then wrapped in timers
+# when the players are created, so the un-profiled game loop
+# carries no extra work per decision.
+# ---------------------------------------------------------
+
+import time
+import scoring
+
+
+class SearchStats:
+    """
+    Counts of the deadwood searches run by the scorer (cache misses only),
+    and of the set choices ("splits") they had to try.
+    """
+    
+    def __init__(self):
+        self.searches = 0
+        self.splits = 0
+    
+    def record(self, choices):
+        """Called by scoring for every search, with the set options of each candidate rank."""
+        self.searches += 1
+        splits = 1
+        for options in choices:
+            splits *= len(options) + 1
+        self.splits += splits
+
+
+class GameProfiler:
+    """
+    Call counts and cumulative seconds per (player number, phase, strategy name).
+    
+    The phases are "deal" (building the deck and dealing), "knock", "draw" and "discard"
+    (one strategy call each), "scoring" (scoring the hands at the end of the round)
+    and "store" (saving the results).
+    """
+    
+    def __init__(self):
+        self.timings = {}
+        self.search = SearchStats()
+        self._previous_stats = None
+    
+    def add(self, player_number, phase, name, seconds):
+        """Add one call that took seconds to the totals."""
+        entry = self.timings.get((player_number, phase, name))
+        if entry is None:
+            self.timings[(player_number, phase, name)] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+    
+    def wrap(self, player_number, phase, name, function):
+        """Return function wrapped so that every call is added to the totals."""
+        key = (player_number, phase, name)
+        timings = self.timings
+        timings.setdefault(key, [0, 0.0])
+        
+        def timed_strategy(*args):
+            start = time.perf_counter()
+            result = function(*args)
+            entry = timings[key]
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start
+            return result
+        
+        return timed_strategy
+    
+    def start_search_stats(self):
+        """Start counting the scorer's searches (see scoring.SEARCH_STATS)."""
+        self._previous_stats = scoring.SEARCH_STATS
+        scoring.SEARCH_STATS = self.search
+    
+    def stop_search_stats(self):
+        """Stop counting the scorer's searches, restoring whatever was counting before."""
+        scoring.SEARCH_STATS = self._previous_stats
+        self._previous_stats = None
+    
+    def rows(self):
+        """
+        Return the totals as a list of dictionaries with player_number, phase, strategy, calls,
+        seconds and mean_seconds. Two extra rows, phases "scorer searches" and "scorer splits",
+        count the deadwood searches and the set choices they tried.
+        """
+        rows = []
+        for (player_number, phase, name), (calls, seconds) in self.timings.items():
+            rows.append({"player_number": player_number, "phase": phase, "strategy": name,
+                         "calls": calls, "seconds": seconds,
+                         "mean_seconds": seconds / calls if calls else None})
+        for phase, calls in [("scorer searches", self.search.searches), ("scorer splits", self.search.splits)]:
+            rows.append({"player_number": None, "phase": phase, "strategy": "",
+                         "calls": calls, "seconds": None, "mean_seconds": None})
+        return rows
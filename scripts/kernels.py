@@ -0,0 +1,184 @@
+# ---------------------------------------------------------
+# Compiled scoring kernels (optional).
+#
+# The deadwood search and the run, set and near meld features
+# (what TurnContext, add_keeper_column and the near runs and
+# sets discarders use) written over plain integers, so that
+# Numba can compile them to machine code when it is installed.
+# install_kernels() makes scoring use them, through
+# scoring.KERNELS: Hand.score, cache misses, score_many and
+# every TurnContext. Without Numba (or with NINECARD_KERNELS
+# set to "python") nothing is installed and scoring keeps its
+# pure Python code, so callers never need to check.
+#
+# Compiling takes a few seconds the first time, so
+# install_kernels() warms every kernel up front by default;
+# the machine code is cached on disk (cache = True), so later
+# processes only load it. Call it at startup:
+#
+#   from kernels import install_kernels
+#   install_kernels()       # "numba" or "python"
+#
+# Worker processes forked after installing inherit it.
+# Scoring is unchanged while a GameProfiler counts searches.
+# ---------------------------------------------------------
+
+import os
+import time
+
+import numpy as np
+
+import scoring
+from scoring import NUM_RANKS, RUN_DEADWOOD
+
+try:
+    if os.environ.get("NINECARD_KERNELS", "numba") == "python":
+        raise ImportError("NINECARD_KERNELS is python")
+    import numba
+except ImportError:
+    numba = None
+
+NUMBA_AVAILABLE = numba is not None
+BACKEND = "numba" if NUMBA_AVAILABLE else "python"
+
+_RUN_DEADWOOD = np.array(RUN_DEADWOOD, dtype = np.int64)
+
+
+def _jit(parallel = False):
+    """Compile a kernel with Numba if it is available, or else leave it as Python."""
+    def decorate(function):
+        if numba is None:
+            return function
+        return numba.njit(cache = True, nogil = True, parallel = parallel)(function)
+    return decorate
+
+
+_prange = numba.prange if NUMBA_AVAILABLE else range
+
+
+@_jit()
+def deadwood_kernel(m0, m1, m2, m3):
+
+    '''
+    Return the deadwood of a hand given as four suit masks (see scoring.deadwood).
+
+    Every rank held in three or more suits can be left out of sets, melded in all four suits, or melded in
+    every suit but one (when the hand holds them), so each such rank has 6 options, tried as the digits of
+    a base 6 counter. Whatever sets leave is scored as runs by table lookup.
+    '''
+
+    run_deadwood = _RUN_DEADWOOD
+    best = run_deadwood[m0] + run_deadwood[m1] + run_deadwood[m2] + run_deadwood[m3]
+    sets = m0 & m1 & m2 | m0 & m1 & m3 | m0 & m2 & m3 | m1 & m2 & m3
+    if sets == 0:
+        return best
+    set_bits = np.zeros(NUM_RANKS, dtype = np.int64)
+    count = 0
+    while sets:
+        bit = sets & -sets
+        sets ^= bit
+        set_bits[count] = bit
+        count += 1
+    for code in range(1, 6 ** count):
+        r0, r1, r2, r3 = m0, m1, m2, m3
+        valid = True
+        digits = code
+        for j in range(count):
+            option = digits % 6
+            digits //= 6
+            if option == 0:
+                continue
+            bit = set_bits[j]
+            # Option 1 melds all four suits, option 2 + s every suit but s
+            if (option != 2 and not m0 & bit or option != 3 and not m1 & bit or
+                    option != 4 and not m2 & bit or option != 5 and not m3 & bit):
+                valid = False
+                break
+            if option != 2:
+                r0 &= ~bit
+            if option != 3:
+                r1 &= ~bit
+            if option != 4:
+                r2 &= ~bit
+            if option != 5:
+                r3 &= ~bit
+        if valid:
+            dw = run_deadwood[r0] + run_deadwood[r1] + run_deadwood[r2] + run_deadwood[r3]
+            if dw < best:
+                best = dw
+    return best
+
+
+@_jit(parallel = True)
+def deadwood_many_kernel(masks):
+    """Return the deadwood of every hand of an (N, 4) integer array of suit masks, in parallel."""
+    result = np.empty(masks.shape[0], dtype = np.int64)
+    for i in _prange(masks.shape[0]):
+        result[i] = deadwood_kernel(masks[i, 0], masks[i, 1], masks[i, 2], masks[i, 3])
+    return result
+
+
+@_jit()
+def meld_features_kernel(m0, m1, m2, m3):
+    """
+    Return the features of scoring.meld_features as one tuple: the run members of each suit, the near run
+    members of each suit, then the ranks held in 3+ suits, in 2+ suits and at all.
+    """
+    r0 = m0 & (m0 >> 1) & (m0 >> 2)
+    r1 = m1 & (m1 >> 1) & (m1 >> 2)
+    r2 = m2 & (m2 >> 1) & (m2 >> 2)
+    r3 = m3 & (m3 >> 1) & (m3 >> 2)
+    return (r0 | r0 << 1 | r0 << 2, r1 | r1 << 1 | r1 << 2, r2 | r2 << 1 | r2 << 2, r3 | r3 << 1 | r3 << 2,
+            m0 & (m0 << 1 | m0 >> 1), m1 & (m1 << 1 | m1 >> 1), m2 & (m2 << 1 | m2 >> 1), m3 & (m3 << 1 | m3 >> 1),
+            m0 & m1 & m2 | m0 & m1 & m3 | m0 & m2 & m3 | m1 & m2 & m3,
+            m0 & m1 | m0 & m2 | m0 & m3 | m1 & m2 | m1 & m3 | m2 & m3,
+            m0 | m1 | m2 | m3)
+
+
+class CompiledKernels:
+    """What install_kernels puts in scoring.KERNELS: the compiled kernels, called with Python ints."""
+
+    @staticmethod
+    def deadwood(m0, m1, m2, m3):
+        return int(deadwood_kernel(m0, m1, m2, m3))
+
+    @staticmethod
+    def deadwood_many(masks):
+        return deadwood_many_kernel(np.ascontiguousarray(masks, dtype = np.int64))
+
+    meld_features = staticmethod(meld_features_kernel)
+
+
+def warmup():
+    """Compile (or load from the disk cache) every kernel by calling it once. Returns the seconds it took."""
+    start = time.perf_counter()
+    masks = scoring.hand_masks([])
+    for index in [0, 13, 26, 1, 14, 27, 2, 3, 4]:
+        masks[index // NUM_RANKS] |= 1 << (index % NUM_RANKS)
+    deadwood_kernel(*masks)
+    deadwood_many_kernel(np.array([masks], dtype = np.int64))
+    meld_features_kernel(*masks)
+    return time.perf_counter() - start
+
+
+def install_kernels(warm = True):
+
+    '''
+    Make scoring use the compiled kernels if Numba is available (see the module notes). Does nothing otherwise.
+
+    warm: Boolean. If true, compile the kernels now rather than during the first decision.
+
+    Returns the backend in use, "numba" or "python".
+    '''
+
+    if NUMBA_AVAILABLE:
+        if warm:
+            warmup()
+        scoring.KERNELS = CompiledKernels
+        scoring.SCORE_CACHE.clear()
+    return BACKEND
+
+
+def uninstall_kernels():
+    """Go back to scoring's pure Python code."""
+    scoring.KERNELS = None
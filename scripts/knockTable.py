@@ -0,0 +1,174 @@
+# ---------------------------------------------------------
+# Knock tables: when is knocking worth it?
+#
+# Player 0 plays many rounds with a baseline "Knock at N"
+# strategy that also knocks at random a small fraction of the
+# time (so every state gets tried). For every knock decision
+# we record its state, (deadwood, turn, opponent pile draws),
+# whether the player knocked, and the score change the round
+# ended with. Averaging gives, per state, the expected score
+# change of knocking and of playing on. The knock table says
+# knock wherever knocking does better, and the baseline
+# cutoff wherever a state was not seen often enough.
+#
+# Simulation runs in independent chunks across a process
+# pool. Each chunk is saved to its own file as it finishes,
+# so an interrupted run picks up where it left off.
+#
+#   table = generate_table("../data/knock_table_chunks", num_chunks = 50)
+#   save_table(table, DEFAULT_KNOCK_TABLE)
+#   strategy = make_table_knock_strategy(DEFAULT_KNOCK_TABLE)
+# ---------------------------------------------------------
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from gameLogic import Game
+from strategies import KNOCK_TABLE_SHAPE, knock_state, make_strategy_dict
+from tournament import cell_seed
+
+STAT_NAMES = ["knock_count", "knock_sum", "knock_wins", "continue_count", "continue_sum"]
+
+DEFAULT_CONFIG = {"base_cutoff": 25, "explore": 0.1, "opponent_knock": "Knock at 25",
+                  "pile": "Pile if Completes", "discard": "Discard Highest Useless"}
+
+
+def make_exploring_knock_strategy(base_cutoff, explore, records):
+    """
+    Return a knock strategy that knocks below base_cutoff, and otherwise with probability explore.
+    Every decision is appended to records as (deadwood, turn, opponent pile draws, knocked).
+    """
+    def strategy(hand, deck, pile, anyone_knocked, turn):
+        if anyone_knocked:
+            return False
+        state = knock_state(hand, pile, turn)
+        knock = hand.score() < base_cutoff or hand.rng.random() < explore
+        records.append(state + (knock,))
+        return knock
+    return strategy
+
+
+def simulate_chunk(rounds, seed, config = DEFAULT_CONFIG):
+
+    '''
+    Play rounds rounds of the exploring strategy (player 0) against config's opponent (player 1).
+
+    Returns a dictionary of KNOCK_TABLE_SHAPE arrays (see STAT_NAMES): how often each state was knocked in
+    and played on from, the total score changes that followed, and how many knocks won the round.
+    '''
+
+    records = []
+    strategy_dict = make_strategy_dict()
+    strategy_dict["Exploring Knock"] = make_exploring_knock_strategy(config["base_cutoff"], config["explore"], records)
+    game = Game(player_names = ["Explorer", "Opponent"], strategy_dict = strategy_dict,
+                knock_strategies = ["Exploring Knock", config["opponent_knock"]],
+                pile_strategies = [config["pile"]] * 2, discard_strategies = [config["discard"]] * 2,
+                target_score = None, total_rounds = rounds, random_seed = seed, save_results = False)
+    states, knocked, changes = [], [], []
+    for summary in game.iter_rounds():
+        for *state, knock in records:
+            states.append(state)
+            knocked.append(knock)
+            changes.append(summary["score_changes"][0])
+        records.clear()
+
+    stats = {name: np.zeros(KNOCK_TABLE_SHAPE, dtype = np.int64) for name in STAT_NAMES}
+    if not states:
+        return stats
+    index = tuple(np.array(states).T)
+    knocked = np.array(knocked)
+    changes = np.array(changes, dtype = np.int64)
+    knock_index = tuple(i[knocked] for i in index)
+    continue_index = tuple(i[~knocked] for i in index)
+    np.add.at(stats["knock_count"], knock_index, 1)
+    np.add.at(stats["knock_sum"], knock_index, changes[knocked])
+    np.add.at(stats["knock_wins"], knock_index, changes[knocked] > 0)
+    np.add.at(stats["continue_count"], continue_index, 1)
+    np.add.at(stats["continue_sum"], continue_index, changes[~knocked])
+    return stats
+
+
+def _chunk_path(directory, chunk):
+    return os.path.join(directory, "chunk_{:05d}.npz".format(chunk))
+
+
+def generate_table(directory, num_chunks, rounds_per_chunk = 2000, base_seed = 0, config = DEFAULT_CONFIG,
+                   max_workers = None, min_count = 30, verbose = False):
+
+    '''
+    Simulate the chunks that are not already saved in directory, then build the knock table from all of them.
+
+    directory: String. Where the chunks (and the config they were made with) are saved.
+    num_chunks: Int. Number of chunks the table is built from.
+    rounds_per_chunk: Int. Rounds played per chunk.
+    base_seed: Int. Chunk i is seeded with cell_seed(base_seed, i), so a resumed run plays the same rounds.
+    config: Dictionary. Baseline cutoff, exploration rate and the strategies played (see DEFAULT_CONFIG).
+    max_workers: Int. Number of worker processes, defaults to the number of cores.
+    min_count: Int. See build_table.
+
+    Raises a ValueError if directory holds chunks made with a different config, seed or chunk size.
+    Returns the knock table (see build_table).
+    '''
+
+    os.makedirs(directory, exist_ok = True)
+    settings = {"config": config, "base_seed": base_seed, "rounds_per_chunk": rounds_per_chunk}
+    settings_path = os.path.join(directory, "config.json")
+    if os.path.exists(settings_path):
+        with open(settings_path) as f:
+            if json.load(f) != settings:
+                raise ValueError(directory + " holds chunks made with different settings")
+    else:
+        with open(settings_path, "w") as f:
+            json.dump(settings, f, indent = 2)
+
+    missing = [c for c in range(num_chunks) if not os.path.exists(_chunk_path(directory, c))]
+    with ProcessPoolExecutor(max_workers = max_workers) as pool:
+        results = pool.map(simulate_chunk, [rounds_per_chunk] * len(missing),
+                           [cell_seed(base_seed, c) for c in missing], [config] * len(missing))
+        for chunk, stats in zip(missing, results):
+            # Write then rename, so an interrupted run never leaves a half written chunk behind
+            temp_path = _chunk_path(directory, chunk) + ".tmp.npz"
+            np.savez_compressed(temp_path, **stats)
+            os.replace(temp_path, _chunk_path(directory, chunk))
+            if verbose:
+                print("Chunk", chunk, "done")
+    return build_table([_chunk_path(directory, c) for c in range(num_chunks)], config["base_cutoff"], min_count)
+
+
+def build_table(chunk_paths, base_cutoff, min_count = 30):
+
+    '''
+    Add up saved chunks into a knock table, a dictionary of KNOCK_TABLE_SHAPE arrays:
+        knock: Boolean. Knock in this state?
+        knock_gain: Float. Expected score change of knocking minus that of playing on (NaN if either
+                    was seen fewer than min_count times, in which case knock follows base_cutoff).
+        knock_win_rate: Float. Share of knocks in this state that won the round (NaN if never knocked).
+        knock_count, continue_count: Int. How often each was seen.
+    '''
+
+    stats = {name: np.zeros(KNOCK_TABLE_SHAPE, dtype = np.int64) for name in STAT_NAMES}
+    for path in chunk_paths:
+        with np.load(path) as chunk:
+            for name in STAT_NAMES:
+                stats[name] += chunk[name]
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        knock_mean = stats["knock_sum"] / stats["knock_count"]
+        continue_mean = stats["continue_sum"] / stats["continue_count"]
+        win_rate = stats["knock_wins"] / stats["knock_count"]
+    seen = (stats["knock_count"] >= min_count) & (stats["continue_count"] >= min_count)
+    gain = np.where(seen, knock_mean - continue_mean, np.nan)
+    baseline = (np.arange(KNOCK_TABLE_SHAPE[0]) < base_cutoff)[:, None, None] & np.ones(KNOCK_TABLE_SHAPE, dtype = bool)
+    return {"knock": np.where(seen, gain > 0, baseline), "knock_gain": gain, "knock_win_rate": win_rate,
+            "knock_count": stats["knock_count"], "continue_count": stats["continue_count"]}
+
+
+def save_table(table, path):
+    """Save a knock table compactly (booleans, half precision floats and 32 bit counts)."""
+    np.savez_compressed(path, knock = table["knock"].astype(bool),
+                        knock_gain = table["knock_gain"].astype(np.float16),
+                        knock_win_rate = table["knock_win_rate"].astype(np.float16),
+                        knock_count = table["knock_count"].astype(np.int32),
+                        continue_count = table["continue_count"].astype(np.int32))
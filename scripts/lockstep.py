@@ -0,0 +1,262 @@
+# ---------------------------------------------------------
+# Lockstep simulation engine.
+#
+# Plays thousands of 2 player rounds at once. Every round's
+# deck, hands and discard pile live in NumPy integer arrays
+# (hands as suit masks, like the scoring engine), and each
+# step advances every unfinished round by one turn. Only
+# strategies whose decisions can be written as array
+# operations are supported; anything else is refused.
+#
+# The rules are the same as Game.play_round, so results match
+# the object-based engine in distribution (not round for round:
+# the two engines shuffle with different generators).
+# ---------------------------------------------------------
+
+import numpy as np
+from gameLogic import Game
+from scoring import NUM_RANKS, FULL_SUIT_MASK, RANK_VALUES, score_masks_many
+from strategies import (ConstantKnock, never_draw_from_pile, always_draw_from_pile, draw_from_pile_if_completes,
+                        discard_highest_useless)
+
+# Pile strategies the engine knows how to vectorize
+PILE_NEVER = 0
+PILE_ALWAYS = 1
+PILE_IF_COMPLETES = 2
+
+PILE_KINDS = {never_draw_from_pile: PILE_NEVER,
+              always_draw_from_pile: PILE_ALWAYS,
+              draw_from_pile_if_completes: PILE_IF_COMPLETES}
+
+DISCARD_HIGHEST_USELESS = 0
+
+DISCARD_KINDS = {discard_highest_useless: DISCARD_HIGHEST_USELESS}
+
+_RANK_SHIFTS = np.arange(NUM_RANKS, dtype = np.int64)
+_CARD_VALUES = np.array(RANK_VALUES * 4, dtype = np.float64).reshape(4, NUM_RANKS)
+
+
+def knock_cutoff(strategy):
+    """Return the cutoff of a constant score knock strategy (ConstantKnock), or None if strategy is not one."""
+    return strategy.cutoff if isinstance(strategy, ConstantKnock) else None
+
+
+def _bits(masks):
+    """Unpack (..., 4) suit masks to (..., 4, 13) booleans."""
+    return ((masks[..., None] >> _RANK_SHIFTS) & 1).astype(bool)
+
+
+def _run_members(masks):
+    starts = masks & (masks >> 1) & (masks >> 2)
+    return (starts | (starts << 1) | (starts << 2)) & FULL_SUIT_MASK
+
+
+def completes_meld(hands, cards):
+    """
+    For each (n, 4) hand and card index, would the card complete a run or a set with the hand?
+    The vectorized draw_from_pile_if_completes.
+    """
+    rows = np.arange(len(hands))
+    suit, rank = cards // NUM_RANKS, cards % NUM_RANKS
+    with_card = hands[rows, suit] | (np.int64(1) << rank)
+    in_run = (_run_members(with_card) >> rank) & 1
+    same_rank = ((hands >> rank[:, None]) & 1).sum(axis = 1)
+    return (in_run == 1) | (same_rank >= 2)
+
+
+def highest_useless(hands, rng):
+    """
+    For each (n, 4) ten card hand, pick the card to throw: the highest value card not in a run or set,
+    ties broken at random, or a random card if every card is in one. The vectorized discard_highest_useless.
+    Returns card indices.
+    """
+    bits = _bits(hands)
+    run = _bits(_run_members(hands))
+    in_set = bits.sum(axis = 1) >= 3
+    useless = bits & ~(run | in_set[:, None, :])
+    any_useless = useless.any(axis = (1, 2))
+    candidates = np.where(any_useless[:, None, None], useless, bits)
+    # Integer values dominate the uniform tie-break; cards that are not candidates can never win
+    key = np.where(any_useless[:, None, None], _CARD_VALUES, 0.0) + rng.random(bits.shape)
+    key[~candidates] = -1.0
+    return key.reshape(len(hands), -1).argmax(axis = 1)
+
+
+def play_rounds(num_rounds, knock_cutoffs, pile_kinds, rng, first_dealer = 0):
+
+    '''
+    Play num_rounds independent 2 player rounds in lockstep.
+
+    knock_cutoffs: List of 2 Ints. Each player knocks when their score is below their cutoff.
+    pile_kinds: List of 2 Ints. Each player's pile strategy (PILE_NEVER, PILE_ALWAYS or PILE_IF_COMPLETES).
+    rng: numpy.random.Generator. Source of the shuffles and the discard tie-breaks.
+    first_dealer: Int. Dealer of the first round. Dealing then alternates, like in Game.
+
+    Both players discard the highest useless card.
+
+    Returns a dictionary of arrays, one entry per round: dealer, turns, knocker,
+    round_scores (num_rounds, 2) and score_changes (num_rounds, 2).
+    '''
+
+    k = num_rounds
+    rows = np.arange(k)
+    order = np.argsort(rng.random((k, 52)), axis = 1)
+    hands = np.zeros((k, 2, 4), dtype = np.int64)
+    for p in range(2):
+        for j in range(9 * p, 9 * p + 9):
+            hands[rows, p, order[:, j] // NUM_RANKS] |= np.int64(1) << (order[:, j] % NUM_RANKS)
+    position = np.full(k, 18)
+    pile = np.zeros((k, 52), dtype = np.int64)
+    pile_length = np.zeros(k, dtype = np.int64)
+    knocked = np.zeros((k, 2), dtype = bool)
+    anyone_knocked = np.zeros(k, dtype = bool)
+    turns = np.zeros(k, dtype = np.int64)
+    dealer = (first_dealer + rows) % 2
+    to_go = (dealer + 1) % 2
+    active = np.ones(k, dtype = bool)
+    cutoffs = np.asarray(knock_cutoffs)
+    kinds = np.asarray(pile_kinds)
+
+    while True:
+        a = np.nonzero(active)[0]
+        if not len(a):
+            break
+        turns[a] += 1
+        p = to_go[a]
+        # The round is over when it comes back around to the player who knocked
+        over = knocked[a, p]
+        active[a[over]] = False
+        a, p = a[~over], p[~over]
+        if not len(a):
+            break
+
+        # 1) Knock
+        knock = ~anyone_knocked[a] & (score_masks_many(hands[a, p]) < cutoffs[p])
+        knocked[a[knock], p[knock]] = True
+        anyone_knocked[a[knock]] = True
+
+        # Players who knocked neither draw nor discard
+        b, q = a[~knock], p[~knock]
+        if len(b):
+            # 2) Draw
+            hand = hands[b, q]
+            n = np.arange(len(b))
+            has_pile = pile_length[b] > 0
+            top = pile[b, np.maximum(pile_length[b] - 1, 0)]
+            from_pile = np.zeros(len(b), dtype = bool)
+            if (kinds == PILE_ALWAYS).any():
+                from_pile |= (kinds[q] == PILE_ALWAYS) & has_pile
+            if (kinds == PILE_IF_COMPLETES).any():
+                from_pile |= (kinds[q] == PILE_IF_COMPLETES) & has_pile & completes_meld(hand, top)
+            drawn = np.where(from_pile, top, order[b, np.minimum(position[b], 51)])
+            pile_length[b[from_pile]] -= 1
+            position[b[~from_pile]] += 1
+            hand[n, drawn // NUM_RANKS] |= np.int64(1) << (drawn % NUM_RANKS)
+
+            # 3) Discard
+            discard = highest_useless(hand, rng)
+            hand[n, discard // NUM_RANKS] &= ~(np.int64(1) << (discard % NUM_RANKS))
+            hands[b, q] = hand
+            pile[b, pile_length[b]] = discard
+            pile_length[b] += 1
+
+        # Next player, and an empty deck ends the round (as if the last player knocked, unless someone did)
+        to_go[a] = 1 - p
+        empty = position[a] >= 52
+        e, ep = a[empty], p[empty]
+        no_knock = ~anyone_knocked[e]
+        knocked[e[no_knock], ep[no_knock]] = True
+        anyone_knocked[e] = True
+        active[e] = False
+
+    round_scores = score_masks_many(hands.reshape(-1, 4)).reshape(k, 2)
+    knocker = knocked.argmax(axis = 1)
+    other = 1 - knocker
+    knocker_change = round_scores[rows, other] - round_scores[rows, knocker]
+    score_changes = np.zeros((k, 2), dtype = np.int64)
+    score_changes[rows, knocker] = knocker_change
+    score_changes[rows, other] = -knocker_change
+    return {"dealer": dealer, "turns": turns, "knocker": knocker,
+            "round_scores": round_scores, "score_changes": score_changes}
+
+
+class LockstepGame(Game):
+    """
+    A Game played by the lockstep engine. It takes the same arguments as Game, keeps the same
+    per-player score lists and saves the same results rows, but plays its rounds batch_size at a time.
+
+    Only 2 players are supported, with "Knock at N" knock strategies (ConstantKnock),
+    never_draw_from_pile, always_draw_from_pile or draw_from_pile_if_completes, and discard_highest_useless.
+    Anything else raises a ValueError, as do the verbose, event log, profile, deck orders, observers,
+    checkpoint and 'turn score calculator' options.
+
+    batch_size: Int. Number of rounds played in lockstep at a time.
+    """
+
+    def __init__(self, *args, batch_size = 10000, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.num_players != 2:
+            raise ValueError("The lockstep engine only plays 2 player games")
+        if (self.verbose or self.event_log_path is not None or self.profiler is not None or self.mode != 'compete'
+                or self.deck_orders is not None or self.observers or self.checkpoint_path is not None):
+            raise ValueError("The lockstep engine does not support verbose, event logs, profiling, "
+                             "given deck orders, observers, checkpoints or other modes")
+        self.batch_size = batch_size
+        self.knock_cutoffs = []
+        self.pile_kinds = []
+        for i, player in enumerate(self.players):
+            cutoff = knock_cutoff(player.should_knock_strategy)
+            if cutoff is None:
+                raise ValueError("Knock strategy " + repr(self.knock_strategies[i]) + " cannot be vectorized")
+            if player.should_draw_pile_strategy not in PILE_KINDS:
+                raise ValueError("Pile strategy " + repr(self.pile_strategies[i]) + " cannot be vectorized")
+            if player.pick_discard_strategy not in DISCARD_KINDS:
+                raise ValueError("Discard strategy " + repr(self.discard_strategies[i]) + " cannot be vectorized")
+            self.knock_cutoffs.append(cutoff)
+            self.pile_kinds.append(PILE_KINDS[player.should_draw_pile_strategy])
+        seed = None if self.random_seed is None else np.random.SeedSequence(self.random_seed)
+        self.np_rng = np.random.default_rng(seed)
+
+    def play_round(self, round_number):
+        """Play a single round (through the lockstep engine, as a batch of one)."""
+        return next(self._play_batches(round_number, 1))
+
+    def _play_batches(self, round_number, num_rounds):
+        """Play num_rounds rounds in batches, yielding the summary of each round in order."""
+        while num_rounds > 0:
+            k = min(num_rounds, self.batch_size)
+            batch = play_rounds(k, self.knock_cutoffs, self.pile_kinds, self.np_rng, first_dealer = self.curr_dealer)
+            for r in range(k):
+                changes = batch["score_changes"][r]
+                for i, player in enumerate(self.players):
+                    player.round_score = int(batch["round_scores"][r][i])
+                    player.update_score(int(changes[i]))
+                yield {"round": round_number, "dealer": int(batch["dealer"][r]), "turns": int(batch["turns"][r]),
+                       "knocker": int(batch["knocker"][r]),
+                       "round_scores": [int(s) for s in batch["round_scores"][r]],
+                       "score_changes": [int(c) for c in changes],
+                       "scores": [p.get_score() for p in self.players]}
+                round_number += 1
+            self.curr_dealer = (self.curr_dealer + k) % 2
+            num_rounds -= k
+
+    def iter_rounds(self):
+        """
+        Like Game.iter_rounds, but the rounds are played batch_size at a time. When playing to a
+        target score or with a stopping rule, the rest of the batch is thrown away once the game is over.
+        """
+        if self.total_rounds is not None:
+            round_number = 0
+            for summary in self._play_batches(0, self.total_rounds):
+                round_number += 1
+                yield summary
+                if self.should_stop(round_number):
+                    return
+            return
+        round_number = 0
+        while max([p.get_score() for p in self.players]) < self.target_score:
+            for summary in self._play_batches(round_number, self.batch_size):
+                round_number += 1
+                yield summary
+                if max([p.get_score() for p in self.players]) >= self.target_score:
+                    return
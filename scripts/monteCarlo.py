@@ -0,0 +1,310 @@
+# ---------------------------------------------------------
+# Monte Carlo search bot.
+#
+# At every decision the bot deals out plausible worlds: the
+# opponent's hand and the order of the deck, drawn from the
+# cards it has never seen (see cardMemory.py). The opponent
+# keeps the cards they were seen taking from the pile, and
+# their hand is improved for the turns they have had, as a
+# real one would be. In each world the bot tries every
+# candidate decision and plays the rest of the round out
+# with cheap rollout policies on bitmasks (knock below a
+# cutoff, take the pile only to complete a run or set, throw
+# the highest card in no run, set or near one). Candidates
+# are played in the same worlds, so they are compared on
+# common random numbers, and the bot only departs from its
+# rollout policy's decision when another one is clearly
+# better. Search is anytime: worlds are dealt until the time
+# budget runs out, and the best decision so far is returned.
+#
+# Only two player rounds are searched (others raise a
+# ValueError). In a two player round a player's score changes
+# by the opponent's deadwood minus their own, whoever knocks,
+# so that is what a rollout returns.
+#
+#   bot = MonteCarloBot(time_budget = 0.02)
+#   Player("Bot", bot.should_knock, bot.should_draw_pile, bot.pick_discard)
+#   bot.rollouts_per_second()
+# ---------------------------------------------------------
+
+import threading
+import time
+
+from cardMemory import CardMemory, deck_mask
+from scoring import NUM_RANKS, RANK_VALUES, cached_deadwood, deadwood_without_each, near_run_members, run_members
+
+# Cards in a hand between turns
+HAND_SIZE = 9
+
+
+def _add(masks, index):
+    masks[index // NUM_RANKS] |= 1 << (index % NUM_RANKS)
+
+
+def _remove(masks, index):
+    masks[index // NUM_RANKS] &= ~(1 << (index % NUM_RANKS))
+
+
+def completes_meld(masks, index):
+    """Would adding card index to the hand (four suit masks) make a new run or set that includes it?"""
+    a, b, c, d = masks
+    pairs = a & b | a & c | a & d | b & c | b & d | c & d
+    s, r = index // NUM_RANKS, index % NUM_RANKS
+    return bool((run_members(masks[s] | 1 << r) | pairs) >> r & 1)
+
+
+def highest_useless(masks):
+    """
+    Return the index of the highest value card of the hand (four suit masks) that is in no run or set and
+    has no card beside it in its suit or of its rank, or else the highest that is in no run or set,
+    or else the highest card.
+    """
+    a, b, c, d = masks
+    sets = a & b & c | a & b & d | a & c & d | b & c & d
+    pairs = a & b | a & c | a & d | b & c | b & d | c & d
+    best = None
+    for keep in (2, 1, 0):
+        for s in range(4):
+            mask = masks[s]
+            if keep:
+                mask &= ~(run_members(mask) | sets)
+            if keep == 2:
+                mask &= ~(near_run_members(masks[s]) | pairs)
+            if mask:
+                r = mask.bit_length() - 1
+                if best is None or (RANK_VALUES[r], r) > (RANK_VALUES[best % NUM_RANKS], best % NUM_RANKS):
+                    best = s * NUM_RANKS + r
+        if best is not None:
+            return best
+    raise ValueError("An empty hand has nothing to discard")
+
+
+def play_draw_discard(masks, pile, deck, from_pile):
+    """Draw (from the top of the pile, or else the deck) and throw the rollout policy's discard."""
+    _add(masks, pile.pop() if from_pile else deck.pop())
+    discard = highest_useless(masks)
+    _remove(masks, discard)
+    pile.append(discard)
+
+
+def rollout(hands, pile, deck, player, knocker, knock_cutoff):
+
+    '''
+    Play out the rest of a two player round with the rollout policies, and return player 0's score change.
+
+    hands: List of two lists of four suit masks. Changed in place.
+    pile: List of card indices, top card last. Changed in place.
+    deck: List of card indices, next card last. Changed in place.
+    player: Int. Who takes the next turn.
+    knocker: Int. Who has knocked, or None if nobody has.
+    knock_cutoff: Int. Players knock with deadwood below this.
+    '''
+
+    while player != knocker and deck:
+        masks = hands[player]
+        if knocker is None and cached_deadwood(masks) < knock_cutoff:
+            knocker = player
+        else:
+            play_draw_discard(masks, pile, deck, pile and completes_meld(masks, pile[-1]))
+        player ^= 1
+    return cached_deadwood(hands[1]) - cached_deadwood(hands[0])
+
+
+class World:
+    """
+    One plausible deal of the cards the bot cannot see, from the bot's (player 0's) point of view.
+
+    hands: List of two lists of four suit masks. The bot's hand, then the opponent's.
+    pile: List of card indices, top card last.
+    deck: List of card indices, next card last.
+    knocker: Int. 1 if the opponent has knocked, otherwise None.
+    """
+
+    def __init__(self, hands, pile, deck, knocker):
+        self.hands = hands
+        self.pile = pile
+        self.deck = deck
+        self.knocker = knocker
+
+    def copy(self):
+        return World([list(m) for m in self.hands], list(self.pile), list(self.deck), self.knocker)
+
+    def finish_turn(self, knock_cutoff):
+        """The bot's turn is over: play out the rest of the round and return the bot's score change."""
+        return rollout(self.hands, self.pile, self.deck, 1, self.knocker, knock_cutoff)
+
+
+class MonteCarloBot:
+    """
+    Knock, draw and discard strategies that search by Monte Carlo rollouts (see the module notes).
+    The bot only looks at what its player could see: its hand, hand.memory, the pile and the size of the deck.
+    Its randomness comes from hand.rng, so a seeded game with max_samples (and no time_budget) is reproducible.
+
+    time_budget: Float. Seconds to search per decision, or None to be limited by max_samples alone.
+    max_samples: Int. Most worlds to deal per decision, or None to be limited by time_budget alone.
+    discard_candidates: Int. How many discards to search, taken in order of the deadwood they leave.
+    rollout_knock: Int. Both players knock with deadwood below this in rollouts.
+    opponent_turns: Int. Most turns the opponent's dealt hand is improved for (see sample_world).
+    confidence: Float. How many standard errors better than the rollout policy's own decision another
+                       decision must score to be chosen instead (see search).
+
+    Statistics of every search so far (decisions, rollouts, seconds) are in self.stats().
+    """
+
+    def __init__(self, time_budget = 0.02, max_samples = None, discard_candidates = 4, rollout_knock = 25,
+                 opponent_turns = 6, confidence = 1.0):
+        if time_budget is None and max_samples is None:
+            raise ValueError("Give a time_budget, max_samples or both")
+        self.time_budget = time_budget
+        self.max_samples = max_samples
+        self.discard_candidates = discard_candidates
+        self.rollout_knock = rollout_knock
+        self.opponent_turns = opponent_turns
+        self.confidence = confidence
+        self.decisions = 0
+        self.rollouts = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def sample_world(self, hand, deck, pile, anyone_knocked, turn, rng):
+        """
+        Deal the opponent's hand and the deck from the cards the bot has not seen (or holds). The opponent keeps the cards
+        they were seen taking from the pile, and has drawn and discarded with the rollout policy once for each
+        turn they have had (up to opponent_turns), so their hand is about as good as a real one. Their hand
+        stops improving below the rollout knock cutoff unless they have knocked: if it were that good, they would have.
+        
+        The discards of those imagined turns go back among the cards left for the deck. That is an approximation:
+        the opponent's real discards are on the pile (or were taken from it), but the hidden cards have to fill
+        both the opponent's hand and the deck, and which of them were discarded is not known.
+        
+        The model has exactly one opponent, so raises a ValueError if the round is not a two player one
+        (if the cards that are neither the bot's, the deck's nor the pile's are not one hand).
+        """
+        if 52 - deck.length() - pile.length() - len(hand.cards) != HAND_SIZE:
+            raise ValueError("The Monte Carlo bot only searches two player rounds")
+        memory = hand.memory if hand.memory is not None else CardMemory.from_view(hand, pile)
+        known = memory.opponent_known
+        # The card drawn this turn is only remembered once the turn ends, so leave out the whole hand
+        unseen = memory.unseen() & ~deck_mask(hand.context().masks)
+        hidden = []
+        while unseen:
+            bit = unseen & -unseen
+            unseen ^= bit
+            hidden.append(bit.bit_length() - 1)
+        rng.shuffle(hidden)
+        opponent = [known >> (s * NUM_RANKS) & ((1 << NUM_RANKS) - 1) for s in range(4)]
+        dealt = HAND_SIZE - known.bit_count()
+        for index in hidden[:dealt]:
+            _add(opponent, index)
+        rest = hidden[dealt:]
+        turns = min(turn // 2, self.opponent_turns, len(rest))
+        if turns:
+            for i in range(turns):
+                if not anyone_knocked and cached_deadwood(opponent) < self.rollout_knock:
+                    # They would have knocked by now, so this is as good as their hand gets
+                    break
+                _add(opponent, rest[i])
+                discard = highest_useless(opponent)
+                if known >> discard & 1:
+                    discard = rest[i]
+                _remove(opponent, discard)
+                rest[i] = discard
+            rng.shuffle(rest)
+        return World([list(hand.context().masks), opponent], [c.index for c in pile.cards],
+                     rest[:deck.length()], 1 if anyone_knocked else None)
+
+    def search(self, candidates, play, hand, deck, pile, anyone_knocked, turn):
+
+        '''
+        Play every candidate decision in each world dealt, and return the one with the best average score change
+        if it beats candidates[0] (the rollout policy's own decision) by confidence standard errors of the
+        paired difference. Otherwise return candidates[0], so noise alone never changes a decision.
+
+        play: Function(world, candidate). Makes the candidate decision in a copy of the world, finishes the
+                                         turn with the rollout policies and returns the bot's score change.
+        '''
+
+        start = time.perf_counter()
+        deadline = None if self.time_budget is None else start + self.time_budget
+        # Sums and sums of squares of each candidate's score change minus candidates[0]'s
+        sums = [0] * len(candidates)
+        squares = [0] * len(candidates)
+        samples = 0
+        while True:
+            world = self.sample_world(hand, deck, pile, anyone_knocked, turn, hand.rng)
+            default = play(world.copy(), candidates[0])
+            for i in range(1, len(candidates)):
+                difference = play(world.copy(), candidates[i]) - default
+                sums[i] += difference
+                squares[i] += difference * difference
+            samples += 1
+            if samples == self.max_samples or (deadline is not None and time.perf_counter() >= deadline):
+                break
+        with self._lock:
+            self.decisions += 1
+            self.rollouts += samples * len(candidates)
+            self.seconds += time.perf_counter() - start
+        best = max(range(len(candidates)), key = lambda i: sums[i])
+        if best and samples > 1:
+            mean = sums[best] / samples
+            variance = max(squares[best] / samples - mean * mean, 0) / (samples - 1)
+            if mean > self.confidence * variance ** 0.5:
+                return candidates[best]
+        return candidates[0]
+
+    def should_knock(self, hand, deck, pile, anyone_knocked, turn):
+        """Knock strategy: knock if the rollouts score knocking now above playing on."""
+        if anyone_knocked:
+            return False
+        cutoff = self.rollout_knock
+
+        def play(world, knock):
+            if knock:
+                return rollout(world.hands, world.pile, world.deck, 1, 0, cutoff)
+            bot = world.hands[0]
+            play_draw_discard(bot, world.pile, world.deck, world.pile and completes_meld(bot, world.pile[-1]))
+            return world.finish_turn(cutoff)
+        default = hand.score() < cutoff
+        return self.search([default, not default], play, hand, deck, pile, anyone_knocked, turn)
+
+    def should_draw_pile(self, hand, deck, pile, anyone_knocked, turn):
+        """Draw strategy: take the top of the pile if the rollouts score it above a card from the deck."""
+        if not pile.length():
+            return False
+
+        def play(world, from_pile):
+            play_draw_discard(world.hands[0], world.pile, world.deck, from_pile)
+            return world.finish_turn(self.rollout_knock)
+        default = completes_meld(hand.context().masks, pile.view_top_card().index)
+        return self.search([default, not default], play, hand, deck, pile, anyone_knocked, turn)
+
+    def pick_discard(self, hand, deck, pile, anyone_knocked, turn):
+        """
+        Discard strategy: throw the card the rollouts score best, out of the rollout policy's discard and the
+        cards leaving the least deadwood.
+        """
+        masks = hand.context().masks
+        after_discard = deadwood_without_each(masks)
+        default = highest_useless(masks)
+        candidates = [c for c in hand.cards if c.index == default]
+        for card in sorted(hand.cards, key = lambda c: (after_discard[c.index], -c.value)):
+            if len(candidates) >= self.discard_candidates:
+                break
+            if card != candidates[0]:
+                candidates.append(card)
+
+        def play(world, card):
+            _remove(world.hands[0], card.index)
+            world.pile.append(card.index)
+            return world.finish_turn(self.rollout_knock)
+        return self.search(candidates, play, hand, deck, pile, anyone_knocked, turn)
+
+    def rollouts_per_second(self):
+        """Rollouts played per second of search, over every decision so far."""
+        return self.rollouts / self.seconds if self.seconds else 0.0
+
+    def stats(self):
+        """Decisions made, rollouts played and seconds searched so far, with the mean rollouts per decision."""
+        return {"decisions": self.decisions, "rollouts": self.rollouts, "seconds": self.seconds,
+                "rollouts_per_second": self.rollouts_per_second(),
+                "rollouts_per_decision": self.rollouts / self.decisions if self.decisions else 0.0}
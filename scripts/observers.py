@@ -0,0 +1,139 @@
+# ---------------------------------------------------------
+# Game observers.
+#
+# The game loop tells its observers what happens: the deal,
+# the start and end of every turn, every knock and the end of
+# every round. Anything that only watches a game (printing it,
+# collecting statistics, logging it) is an observer, so the
+# core loop never needs to change for it, and a game with no
+# observers skips the calls entirely. Pass observers to
+# Game(observers = [...]).
+# ---------------------------------------------------------
+
+
+class GameObserver:
+    """
+    Base class of game observers. Every hook does nothing, so an observer only overrides the hooks it needs.
+    Hooks get the game itself, so they can read its players (with their hands), deck and pile.
+    """
+
+    def on_game_start(self, game):
+        """The game is about to play its first round."""
+
+    def on_deal(self, game, round_number):
+        """Every player has been dealt their hand. game.curr_dealer is this round's dealer."""
+
+    def on_turn_start(self, game, round_number, turn, player_number):
+        """
+        A player's turn is starting (their hand is as it was left). If they knocked on their last turn,
+        the round ends here without them taking one.
+        """
+
+    def on_turn(self, game, round_number, turn, player_number):
+        """
+        A player has taken their turn. The player's drew_from_pile, last_draw, last_discard and knocked
+        attributes say what they did (drew_from_pile is None if they knocked instead of drawing).
+        """
+
+    def on_knock(self, game, round_number, turn, player_number, deck_ran_out):
+        """A player knocked, or (deck_ran_out) the deck ran out on their turn and the round is scored as if they did."""
+
+    def on_round_end(self, game, summary):
+        """The round has been scored. summary is the dictionary that Game.play_round returns."""
+
+    def on_game_end(self, game):
+        """The game is over (or its consumer stopped asking for rounds)."""
+
+
+class VerbosePrinter(GameObserver):
+    """Print a play by play of the game (what Game(verbose = True) shows), line for line as the game loop used to."""
+
+    def on_game_start(self, game):
+        print("------------------------------------------------------------")
+        if game.total_rounds is not None:
+            print("New game started! Play", game.total_rounds, "total rounds")
+        else:
+            print("New game started! Play to", game.target_score)
+        print("------------------------------------------------------------")
+
+    def on_deal(self, game, round_number):
+        print(game.players[game.curr_dealer].name, "is this round's dealer.")
+
+    def on_turn_start(self, game, round_number, turn, player_number):
+        player = game.players[player_number]
+        print("----------------------------------------")
+        print("It is", player.name + "'s", "turn.")
+        print("----------------------------------------")
+        print(player.name + "'s", "hand to start the turn is:", player.hand)
+        if player.knocked:
+            print(player.name, "has already knocked, the round is over.")
+
+    @staticmethod
+    def print_turn(player, pile):
+        """Print what player did on the turn they have just taken, given the pile as it is after it."""
+        if player.drew_from_pile is None:
+            print(player.name, "decided to knock! (Score of", player.hand.score(), ")")
+            return
+        # The top card of the pile before the draw: the card drawn from it, or the one under this turn's discard
+        if player.drew_from_pile:
+            print("The top card on the pile is a", player.last_draw)
+            print(player.name, "drew the", player.last_draw, "from the pile.")
+        else:
+            if pile.length() > 1:
+                print("The top card on the pile is a", pile.cards[-2])
+            else:
+                print("There are no cards in the discard pile.")
+            print(player.name, "drew a", player.last_draw, "from the deck.")
+        print(player.name, "discards the", player.last_discard)
+
+    def on_turn(self, game, round_number, turn, player_number):
+        player = game.players[player_number]
+        self.print_turn(player, game.pile)
+        print(player.hand.score(), "is their score after their turn.")
+        if not player.knocked and game.mode == 'turn score calculator' and player_number < 2:
+            print("append player", player_number, "turn dictionary")
+        if not game.deck.length():
+            print("The deck is empty! This ends the round. We will score the round as if", player.name,
+                  "knocked. (unless someone else already has)")
+
+    def on_round_end(self, game, summary):
+        for player, round_score in zip(game.players, summary["round_scores"]):
+            print("Scoring", player.name + "'s", "hand of:", player.hand)
+            print(player.name + "'s", "hand scores a", round_score)
+        for player in game.players:
+            print(player.name + "Knocked?", player.knocked)
+        knocker = game.players[summary["knocker"]]
+        for player in game.players:
+            if player is not knocker:
+                print("Comparing knocker", knocker.name + "'s",
+                      "score of", knocker.round_score, "to",
+                      player.name + "'s", "score of", player.round_score)
+                print(knocker.name + "'s", "score will change by", player.round_score - knocker.round_score)
+                print(player.name + "'s", "score will change by", knocker.round_score - player.round_score)
+        for player in game.players:
+            print(player.name + "'s", "current score is", player.get_score())
+
+
+class TurnScoreCollector(GameObserver):
+    """
+    Collect every player's score after each of their turns that did not end in a knock
+    (what the 'turn score calculator' mode returns).
+
+    turn_scores: Dictionary. 'round' lists the round numbers, and 'player0', 'player1', ... hold one list
+                 per round of that player's scores by turn.
+    """
+
+    def __init__(self, num_players = 2):
+        self.turn_scores = {'round': []}
+        for i in range(num_players):
+            self.turn_scores['player' + str(i)] = []
+
+    def on_deal(self, game, round_number):
+        self.turn_scores['round'].append(round_number)
+        for i in range(game.num_players):
+            self.turn_scores['player' + str(i)].append([])
+
+    def on_turn(self, game, round_number, turn, player_number):
+        player = game.players[player_number]
+        if not player.knocked:
+            self.turn_scores['player' + str(player_number)][-1].append(player.hand.score())
@@ -0,0 +1,236 @@
+# ---------------------------------------------------------
+# The exact deadwood distribution of opening hands.
+#
+# Every one of the C(52, 9) = 3,679,075,400 possible 9 card
+# hands is counted, without dealing a single one. Deadwood
+# does not depend on which suit is which, so only one hand of
+# every suit relabelling is scored: the one whose suit masks
+# are in decreasing order (by card count, then mask), counted
+# once for each distinct way of relabelling its suits. That
+# leaves 157,702,259 hands, scored in batches by
+# scoring.score_masks_many across a process pool.
+#
+# Besides the overall histogram, we count the hands holding
+# each card, by rank (suits are interchangeable again). That
+# gives the conditional distributions, e.g. the deadwood of
+# a dealt hand given the up-card: the hand is one of those
+# that do not hold it.
+#
+# Enumeration runs in independent chunks, each saved to its
+# own file as it finishes, so an interrupted run picks up
+# where it left off. The result is stored once in
+# data/opening_deadwood.npz.
+#
+#   distribution = generate_distribution("../data/opening_deadwood_chunks")
+#   save_distribution(distribution, DEFAULT_OPENING_DISTRIBUTION)
+#   deadwood_probabilities(load_distribution(), up_card = "K")
+# ---------------------------------------------------------
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from math import comb
+
+import numpy as np
+
+from scoring import NUM_RANKS, RANK_VALUES, _score_masks_many, ranks
+
+DEFAULT_OPENING_DISTRIBUTION = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data",
+                                            "opening_deadwood.npz")
+
+# Every suit mask, ordered by card count and then by mask. Hands are enumerated as positions in this order.
+SUIT_MASKS = np.array(sorted(range(1 << NUM_RANKS), key = lambda m: (bin(m).count("1"), m)), dtype = np.int64)
+MASK_SIZES = np.array([bin(int(m)).count("1") for m in SUIT_MASKS], dtype = np.int64)
+SIZE_STARTS = np.searchsorted(MASK_SIZES, np.arange(NUM_RANKS + 2))
+
+# How many of the 24 suit relabellings of a hand in decreasing order give the same hand, indexed by
+# which neighbouring suits are equal (4 * (first == second) + 2 * (second == third) + (third == fourth))
+_RELABELLING_REPEATS = np.array([1, 2, 2, 6, 2, 4, 6, 24], dtype = np.int64)
+
+# Hands are scored in batches of about this many
+BATCH_SIZE = 1 << 19
+
+# Decreasing triples of mask positions, by the number of cards in them (built once per process)
+_triple_tables = {}
+
+
+def max_deadwood(hand_size):
+    """The most deadwood a hand of hand_size cards can have."""
+    return sum(sorted(RANK_VALUES * 4)[-hand_size:]) if hand_size else 0
+
+
+def _pairs(cards):
+    """Every pair of mask positions (p, q) with p >= q holding cards cards between them, sorted by p."""
+    blocks = [np.zeros((0, 2), dtype = np.int64)]
+    for p in range(SIZE_STARTS[min(cards, NUM_RANKS) + 1]):
+        rest = cards - MASK_SIZES[p]
+        if rest > NUM_RANKS:
+            continue
+        q = np.arange(SIZE_STARTS[rest], min(SIZE_STARTS[rest + 1], p + 1))
+        blocks.append(np.column_stack([np.full(len(q), p), q]))
+    return np.concatenate(blocks)
+
+
+def _triples(cards):
+    """Every decreasing triple of mask positions holding cards cards between them, sorted by the first."""
+    if cards not in _triple_tables:
+        pairs = {}
+        blocks = [np.zeros((0, 3), dtype = np.int64)]
+        for p in range(SIZE_STARTS[min(cards, NUM_RANKS) + 1]):
+            rest = cards - MASK_SIZES[p]
+            if rest not in pairs:
+                pairs[rest] = _pairs(rest)
+            below = pairs[rest][:np.searchsorted(pairs[rest][:, 0], p, side = "right")]
+            blocks.append(np.column_stack([np.full(len(below), p), below]))
+        _triple_tables[cards] = np.concatenate(blocks)
+    return _triple_tables[cards]
+
+
+def _tally(positions, counts, holding):
+    """Score a batch of hands (rows of four decreasing mask positions) and add them to the counts."""
+    masks = SUIT_MASKS[positions]
+    equal = positions[:, :-1] == positions[:, 1:]
+    weights = 24 // _RELABELLING_REPEATS[4 * equal[:, 0] + 2 * equal[:, 1] + equal[:, 2]]
+    bits = ((masks[:, :, None] >> np.arange(NUM_RANKS)) & 1).astype(bool)
+    deadwood = _score_masks_many(masks, bits)
+    minlength = counts.shape[0]
+    counts += np.bincount(deadwood, weights = weights, minlength = minlength).astype(np.int64)
+    # Each relabelling of a hand holding rank r in k suits holds the card of rank r in a given suit k / 4 of
+    # the time, so this adds 4 times the number of hands holding that card
+    held = bits.sum(axis = 1) * weights[:, None]
+    for r in range(NUM_RANKS):
+        holding[r] += np.bincount(deadwood, weights = held[:, r], minlength = minlength).astype(np.int64)
+
+
+def count_chunk(chunk, num_chunks, hand_size = 9):
+
+    '''
+    Score every hand in decreasing suit order whose first suit mask is at a position congruent to chunk
+    modulo num_chunks (see the module notes).
+
+    Returns a dictionary of two integer arrays, indexed by deadwood:
+    counts: The number of hands (counting every suit relabelling) with each deadwood.
+    holding: (13, deadwood) The number of hands holding the card of each rank in a given suit, times 4.
+    '''
+
+    size = max_deadwood(hand_size) + 1
+    counts = np.zeros(size, dtype = np.int64)
+    holding = np.zeros((NUM_RANKS, size), dtype = np.int64)
+    batch, batch_hands = [], 0
+    for p in range(chunk, len(SUIT_MASKS), num_chunks):
+        rest = hand_size - MASK_SIZES[p]
+        if rest < 0 or rest > 3 * MASK_SIZES[p]:
+            continue
+        triples = _triples(rest)
+        below = triples[:np.searchsorted(triples[:, 0], p, side = "right")]
+        if not len(below):
+            continue
+        batch.append(np.column_stack([np.full(len(below), p), below]))
+        batch_hands += len(below)
+        if batch_hands >= BATCH_SIZE:
+            _tally(np.concatenate(batch), counts, holding)
+            batch, batch_hands = [], 0
+    if batch:
+        _tally(np.concatenate(batch), counts, holding)
+    return {"counts": counts, "holding": holding}
+
+
+def _chunk_path(directory, chunk):
+    return os.path.join(directory, "chunk_{:05d}.npz".format(chunk))
+
+
+def generate_distribution(directory, num_chunks = 64, hand_size = 9, max_workers = None, verbose = False):
+
+    '''
+    Count the chunks that are not already saved in directory, then add them all up.
+
+    directory: String. Where the chunks (and the settings they were made with) are saved.
+    num_chunks: Int. Number of chunks the hands are split into.
+    hand_size: Int. Cards per hand.
+    max_workers: Int. Number of worker processes, defaults to the number of cores.
+
+    Raises a ValueError if directory holds chunks made with different settings, or if the counts
+    do not add up to every possible hand.
+    Returns the distribution, a dictionary of integer arrays indexed by deadwood:
+    counts: The number of hands with each deadwood. Adds up to C(52, hand_size).
+    holding: (13, deadwood) The number of hands with each deadwood that hold the card of each rank
+             in a given suit, e.g. the ace of spades. Each row adds up to C(51, hand_size - 1).
+    '''
+
+    os.makedirs(directory, exist_ok = True)
+    settings = {"hand_size": hand_size, "num_chunks": num_chunks}
+    settings_path = os.path.join(directory, "config.json")
+    if os.path.exists(settings_path):
+        with open(settings_path) as f:
+            if json.load(f) != settings:
+                raise ValueError(directory + " holds chunks made with different settings")
+    else:
+        with open(settings_path, "w") as f:
+            json.dump(settings, f, indent = 2)
+
+    missing = [c for c in range(num_chunks) if not os.path.exists(_chunk_path(directory, c))]
+    with ProcessPoolExecutor(max_workers = max_workers) as pool:
+        results = pool.map(count_chunk, missing, [num_chunks] * len(missing), [hand_size] * len(missing))
+        for chunk, counted in zip(missing, results):
+            # Write then rename, so an interrupted run never leaves a half written chunk behind
+            temp_path = _chunk_path(directory, chunk) + ".tmp.npz"
+            np.savez_compressed(temp_path, **counted)
+            os.replace(temp_path, _chunk_path(directory, chunk))
+            if verbose:
+                print("Chunk", chunk, "done")
+
+    size = max_deadwood(hand_size) + 1
+    distribution = {"counts": np.zeros(size, dtype = np.int64),
+                    "holding": np.zeros((NUM_RANKS, size), dtype = np.int64)}
+    for chunk in range(num_chunks):
+        with np.load(_chunk_path(directory, chunk)) as counted:
+            for key in distribution:
+                distribution[key] += counted[key]
+    distribution["holding"] //= 4
+    if (distribution["counts"].sum() != comb(4 * NUM_RANKS, hand_size) or
+            (distribution["holding"].sum(axis = 1) != comb(4 * NUM_RANKS - 1, hand_size - 1)).any()):
+        raise ValueError("The chunks in " + directory + " do not count every hand exactly once")
+    return distribution
+
+
+def save_distribution(distribution, path):
+    """Save a distribution (see generate_distribution)."""
+    np.savez_compressed(path, **distribution)
+
+
+def load_distribution(path = DEFAULT_OPENING_DISTRIBUTION):
+    """Load a distribution saved by save_distribution, as a dictionary of arrays."""
+    with np.load(path) as distribution:
+        return {key: distribution[key] for key in distribution.files}
+
+
+def _rank_index(card):
+    """The rank index of a Card or of a rank name ('A', '2', ..., 'K')."""
+    return ranks.index(getattr(card, "rank", card))
+
+
+def deadwood_probabilities(distribution, up_card = None):
+
+    '''
+    Return the probability of each deadwood (the array index) for a dealt hand.
+
+    up_card: Card or rank name. If entered, the distribution given that this card is face up on the pile,
+             so the hand is one of those that do not hold it.
+    '''
+
+    counts = distribution["counts"]
+    if up_card is None:
+        return counts / counts.sum()
+    without = counts - distribution["holding"][_rank_index(up_card)]
+    return without / without.sum()
+
+
+def holding_probabilities(distribution, card):
+    """Return the probability of each deadwood (the array index) for a dealt hand, given that it holds card."""
+    holding = distribution["holding"][_rank_index(card)]
+    return holding / holding.sum()
+
+
+def mean_deadwood(probabilities):
+    """The mean of a deadwood distribution (see deadwood_probabilities)."""
+    return float(np.dot(np.arange(len(probabilities)), probabilities))
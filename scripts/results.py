@@ -0,0 +1,285 @@
+# ---------------------------------------------------------
+# Append-only results store backed by SQLite.
+#
+# Replaces reading and rewriting the whole results csv on
+# every game. The database runs in WAL mode so many
+# processes can append while others read, sim_ids are
+# handed out inside the same write transaction as the rows
+# (so two writers can never get the same id), and the
+# columns we filter on are indexed. A csv export keeps the
+# notebooks that read data/results.csv working.
+# ---------------------------------------------------------
+
+import csv
+import os
+import sqlite3
+
+RESULT_COLUMNS = ["sim_id", "seed", "player_number",
+                  "draw_strategy", "discard_strategy", "knock_strategy",
+                  "rounds", "wins", "avg_win", "var_win",
+                  "start_time", "elapsed_seconds", "notes"]
+
+_COLUMN_TYPES = {"sim_id": "INTEGER NOT NULL", "seed": "INTEGER", "player_number": "INTEGER",
+                 "draw_strategy": "TEXT", "discard_strategy": "TEXT", "knock_strategy": "TEXT",
+                 "rounds": "INTEGER", "wins": "INTEGER", "avg_win": "REAL", "var_win": "REAL",
+                 "start_time": "TEXT", "elapsed_seconds": "REAL", "notes": "TEXT"}
+
+PROFILE_COLUMNS = ["sim_id", "player_number", "phase", "strategy", "calls", "seconds", "mean_seconds"]
+
+_PROFILE_COLUMN_TYPES = {"sim_id": "INTEGER NOT NULL", "player_number": "INTEGER", "phase": "TEXT",
+                         "strategy": "TEXT", "calls": "INTEGER", "seconds": "REAL", "mean_seconds": "REAL"}
+
+_INDEXED_COLUMNS = ["sim_id", "draw_strategy", "discard_strategy", "knock_strategy", "notes"]
+
+DATABASE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+
+def is_database_path(path):
+    """Is path a SQLite results store (as opposed to a results csv)?"""
+    return path.lower().endswith(DATABASE_EXTENSIONS)
+
+
+class ResultsStore:
+    """
+    A SQLite database of simulation results, one row per player per simulation.
+    
+    path: String. Path of the database file. It is created if it does not exist.
+    timeout: Float. Seconds to wait for another writer to finish before giving up.
+    """
+    
+    def __init__(self, path, timeout = 60.0):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout = timeout, isolation_level = None)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        columns = ", ".join(c + " " + _COLUMN_TYPES[c] for c in RESULT_COLUMNS)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results (" + columns + ")")
+        for c in _INDEXED_COLUMNS:
+            self.connection.execute("CREATE INDEX IF NOT EXISTS results_" + c + " ON results (" + c + ")")
+        columns = ", ".join(c + " " + _PROFILE_COLUMN_TYPES[c] for c in PROFILE_COLUMNS)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS profiles (" + columns + ")")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS profiles_sim_id ON profiles (sim_id)")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def close(self):
+        """Close the connection to the database."""
+        self.connection.close()
+    
+    def append(self, simulations):
+        """
+        Append a batch of simulations in one transaction.
+        
+        simulations: List of Lists of Dictionaries. Each inner list is the rows of one simulation
+                     (see Game.result_rows); any sim_id they carry is ignored.
+        
+        Returns the list of sim_ids given to the simulations, in order.
+        """
+        cursor = self.connection.cursor()
+        # IMMEDIATE takes the write lock up front, so reading the last id and
+        # inserting the new rows cannot interleave with another writer
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            next_id = cursor.execute("SELECT COALESCE(MAX(sim_id), 0) FROM results").fetchone()[0] + 1
+            sim_ids = []
+            values = []
+            for rows in simulations:
+                for row in rows:
+                    values.append([next_id if c == "sim_id" else row.get(c) for c in RESULT_COLUMNS])
+                sim_ids.append(next_id)
+                next_id += 1
+            cursor.executemany("INSERT INTO results (" + ", ".join(RESULT_COLUMNS) + ") VALUES (" +
+                               ", ".join("?" * len(RESULT_COLUMNS)) + ")", values)
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        return sim_ids
+    
+    def import_rows(self, rows):
+        """Insert rows that already carry their sim_id (e.g. from an old results csv) as they are."""
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.executemany("INSERT INTO results (" + ", ".join(RESULT_COLUMNS) + ") VALUES (" +
+                               ", ".join("?" * len(RESULT_COLUMNS)) + ")",
+                               [[row.get(c) for c in RESULT_COLUMNS] for row in rows])
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+    
+    def append_profile(self, sim_id, rows):
+        """Store the timing rows of a profiled simulation (see instrumentation.GameProfiler.rows)."""
+        self.connection.executemany("INSERT INTO profiles (" + ", ".join(PROFILE_COLUMNS) + ") VALUES (" +
+                                    ", ".join("?" * len(PROFILE_COLUMNS)) + ")",
+                                    [[sim_id if c == "sim_id" else row.get(c) for c in PROFILE_COLUMNS]
+                                     for row in rows])
+    
+    def profiles(self, sim_id = None):
+        """Return the stored timing rows, of one simulation or of all of them, as a list of dictionaries."""
+        query = "SELECT " + ", ".join(PROFILE_COLUMNS) + " FROM profiles"
+        params = []
+        if sim_id is not None:
+            query += " WHERE sim_id = ?"
+            params.append(sim_id)
+        return [dict(zip(PROFILE_COLUMNS, values)) for values in self.connection.execute(query, params)]
+    
+    def _select(self, filters):
+        for c in filters:
+            if c not in RESULT_COLUMNS:
+                raise ValueError("Unknown results column: " + c)
+        query = "SELECT " + ", ".join(RESULT_COLUMNS) + " FROM results"
+        if filters:
+            query += " WHERE " + " AND ".join(c + " = ?" for c in filters)
+        query += " ORDER BY sim_id, player_number"
+        return self.connection.execute(query, list(filters.values()))
+    
+    def query(self, **filters):
+        """
+        Return the rows whose columns equal the given values, as a list of dictionaries.
+        For example store.query(notes = "Completing the grid search on constant knock strategies.")
+        """
+        return [dict(zip(RESULT_COLUMNS, values)) for values in self._select(filters)]
+    
+    def to_dataframe(self, **filters):
+        """Like query, but return a pandas DataFrame. pandas is only imported when this is called."""
+        import pandas as pd
+        return pd.DataFrame(self.query(**filters), columns = RESULT_COLUMNS)
+    
+    def export_csv(self, csv_path, **filters):
+        """Write the matching rows (all rows by default) to a csv with the same columns as data/results.csv."""
+        with open(csv_path, "w", newline = "") as f:
+            writer = csv.writer(f)
+            writer.writerow(RESULT_COLUMNS)
+            writer.writerows(self._select(filters))
+
+
+def read_csv_rows(csv_path):
+    """Read a results csv into a list of dictionaries, converting the numeric columns."""
+    rows = []
+    with open(csv_path, newline = "") as f:
+        for row in csv.DictReader(f):
+            for c in RESULT_COLUMNS:
+                value = row.get(c, "")
+                if value == "":
+                    row[c] = None
+                elif _COLUMN_TYPES[c].startswith("INTEGER"):
+                    row[c] = int(float(value))
+                elif _COLUMN_TYPES[c] == "REAL":
+                    row[c] = float(value)
+            rows.append(row)
+    return rows
+
+
+def import_csv(csv_path, db_path):
+    """Copy every row of a results csv (keeping its sim_ids) into the database at db_path."""
+    with ResultsStore(db_path) as store:
+        store.import_rows(read_csv_rows(csv_path))
+
+
+def _last_csv_sim_id(csv_path):
+    """
+    Return the largest sim_id in a results csv and the csv's column order
+    (older files have their columns in alphabetical order).
+    The file is streamed rather than loaded, but this still reads all of it.
+    """
+    last = 0
+    with open(csv_path, newline = "") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            if row.get("sim_id"):
+                last = max(last, int(float(row["sim_id"])))
+        columns = reader.fieldnames or RESULT_COLUMNS
+    return last, columns
+
+
+def append_results(rows, data_path):
+    """
+    Append the rows of one simulation (see Game.result_rows) to data_path and return its sim_id.
+    
+    If data_path is a database (.db, .sqlite or .sqlite3) the rows go to a ResultsStore. This is
+    the safe choice when several processes write at once. Otherwise data_path is treated as a
+    results csv: new rows are appended to the end of the file, which is created if needed.
+    """
+    if is_database_path(data_path):
+        with ResultsStore(data_path) as store:
+            return store.append([rows])[0]
+    
+    csv_exists = os.path.exists(data_path)
+    if csv_exists:
+        sim_id, columns = _last_csv_sim_id(data_path)
+        sim_id += 1
+    else:
+        print("No data found in", data_path)
+        print("Creating new csv.")
+        sim_id, columns = 1, RESULT_COLUMNS
+    with open(data_path, "a", newline = "") as f:
+        writer = csv.DictWriter(f, fieldnames = columns, extrasaction = "ignore")
+        if not csv_exists:
+            writer.writeheader()
+        for row in rows:
+            writer.writerow(dict(row, sim_id = sim_id))
+    return sim_id
+
+
+# Columns that identify a simulation's rows (the averages are left out: they are NaN for a game of no rounds)
+_IDENTIFYING_COLUMNS = ["seed", "player_number", "draw_strategy", "discard_strategy", "knock_strategy",
+                        "rounds", "wins", "start_time", "elapsed_seconds", "notes"]
+
+
+def stored_sim_id(rows, data_path):
+    """
+    Return the sim_id that the rows of one simulation were already appended to data_path under, or None.
+    A run resumed after stopping between appending its rows and recording their sim_id uses this
+    to avoid saving them twice.
+    """
+    if not os.path.exists(data_path):
+        return None
+    if is_database_path(data_path):
+        with ResultsStore(data_path) as store:
+            candidates = store.query(start_time = rows[0]["start_time"])
+    else:
+        candidates = [row for row in read_csv_rows(data_path) if row["start_time"] == rows[0]["start_time"]]
+    
+    def identity(row):
+        # A csv reads an empty string back as None
+        return tuple(None if row.get(c) == "" else row.get(c) for c in _IDENTIFYING_COLUMNS)
+    
+    wanted = sorted((identity(row) for row in rows), key = repr)
+    by_sim_id = {}
+    for row in candidates:
+        by_sim_id.setdefault(row["sim_id"], []).append(identity(row))
+    for sim_id, stored in by_sim_id.items():
+        if sorted(stored, key = repr) == wanted:
+            return sim_id
+    return None
+
+
+def profile_path(data_path):
+    """Return the csv that holds the timings for a results csv, e.g. data/results_profile.csv."""
+    base, extension = os.path.splitext(data_path)
+    return base + "_profile" + extension
+
+
+def append_profile(rows, data_path, sim_id):
+    """
+    Save the timing rows of a profiled simulation next to its results: in the profiles table of a
+    results database, or in the csv given by profile_path for a results csv.
+    """
+    if is_database_path(data_path):
+        with ResultsStore(data_path) as store:
+            store.append_profile(sim_id, rows)
+        return
+    path = profile_path(data_path)
+    csv_exists = os.path.exists(path)
+    with open(path, "a", newline = "") as f:
+        writer = csv.DictWriter(f, fieldnames = PROFILE_COLUMNS, extrasaction = "ignore")
+        if not csv_exists:
+            writer.writeheader()
+        for row in rows:
+            writer.writerow(dict(row, sim_id = sim_id))
@@ -6,6 +6,9 @@
 # the score of the cards that do not fit into a run or a set.
 # ---------------------------------------------------------
 
+import threading
+from collections import OrderedDict
+from itertools import combinations, product
 
 ranks = ['A', '2', '3', '4', '5', '6', '7', '8', '9', \
      'T', 'J', 'Q', 'K']
@@ -13,6 +16,12 @@ ranks = ['A', '2', '3', '4', '5', '6', '7', '8', '9', \
 suits = ['S', 'H', 'D', 'C']
 
 
+# ---------------------------------------------------------
+# Legacy recursive scorer. No longer used by Hand.score(),
+# but kept as a reference implementation for the bitmask
+# engine at the bottom of this file.
+# ---------------------------------------------------------
+
 def lreversed(l, hand_boof):
     return [k for k in reversed(l)]
 
@@ -114,13 +123,6 @@ def F(sz, hand_boof, suitStarts):
     cards[tsz] = maxCards
     return maxScore
 
-def Restore(sz, hand_boof):
-    if sz == None or mem[sz] == 0:
-        return
-    Restore(prev[sz], hand_boof)
-    if cards[sz]:
-        print (cards[sz])
-        
 def boofify(hand):
     
     '''
@@ -169,4 +171,526 @@ def give_me_handBoof_suitStarts_and_sz(hand):
     return hand_boof, suitStarts, sz
 
 
-        
+# ---------------------------------------------------------
+# Bitmask scoring engine
+#
+# A hand is held as four 13-bit suit masks, in the order of
+# `suits`. Bit r of a suit mask is set when the hand holds the
+# card of rank ranks[r] in that suit. Runs never cross suits,
+# so the best run decomposition of every possible suit mask
+# (all 8192 of them) is precomputed once at import. Scoring a
+# hand then only has to enumerate the (few) ways of pulling
+# sets out of it and look the leftovers up in the run table.
+# ---------------------------------------------------------
+
+NUM_RANKS = len(ranks)
+FULL_SUIT_MASK = (1 << NUM_RANKS) - 1
+
+# Deadwood value of each rank index: A = 1, 2-9 face value, T/J/Q/K = 10
+RANK_VALUES = [min(r + 1, 10) for r in range(NUM_RANKS)]
+
+# Map (rank, suit) to a card index in 0..51, suit major
+CARD_INDEX = {(rank, suit): s * NUM_RANKS + r
+              for s, suit in enumerate(suits) for r, rank in enumerate(ranks)}
+
+
+def _build_run_tables():
+    
+    '''
+    Precompute, for every suit mask, the deadwood left after optimally
+    removing runs from it, and the length of the run (if any) that starts
+    at the lowest card of the mask in that optimal decomposition.
+    
+    Any run that contains the lowest card must start at it, so each mask
+    only needs to consider leaving its lowest card out or starting a run
+    of length 3+ there.
+    '''
+    
+    num_masks = 1 << NUM_RANKS
+    deadwood = [0] * num_masks
+    run_start = [0] * num_masks
+    for mask in range(1, num_masks):
+        low = (mask & -mask).bit_length() - 1
+        best = deadwood[mask & (mask - 1)] + RANK_VALUES[low]
+        best_length = 0
+        run = 1 << low
+        length = 1
+        while low + length < NUM_RANKS and (mask >> (low + length)) & 1:
+            run |= 1 << (low + length)
+            length += 1
+            if length >= 3 and deadwood[mask & ~run] < best:
+                best = deadwood[mask & ~run]
+                best_length = length
+        deadwood[mask] = best
+        run_start[mask] = best_length
+    return deadwood, run_start
+
+RUN_DEADWOOD, RUN_START = _build_run_tables()
+
+
+def hand_masks(cards):
+    
+    '''
+    Convert an iterable of cards (anything with a rank and a suit attribute) into
+    a list of four suit masks, ordered like `suits`.
+    '''
+    
+    masks = [0, 0, 0, 0]
+    for c in cards:
+        idx = CARD_INDEX[(c.rank, c.suit)]
+        masks[idx // NUM_RANKS] |= 1 << (idx % NUM_RANKS)
+    return masks
+
+
+def run_members(mask):
+    """Return the cards of a suit mask that sit in three or more consecutive ranks."""
+    starts = mask & (mask >> 1) & (mask >> 2)
+    return starts | (starts << 1) | (starts << 2)
+
+
+def near_run_members(mask):
+    """Return the cards of a suit mask that have a card of the next or previous rank beside them."""
+    return mask & ((mask << 1) | (mask >> 1))
+
+
+def run_outs(mask):
+    """Return the ranks missing from a suit mask that would each complete a run of three with it."""
+    outs = (mask >> 1) & (mask >> 2) | (mask << 1) & (mask >> 1) | (mask << 1) & (mask << 2)
+    return outs & ~mask & FULL_SUIT_MASK
+
+
+def ranks_held(masks, n):
+    """Return a rank mask of the ranks that a hand holds in at least n suits."""
+    if n <= 0:
+        return FULL_SUIT_MASK
+    held = 0
+    for group in combinations(masks, n):
+        common = FULL_SUIT_MASK
+        for m in group:
+            common &= m
+        held |= common
+    return held
+
+
+# Installed by instrumentation.GameProfiler while a profiled game runs; None otherwise
+SEARCH_STATS = None
+
+# Installed by kernels.install_kernels when compiled kernels are in use; None otherwise
+KERNELS = None
+
+
+def meld_features(masks):
+    
+    '''
+    Return the run and set features of a hand given as four suit masks:
+    (run members of each suit, near run members of each suit, ranks held in 3+ suits,
+    ranks held in 2+ suits, ranks held at all). See run_members, near_run_members and ranks_held.
+    '''
+    
+    if KERNELS is not None:
+        features = KERNELS.meld_features(masks[0], masks[1], masks[2], masks[3])
+        return list(features[0:4]), list(features[4:8]), features[8], features[9], features[10]
+    return ([run_members(m) for m in masks], [near_run_members(m) for m in masks],
+            ranks_held(masks, 3), ranks_held(masks, 2), ranks_held(masks, 1))
+
+
+def _set_choices(masks):
+    
+    '''
+    Return, for every rank held in at least three suits, the list of ways to
+    meld it as a set. Each way is a tuple of 4 bits (one per suit) saying which
+    suits go into the set. Not melding the rank is always also an option and is
+    not included in the list.
+    '''
+    
+    set_ranks = ranks_held(masks, 3)
+    choices = []
+    while set_ranks:
+        bit = set_ranks & -set_ranks
+        set_ranks ^= bit
+        present = [1 if m & bit else 0 for m in masks]
+        options = []
+        if sum(present) == 4:
+            options.append((bit, (1, 1, 1, 1)))
+            for skip in range(4):
+                options.append((bit, tuple(0 if s == skip else 1 for s in range(4))))
+        else:
+            options.append((bit, tuple(present)))
+        choices.append(options)
+    return choices
+
+
+def _best_split(masks):
+    
+    '''
+    Find the set choice that minimizes deadwood.
+    Returns the deadwood, the four suit masks left over for runs,
+    and the list of (rank bit, suits used) sets that were melded.
+    '''
+    
+    choices = _set_choices(masks)
+    if SEARCH_STATS is not None:
+        SEARCH_STATS.record(choices)
+    best = [RUN_DEADWOOD[masks[0]] + RUN_DEADWOOD[masks[1]] +
+            RUN_DEADWOOD[masks[2]] + RUN_DEADWOOD[masks[3]], list(masks), []]
+    
+    def search(i, remaining, chosen):
+        if i == len(choices):
+            dw = (RUN_DEADWOOD[remaining[0]] + RUN_DEADWOOD[remaining[1]] +
+                  RUN_DEADWOOD[remaining[2]] + RUN_DEADWOOD[remaining[3]])
+            if dw < best[0]:
+                best[0], best[1], best[2] = dw, list(remaining), list(chosen)
+            return
+        # Leave this rank out of any set
+        search(i + 1, remaining, chosen)
+        for bit, used in choices[i]:
+            taken = [m & ~bit if u else m for m, u in zip(remaining, used)]
+            chosen.append((bit, used))
+            search(i + 1, taken, chosen)
+            chosen.pop()
+    
+    if choices:
+        search(0, list(masks), [])
+    return best[0], best[1], best[2]
+
+
+def deadwood(masks):
+    
+    '''
+    Return the points left in a hand (given as four suit masks) after optimally
+    removing cards that can be considered in a run or a set.
+    '''
+    
+    if KERNELS is not None and SEARCH_STATS is None:
+        return KERNELS.deadwood(masks[0], masks[1], masks[2], masks[3])
+    return _best_split(masks)[0]
+
+
+def deadwood_and_melds(masks):
+    
+    '''
+    Like deadwood(), but also return the melds that achieve it.
+    
+    Returns (deadwood, melds), where melds is a list of melds and each meld is a
+    list of [rank, suit] pairs (the same card format as a hand_boof).
+    Sets come first, then runs ordered by suit and rank.
+    '''
+    
+    dw, remaining, sets_used = _best_split(masks)
+    melds = []
+    for bit, used in sets_used:
+        rank = ranks[bit.bit_length() - 1]
+        melds.append([[rank, suits[s]] for s in range(4) if used[s]])
+    for s in range(4):
+        mask = remaining[s]
+        while mask:
+            low = (mask & -mask).bit_length() - 1
+            length = RUN_START[mask]
+            if length:
+                melds.append([[ranks[r], suits[s]] for r in range(low, low + length)])
+                mask &= ~(((1 << length) - 1) << low)
+            else:
+                mask &= mask - 1
+    return dw, melds
+
+
+# ---------------------------------------------------------
+# Process-wide deadwood cache
+#
+# Deadwood does not depend on which suit is which, so hands
+# are keyed by their suit masks in sorted order. That folds
+# up to 24 suit relabellings of a hand into one entry.
+# ---------------------------------------------------------
+
+def canonical_masks(masks):
+    """Return a hashable form of a hand's suit masks that is invariant under suit permutation."""
+    return tuple(sorted(masks))
+
+
+class DeadwoodCache:
+    """
+    A bounded least-recently-used cache of hand deadwood.
+    
+    maxsize: Int. Maximum number of canonical hands to remember. 0 disables caching.
+    
+    hits, misses and evictions count lookups since the cache was created or last cleared.
+    It can be shared by threads (see server.py): the bookkeeping is done under a lock, the scoring is not.
+    """
+    
+    def __init__(self, maxsize = 65536):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def deadwood(self, masks):
+        """Return the deadwood of a hand given as four suit masks, scoring it only on a cache miss."""
+        key = canonical_masks(masks)
+        entries = self.entries
+        with self.lock:
+            if key in entries:
+                self.hits += 1
+                entries.move_to_end(key)
+                return entries[key]
+            self.misses += 1
+        value = deadwood(masks)
+        if self.maxsize > 0:
+            with self.lock:
+                entries[key] = value
+                if len(entries) > self.maxsize:
+                    entries.popitem(last = False)
+                    self.evictions += 1
+        return value
+    
+    def resize(self, maxsize):
+        """Change the maximum size, evicting the least recently used hands if needed."""
+        with self.lock:
+            self.maxsize = maxsize
+            while len(self.entries) > max(maxsize, 0):
+                self.entries.popitem(last = False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Forget every hand and reset the counters."""
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+    
+    def info(self):
+        """Return a dictionary of the cache's size and counters."""
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self.entries), "maxsize": self.maxsize,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+# Shared by every Hand in the process
+SCORE_CACHE = DeadwoodCache()
+
+
+def cached_deadwood(masks):
+    """Return the deadwood of a hand given as four suit masks, using the process-wide cache."""
+    return SCORE_CACHE.deadwood(masks)
+
+
+def set_score_cache_size(maxsize):
+    """Set the maximum number of hands held by the process-wide cache (0 disables it)."""
+    SCORE_CACHE.resize(maxsize)
+
+
+def score_cache_info():
+    """Return the hit, miss and eviction counters of the process-wide cache."""
+    return SCORE_CACHE.info()
+
+
+def _set_splits(masks):
+    
+    '''
+    Return the suit masks left over for runs after every possible way of
+    pulling sets out of the hand, including pulling none.
+    '''
+    
+    choices = _set_choices(masks)
+    splits = []
+    
+    def search(i, remaining):
+        if i == len(choices):
+            splits.append(remaining)
+            return
+        search(i + 1, remaining)
+        for bit, used in choices[i]:
+            search(i + 1, tuple(m & ~bit if u else m for m, u in zip(remaining, used)))
+    
+    search(0, tuple(masks))
+    return splits
+
+
+def deadwood_without_each(masks):
+    
+    '''
+    Return the deadwood of the hand after removing each one of its cards,
+    as a dictionary mapping card index (see CARD_INDEX) to deadwood.
+    
+    Every set choice of the smaller hand is also a set choice of the full hand
+    that does not use the removed card, so the set enumeration is done once
+    and shared by all the candidates.
+    '''
+    
+    splits = _set_splits(masks)
+    result = {}
+    for s in range(4):
+        mask = masks[s]
+        while mask:
+            bit = mask & -mask
+            mask ^= bit
+            best = None
+            for remaining in splits:
+                if not remaining[s] & bit:
+                    continue # the card is in one of this split's sets
+                dw = 0
+                for t in range(4):
+                    dw += RUN_DEADWOOD[remaining[t] & ~bit if t == s else remaining[t]]
+                if best is None or dw < best:
+                    best = dw
+            result[s * NUM_RANKS + bit.bit_length() - 1] = best
+    return result
+
+
+def deadwood_with_each(masks, indices, splits = None):
+    
+    '''
+    Return the deadwood of the hand after adding each one of the cards with these indices
+    (see CARD_INDEX), as a dictionary mapping card index to deadwood.
+    
+    Adding a card only changes the set choices of its own rank, so the set enumeration of
+    the current hand is shared: every split of the larger hand is a split of the current hand
+    that leaves the card's rank out of any set, plus one of the larger hand's choices for that rank.
+    
+    splits: The hand's _set_splits, if they are already known.
+    '''
+    
+    if splits is None:
+        splits = _set_splits(masks)
+    totals = [RUN_DEADWOOD[r[0]] + RUN_DEADWOOD[r[1]] + RUN_DEADWOOD[r[2]] + RUN_DEADWOOD[r[3]] for r in splits]
+    result = {}
+    for idx in indices:
+        s, bit = idx // NUM_RANKS, 1 << (idx % NUM_RANKS)
+        held = [m & bit for m in masks]
+        present = [1 if held[t] or t == s else 0 for t in range(4)]
+        # The larger hand's ways to meld the card's rank as a set (see _set_choices)
+        options = []
+        if sum(present) == 4:
+            options.append((1, 1, 1, 1))
+            for skip in range(4):
+                options.append(tuple(0 if t == skip else 1 for t in range(4)))
+        elif sum(present) == 3:
+            options.append(tuple(present))
+        best = None
+        for remaining, total in zip(splits, totals):
+            if (remaining[0] & bit != held[0] or remaining[1] & bit != held[1] or
+                    remaining[2] & bit != held[2] or remaining[3] & bit != held[3]):
+                continue # the card's rank is in one of this split's sets
+            # Only the card's suit changes, unless its rank is melded as a set
+            dw = total - RUN_DEADWOOD[remaining[s]] + RUN_DEADWOOD[remaining[s] | bit]
+            if options:
+                larger = [m | bit if t == s else m for t, m in enumerate(remaining)]
+                for used in options:
+                    dw = min(dw, sum(RUN_DEADWOOD[m & ~bit if u else m] for m, u in zip(larger, used)))
+            if best is None or dw < best:
+                best = dw
+        result[idx] = best
+    return result
+
+
+def deadwood_with(masks, idx, splits = None):
+    """Return the deadwood of the hand after adding the card with index idx (see deadwood_with_each)."""
+    return deadwood_with_each(masks, [idx], splits)[idx]
+
+
+# ---------------------------------------------------------
+# Batch scoring
+#
+# Scores many hands at once with NumPy. Hands are grouped by
+# how many ranks could form a set, and each group tries every
+# set choice for all of its hands in one array operation, so
+# the Python-level work does not grow with the number of hands.
+# ---------------------------------------------------------
+
+# Set options tried for each candidate rank:
+# 0 = no set, 1 = all four suits, 2 + s = every suit except suit s
+_SET_OPTIONS = 6
+
+
+def score_many(hands):
+    
+    '''
+    Return the deadwood of many hands as a NumPy integer array.
+    
+    hands: Either an (N, 52) boolean matrix where column CARD_INDEX[(rank, suit)] says if
+           the hand holds that card, or an (N, k) integer matrix of card indices (0-51).
+    
+    NumPy is imported here rather than at the top of the module, so that plain
+    game simulation does not need it.
+    '''
+    
+    import numpy as np
+    
+    hands = np.asarray(hands)
+    if hands.ndim != 2:
+        raise ValueError("hands must be a 2-d matrix, got shape " + str(hands.shape))
+    num_hands = hands.shape[0]
+    if hands.dtype == bool:
+        if hands.shape[1] != 4 * NUM_RANKS:
+            raise ValueError("a boolean hand matrix must have 52 columns, got " + str(hands.shape[1]))
+        cards = hands
+    else:
+        idx = hands.astype(np.int64)
+        if idx.size and (idx.min() < 0 or idx.max() >= 4 * NUM_RANKS):
+            raise ValueError("card indices must be between 0 and 51")
+        cards = np.zeros((num_hands, 4 * NUM_RANKS), dtype = bool)
+        cards[np.arange(num_hands)[:, None], idx] = True
+        if (cards.sum(axis = 1) != idx.shape[1]).any():
+            raise ValueError("a hand contains the same card more than once")
+    
+    bits = cards.reshape(num_hands, 4, NUM_RANKS)
+    masks = (bits * (1 << np.arange(NUM_RANKS, dtype = np.int64))).sum(axis = 2)
+    return _score_masks_many(masks, bits)
+
+
+def score_masks_many(masks):
+    
+    '''
+    Return the deadwood of many hands given as an (N, 4) integer array of suit masks
+    (the same layout as hand_masks, one hand per row).
+    '''
+    
+    import numpy as np
+    
+    masks = np.asarray(masks, dtype = np.int64)
+    bits = ((masks[:, :, None] >> np.arange(NUM_RANKS, dtype = np.int64)) & 1).astype(bool)
+    return _score_masks_many(masks, bits)
+
+
+def _score_masks_many(masks, bits):
+    """Batch deadwood search shared by score_many and score_masks_many. bits is masks unpacked to (N, 4, 13)."""
+    
+    import numpy as np
+    
+    if KERNELS is not None:
+        return KERNELS.deadwood_many(masks)
+    num_hands = masks.shape[0]
+    run_deadwood = np.array(RUN_DEADWOOD, dtype = np.int64)
+    result = run_deadwood[masks].sum(axis = 1)
+    
+    set_ranks = bits.sum(axis = 1) >= 3
+    num_candidates = set_ranks.sum(axis = 1)
+    for c in range(1, int(num_candidates.max(initial = 0)) + 1):
+        rows = np.nonzero(num_candidates == c)[0]
+        if not len(rows):
+            continue
+        n = len(rows)
+        sub_masks = masks[rows]
+        candidate_ranks = np.nonzero(set_ranks[rows])[1].reshape(n, c)
+        # present[h, j, s]: does hand h hold its j-th candidate rank in suit s
+        present = bits[rows[:, None], :, candidate_ranks]
+        rank_bits = np.int64(1) << candidate_ranks
+        best = result[rows].copy()
+        for combo in product(range(_SET_OPTIONS), repeat = c):
+            if not any(combo):
+                continue # no sets at all, already in best
+            remaining = sub_masks.copy()
+            valid = np.ones(n, dtype = bool)
+            for j, option in enumerate(combo):
+                if option == 0:
+                    continue
+                used = np.arange(4) != option - 2
+                valid &= present[:, j, used].all(axis = 1)
+                remaining[:, used] &= ~rank_bits[:, j:j + 1]
+            dw = run_deadwood[remaining].sum(axis = 1)
+            best = np.where(valid & (dw < best), dw, best)
+        result[rows] = best
+    return result
@@ -0,0 +1,451 @@
+# ---------------------------------------------------------
+# Game server: people play bots at many tables at once.
+#
+# An asyncio server speaking line-delimited JSON over TCP.
+# Each table is one Game between a person (player 0) and a
+# bot (player 1), driven turn by turn by its own coroutine.
+# Bot turns (strategy calls and Hand.score) run in a bounded
+# thread pool, as does round scoring, so a slow decision at
+# one table never holds up the others. Every table keeps the
+# latency of its bot decisions, reported as percentiles.
+#
+#   python server.py serve --port 8765
+#   python server.py loadtest --clients 100 --rounds 5
+#
+# Protocol (one JSON object per line):
+#   client: {"type": "join", "difficulty": "intermediate", "rounds": 5, "seed": 1}
+#   server: {"type": "joined", "table": 3, ...}
+#   server: {"type": "deal" | "turn" | "knock" | "round_end" | "game_over", "table": 3, ...}
+#   server: {"type": "decide", "table": 3, "decision": "knock" | "draw" | "discard", "hand": [...], ...}
+#   client: {"type": "decision", "table": 3, "knock": false}   (or "draw": "pile" / "deck",
+#                                                                 or "discard": "QH")
+#   client: {"type": "stats"}   server: {"type": "stats", "tables": {...}}
+# Cards are written as rank then suit, e.g. "TS" for the 10 of spades.
+# ---------------------------------------------------------
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from gameLogic import Game, Hand, Pile, CARD_TEMPLATE
+from observers import GameObserver
+from scoring import CARD_INDEX
+from strategies import make_strategy_dict
+
+# Bot strategies (knock, pile, discard) for each difficulty
+DIFFICULTIES = {"random": ("Random Knock", "Random Pile", "Random Discard"),
+                "beginner": ("Knock at 40", "No Pile", "Discard Highest Useless"),
+                "intermediate": ("Knock at 25", "Pile if Completes", "Discard Highest Useless"),
+                "advanced": ("DynamicKnockHigh vs conservative knock 25", "Pile if Completes", "Discard Highest Dead"),
+                "expert": ("Monte Carlo Knock", "Monte Carlo Pile", "Monte Carlo Discard")}
+
+# Most rounds a person can ask to play at one table
+MAX_ROUNDS = 100
+
+# Strategies a scripted client plays with
+CLIENT_STRATEGIES = ("Knock at 25", "Pile if Completes", "Discard Highest Useless")
+
+
+def card_name(card):
+    return card.rank + card.suit
+
+
+def parse_card(name):
+    """Return the Card named like "TS". Raises a ValueError for anything else."""
+    index = CARD_INDEX.get((name[:1], name[1:])) if isinstance(name, str) else None
+    if index is None:
+        raise ValueError("Not a card: " + repr(name))
+    return CARD_TEMPLATE[index]
+
+
+def percentiles(values, points = (50, 90, 99)):
+    """Return the given percentiles (nearest rank) of values, or None for each if there are none."""
+    ordered = sorted(values)
+    result = {}
+    for p in points:
+        result["p" + str(p)] = ordered[min(len(ordered) - 1, len(ordered) * p // 100)] if ordered else None
+    return result
+
+
+class LatencyTracker:
+    """The most recent maxlen latencies (in seconds) of some kind of decision."""
+
+    def __init__(self, maxlen = 10000):
+        self.latencies = deque(maxlen = maxlen)
+        self.count = 0
+
+    def add(self, seconds):
+        self.latencies.append(seconds)
+        self.count += 1
+
+    def summary(self):
+        """Decision count and p50 / p90 / p99 / max latency in milliseconds."""
+        result = {"decisions": self.count}
+        for name, value in percentiles(self.latencies).items():
+            result[name + "_ms"] = None if value is None else value * 1e3
+        result["max_ms"] = max(self.latencies) * 1e3 if self.latencies else None
+        return result
+
+
+class TableMessenger(GameObserver):
+    """Queue up the messages a table's person should see. The table sends them from the event loop."""
+
+    def __init__(self, table_id):
+        self.table_id = table_id
+        self.outbox = []
+
+    def post(self, message_type, **fields):
+        self.outbox.append(dict(type = message_type, table = self.table_id, **fields))
+
+    def on_deal(self, game, round_number):
+        self.post("deal", round = round_number, dealer = game.curr_dealer,
+                  hand = [card_name(c) for c in game.players[0].hand.cards])
+
+    def on_turn(self, game, round_number, turn, player_number):
+        player = game.players[player_number]
+        # A card drawn from the deck is only shown to the player who drew it
+        shown = player.drew_from_pile or player_number == 0
+        self.post("turn", round = round_number, turn = turn, player = player_number,
+                  drew = None if player.drew_from_pile is None else ("pile" if player.drew_from_pile else "deck"),
+                  drawn = card_name(player.last_draw) if player.last_draw is not None and shown else None,
+                  discarded = None if player.last_discard is None else card_name(player.last_discard))
+
+    def on_knock(self, game, round_number, turn, player_number, deck_ran_out):
+        self.post("knock", round = round_number, turn = turn, player = player_number, deck_ran_out = deck_ran_out)
+
+    def on_round_end(self, game, summary):
+        self.post("round_end", hands = [[card_name(c) for c in p.hand.cards] for p in game.players],
+                  **{key: summary[key] for key in ["round", "knocker", "round_scores", "score_changes", "scores"]})
+
+
+class Table:
+    """
+    One game between a person (player 0, whose decisions arrive in self.decisions) and a bot (player 1).
+
+    send: Function(message). Writes a message to the person's connection.
+    pool: Executor. Where bot turns and scoring run.
+    """
+
+    def __init__(self, table_id, difficulty, rounds, seed, send, pool, strategy_dict):
+        if difficulty not in DIFFICULTIES:
+            raise ValueError("Unknown difficulty " + repr(difficulty) + ", pick one of " + ", ".join(DIFFICULTIES))
+        bot = DIFFICULTIES[difficulty]
+        self.table_id = table_id
+        self.difficulty = difficulty
+        self.rounds = rounds
+        self.send = send
+        self.pool = pool
+        self.messenger = TableMessenger(table_id)
+        # Player 0's strategies are never called: the person decides for them
+        self.game = Game(player_names = ["Person", "Bot"], strategy_dict = strategy_dict,
+                         knock_strategies = [bot[0]] * 2, pile_strategies = [bot[1]] * 2,
+                         discard_strategies = [bot[2]] * 2, target_score = None, total_rounds = rounds,
+                         random_seed = seed, save_results = False, observers = [self.messenger])
+        self.decisions = asyncio.Queue()
+        self.bot_latency = LatencyTracker()
+        self.person_latency = LatencyTracker()
+        self.finished = False
+
+    def flush(self):
+        for message in self.messenger.outbox:
+            self.send(message)
+        self.messenger.outbox.clear()
+
+    async def run(self):
+        """Play every round, then report the final scores."""
+        loop = asyncio.get_running_loop()
+        game = self.game
+        for round_number in range(self.rounds):
+            game.deal_round(round_number)
+            self.flush()
+            while True:
+                player_number = game.next_turn()
+                if player_number is None:
+                    break
+                if player_number == 0:
+                    await self.person_turn()
+                else:
+                    start = time.perf_counter()
+                    await loop.run_in_executor(self.pool, game.players[player_number].take_turn,
+                                               game.deck, game.pile, game.anyone_knocked, game.current_turn)
+                    self.bot_latency.add(time.perf_counter() - start)
+                game.end_turn(player_number)
+                self.flush()
+            await loop.run_in_executor(self.pool, game.score_round)
+            self.flush()
+        self.finished = True
+        self.send({"type": "game_over", "table": self.table_id, "scores": [p.get_score() for p in game.players]})
+
+    async def ask(self, decision, parse, **state):
+        """Ask the person for a decision until they give a valid one, and return parse(message)."""
+        player = self.game.players[0]
+        deadwood = await asyncio.get_running_loop().run_in_executor(self.pool, player.hand.score)
+        pile = self.game.pile
+        self.send(dict(type = "decide", table = self.table_id, decision = decision, round = self.game.round_number,
+                       turn = self.game.current_turn, hand = [card_name(c) for c in player.hand.cards],
+                       deadwood = deadwood, top = card_name(pile.view_top_card()) if pile.length() else None,
+                       deck_left = self.game.deck.length(), anyone_knocked = self.game.anyone_knocked, **state))
+        start = time.perf_counter()
+        while True:
+            message = await self.decisions.get()
+            try:
+                value = parse(message)
+            except (KeyError, TypeError, ValueError) as error:
+                self.send({"type": "error", "table": self.table_id, "error": str(error)})
+                continue
+            self.person_latency.add(time.perf_counter() - start)
+            return value
+
+    async def person_turn(self):
+        """Take player 0's turn with the person's decisions."""
+        game = self.game
+        player = game.players[0]
+        knock = False
+        if not game.anyone_knocked:
+            knock = await self.ask("knock", lambda message: bool(message["knock"]))
+        player.begin_turn(knock)
+        if knock:
+            return
+
+        def parse_draw(message):
+            if message["draw"] not in ("pile", "deck"):
+                raise ValueError("draw must be 'pile' or 'deck'")
+            if message["draw"] == "pile" and not game.pile.length():
+                raise ValueError("The pile is empty")
+            return message["draw"] == "pile"
+        player.draw_card(game.deck, game.pile, await self.ask("draw", parse_draw))
+
+        def parse_discard(message):
+            card = parse_card(message["discard"])
+            if card not in player.hand.cards:
+                raise ValueError(message["discard"] + " is not in your hand")
+            return card
+        player.discard_to_pile(await self.ask("discard", parse_discard, drawn = card_name(player.last_draw)), game.pile)
+
+    def stats(self):
+        return {"difficulty": self.difficulty, "finished": self.finished,
+                "bot": self.bot_latency.summary(), "person": self.person_latency.summary()}
+
+
+class GameServer:
+    """
+    Hosts tables for any number of connections.
+
+    bot_workers: Int. Size of the thread pool that bot turns and scoring run in.
+    keep_finished: Int. How many finished tables to keep reporting statistics for.
+    max_rounds: Int. Most rounds a join may ask for.
+    """
+
+    def __init__(self, host = "127.0.0.1", port = 8765, bot_workers = 4, keep_finished = 1000,
+                 max_rounds = MAX_ROUNDS):
+        self.host = host
+        self.port = port
+        self.max_rounds = max_rounds
+        self.pool = ThreadPoolExecutor(max_workers = bot_workers, thread_name_prefix = "bot")
+        self.strategy_dict = make_strategy_dict()
+        self.table_ids = itertools.count(1)
+        self.tables = {}
+        self.finished = deque(maxlen = keep_finished)
+        self.server = None
+        self.connections = set()
+
+    async def start(self):
+        """Start listening. With port 0 a free port is picked, see self.port."""
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+        for connection in list(self.connections):
+            connection.cancel()
+        await asyncio.gather(*self.connections, return_exceptions = True)
+        if self.server is not None:
+            await self.server.wait_closed()
+        self.pool.shutdown(wait = False, cancel_futures = True)
+
+    def stats(self):
+        """
+        Bot and person decision latency percentiles of every live (and recently finished) table,
+        and the expert bot's search statistics (rollouts per second).
+        """
+        tables = {table.table_id: table.stats() for table in list(self.finished) + list(self.tables.values())}
+        bot = LatencyTracker(maxlen = None)
+        for table in list(self.finished) + list(self.tables.values()):
+            bot.latencies.extend(table.bot_latency.latencies)
+            bot.count += table.bot_latency.count
+        search = self.strategy_dict["Monte Carlo Knock"].bot
+        return {"type": "stats", "live_tables": len(self.tables), "tables": tables, "bot": bot.summary(),
+                "search": search.stats()}
+
+    async def handle(self, reader, writer):
+        """Serve one connection, which can play at several tables at once."""
+        tasks = {}
+        self.connections.add(asyncio.current_task())
+
+        def send(message):
+            writer.write(json.dumps(message).encode() + b"\n")
+
+        async def play(table):
+            try:
+                await table.run()
+            finally:
+                self.tables.pop(table.table_id, None)
+                self.finished.append(table)
+
+        try:
+            async for line in reader:
+                try:
+                    message = json.loads(line)
+                    kind = message["type"]
+                    if kind == "join":
+                        rounds = int(message.get("rounds", 1))
+                        if not 1 <= rounds <= self.max_rounds:
+                            raise ValueError("rounds must be between 1 and " + str(self.max_rounds))
+                        table_id = next(self.table_ids)
+                        table = Table(table_id, message.get("difficulty", "intermediate"), rounds,
+                                      message.get("seed"), send, self.pool, self.strategy_dict)
+                        self.tables[table_id] = table
+                        send({"type": "joined", "table": table_id, "difficulty": table.difficulty,
+                              "rounds": table.rounds})
+                        tasks[table_id] = asyncio.create_task(play(table))
+                    elif kind == "decision":
+                        # Only this connection's own live tables take its decisions
+                        table_id = message["table"]
+                        if table_id not in tasks or table_id not in self.tables:
+                            raise ValueError("No table " + repr(table_id) + " of yours is being played")
+                        self.tables[table_id].decisions.put_nowait(message)
+                    elif kind == "stats":
+                        send(self.stats())
+                    else:
+                        raise ValueError("Unknown message type " + repr(kind))
+                except (KeyError, TypeError, ValueError) as error:
+                    send({"type": "error", "error": str(error)})
+                await writer.drain()
+        except (asyncio.CancelledError, ConnectionError):
+            # The server is closing or the person left: end the connection quietly
+            pass
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            self.connections.discard(asyncio.current_task())
+            writer.close()
+
+
+async def scripted_client(host, port, difficulty = "intermediate", rounds = 3, seed = None,
+                          strategies = CLIENT_STRATEGIES):
+
+    '''
+    Connect, play one game at a table by answering with the given (knock, pile, discard) strategies,
+    and return {"table", "scores", "decisions", "seconds"}.
+    '''
+
+    strategy_dict = make_strategy_dict()
+    knock, draw, discard = [strategy_dict[name] for name in strategies]
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(json.dumps({"type": "join", "difficulty": difficulty, "rounds": rounds, "seed": seed}).encode() + b"\n")
+    await writer.drain()
+    start = time.perf_counter()
+    decisions = 0
+    try:
+        async for line in reader:
+            message = json.loads(line)
+            if message["type"] == "decide":
+                hand, pile = Hand(), Pile()
+                hand.add_cards([parse_card(c) for c in message["hand"]])
+                if message["top"] is not None:
+                    pile.add_cards(parse_card(message["top"]))
+                args = (hand, None, pile, message["anyone_knocked"], message["turn"])
+                reply = {"type": "decision", "table": message["table"]}
+                if message["decision"] == "knock":
+                    reply["knock"] = bool(knock(*args))
+                elif message["decision"] == "draw":
+                    reply["draw"] = "pile" if draw(*args) else "deck"
+                else:
+                    reply["discard"] = card_name(discard(*args))
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+                decisions += 1
+            elif message["type"] == "game_over":
+                return {"table": message["table"], "scores": message["scores"], "decisions": decisions,
+                        "seconds": time.perf_counter() - start}
+            elif message["type"] == "error":
+                raise RuntimeError(message["error"])
+    finally:
+        writer.close()
+
+
+async def load_test(clients = 50, rounds = 3, difficulty = "intermediate", host = "127.0.0.1", port = None,
+                    bot_workers = 4):
+
+    '''
+    Play clients scripted games at once against a server (one started here if port is None),
+    and return the games per second and the server's latency statistics.
+    '''
+
+    server = None
+    if port is None:
+        server = await GameServer(host, 0, bot_workers = bot_workers, max_rounds = max(rounds, MAX_ROUNDS)).start()
+        port = server.port
+    try:
+        start = time.perf_counter()
+        results = await asyncio.gather(*[scripted_client(host, port, difficulty, rounds, seed = i)
+                                         for i in range(clients)])
+        elapsed = time.perf_counter() - start
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(b'{"type": "stats"}\n')
+        await writer.drain()
+        stats = json.loads(await reader.readline())
+        writer.close()
+    finally:
+        if server is not None:
+            await server.close()
+    return {"games": len(results), "rounds": len(results) * rounds, "seconds": elapsed,
+            "games_per_second": len(results) / elapsed, "person_decisions": sum(r["decisions"] for r in results),
+            "bot": stats["bot"], "search": stats["search"], "tables": stats["tables"]}
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Host Nine Card tables, or load test a host.")
+    parser.add_argument("command", choices = ["serve", "loadtest"])
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, help = "Port to serve on (default 8765), or to load test "
+                                                     "(default: start a server for the test).")
+    parser.add_argument("--bot-workers", type = int, default = 4, help = "Threads for bot turns and scoring.")
+    parser.add_argument("--max-rounds", type = int, default = MAX_ROUNDS, help = "Most rounds a table may play.")
+    parser.add_argument("--kernels", action = "store_true",
+                        help = "Score with the compiled kernels if Numba is installed, compiled before serving.")
+    parser.add_argument("--clients", type = int, default = 50)
+    parser.add_argument("--rounds", type = int, default = 3)
+    parser.add_argument("--difficulty", default = "intermediate", choices = list(DIFFICULTIES))
+    args = parser.parse_args(argv)
+    if args.kernels:
+        from kernels import install_kernels
+        print("Scoring backend:", install_kernels())
+    if args.command == "serve":
+        server = GameServer(args.host, args.port or 8765, bot_workers = args.bot_workers, max_rounds = args.max_rounds)
+        print("Serving on", args.host, server.port)
+        asyncio.run(server.serve_forever())
+    else:
+        result = asyncio.run(load_test(args.clients, args.rounds, args.difficulty, args.host, args.port,
+                                       args.bot_workers))
+        print(result["games"], "games,", result["rounds"], "rounds in", round(result["seconds"], 2), "seconds")
+        print("Bot decision latency:", result["bot"])
+        if result["search"]["decisions"]:
+            print("Expert search:", round(result["search"]["rollouts_per_second"]), "rollouts per second,",
+                  round(result["search"]["rollouts_per_decision"]), "per decision")
+
+
+if __name__ == "__main__":
+    main()
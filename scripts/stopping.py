@@ -0,0 +1,109 @@
+# ---------------------------------------------------------
+# Adaptive early stopping for matchups.
+#
+# Instead of always playing a fixed number of rounds, a game
+# with a stopping rule checks the per-round score differences
+# between player 0 and player 1 after every batch of rounds
+# and stops as soon as either
+#   1) the confidence interval on their mean is narrower than
+#      the target ("precise"), or
+#   2) a sequential test is sure of the sign of the mean
+#      ("decided").
+# The sequential test is a mixture sequential probability
+# ratio test. With a known variance it stays valid however
+# often it is checked (unlike a plain t-test repeated after
+# every batch). We plug in the sample variance instead, so
+# the error control is only approximate: close to alpha once
+# the estimate has settled, which is what min_rounds is for,
+# but not guaranteed in the first batches.
+#
+# NumPy is only imported when a rule is checked, so importing
+# this module (and the game core) stays light.
+# ---------------------------------------------------------
+
+import math
+from statistics import NormalDist
+
+PRECISE = "precise"
+DECIDED = "decided"
+
+
+class StoppingRule:
+    """
+    When to stop a matchup early. The rule holds no state, so one rule can be shared by many games.
+
+    half_width: Float. Stop once the confidence interval on the mean per-round score difference is
+                       at most this many points either side of the mean. None to never stop for this.
+    confidence: Float. Confidence level of that interval.
+    alpha: Float. Error rate (approximate, see the module notes) of the sequential test that the mean
+                  difference is not zero. None to never stop for this.
+    effect_scale: Float. Size (in points per round) of the differences the sequential test is tuned to find.
+    batch_size: Int. Rounds played between checks.
+    min_rounds: Int. Never stop before this many rounds (the variance estimate needs some rounds).
+    """
+
+    def __init__(self, half_width = 2.0, confidence = 0.95, alpha = 0.05, effect_scale = 5.0,
+                 batch_size = 50, min_rounds = 100):
+        self.half_width = half_width
+        self.confidence = confidence
+        self.alpha = alpha
+        self.effect_scale = effect_scale
+        self.batch_size = batch_size
+        self.min_rounds = min_rounds
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Rebuild a rule from its attributes saved as a dictionary (e.g. in a sweep's JSON settings)."""
+        return cls(**{name: settings[name] for name in ("half_width", "confidence", "alpha", "effect_scale",
+                                                        "batch_size", "min_rounds")})
+
+    def __repr__(self):
+        return ("StoppingRule(half_width = {}, confidence = {}, alpha = {}, effect_scale = {}, "
+                "batch_size = {}, min_rounds = {})").format(self.half_width, self.confidence, self.alpha,
+                                                            self.effect_scale, self.batch_size, self.min_rounds)
+
+    def interval(self, differences):
+        """Return the (low, high) confidence interval on the mean of differences."""
+        import numpy as np
+        n = len(differences)
+        mean = float(np.mean(differences))
+        half = self.z * float(np.std(differences, ddof = 1)) / math.sqrt(n)
+        return mean - half, mean + half
+
+    def log_likelihood_ratio(self, differences):
+        """
+        Log of the mixture likelihood ratio of "the mean difference is not zero" against "it is zero",
+        for normal differences (with the sample variance plugged in, see the module notes) and a
+        normal(0, effect_scale^2) mixture.
+        """
+        import numpy as np
+        n = len(differences)
+        mean = float(np.mean(differences))
+        var = float(np.var(differences, ddof = 1))
+        if var == 0:
+            return math.inf if mean != 0 else 0.0
+        tau2 = self.effect_scale ** 2
+        return 0.5 * math.log(var / (var + n * tau2)) + n * n * tau2 * mean * mean / (2 * var * (var + n * tau2))
+
+    def check(self, differences):
+        """
+        Should the matchup stop after these per-round score differences?
+        Returns PRECISE, DECIDED, or None to keep playing.
+        """
+        n = len(differences)
+        if n < max(self.min_rounds, 2) or n % self.batch_size != 0:
+            return None
+        if self.alpha is not None and self.log_likelihood_ratio(differences) >= -math.log(self.alpha):
+            return DECIDED
+        if self.half_width is not None:
+            low, high = self.interval(differences)
+            if (high - low) / 2 <= self.half_width:
+                return PRECISE
+        return None
+
+
+def score_differences(game):
+    """Per-round score changes of player 0 minus those of player 1, as a NumPy array."""
+    import numpy as np
+    return np.diff(np.array(game.players[0].score)) - np.diff(np.array(game.players[1].score))
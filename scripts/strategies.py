@@ -2,9 +2,15 @@
 # Strategy functions and their associated helpers.
 #----------------------------------------------------------
 
-import numpy as np
-import pandas as pd
+import hashlib
+import json
+import os
+import re
+import struct
+from abc import ABC, abstractmethod
 from gameLogic import *
+from cardMemory import CardMemory
+from monteCarlo import MonteCarloBot
 
 def sort_hand(hand):
     
@@ -18,7 +24,7 @@ def sort_hand(hand):
     
     '''
     
-    
+    import pandas as pd
     
     frame_of_cards = pd.DataFrame(
                             {'suits': [c.suit for c in hand.cards], 'ranks': [c.rank for c in hand.cards], 
@@ -41,60 +47,142 @@ def add_keeper_column(df):
     We see if the cards are a part of 1. any runs (3 or more straight flush) and 2. any sets (3 or 4 of a kin)
     
     outputs keeper column (i.e. do we keep the card in the associated record or not)
+    
+    The runs and sets come from scoring.meld_features (compiled if kernels are installed, see kernels.py).
         
     '''
     
-    ## checking if it's a part of a set
+    import numpy as np
     
-    keeper = np.array([])
-
-    for suit in df['suits'].unique():
-
-        suit_frame = df[df['suits'] == suit]
-
-        if len(suit_frame) < 3: #i.e. there are less than 3 cards in the deck that have a certain suit
+    indices = [CARD_INDEX[(rank, suit)] for rank, suit in zip(df['ranks'], df['suits'])]
+    masks = [0, 0, 0, 0]
+    for i in indices:
+        masks[i // NUM_RANKS] |= 1 << (i % NUM_RANKS)
+    run_masks, _, set_ranks, _, _ = meld_features(masks)
+    
+    df['run_keeper'] = np.array([run_masks[i // NUM_RANKS] >> (i % NUM_RANKS) & 1 for i in indices], dtype = float)
+    df['set_keeper'] = np.array([set_ranks >> (i % NUM_RANKS) & 1 for i in indices], dtype = np.int64)
+    
+    # adding an either column and a both column
+    
+    df['either'] = np.where((df['run_keeper'] == 1) | (df['set_keeper'] == 1), 1, 0)
+    df['both'] = np.where((df['run_keeper'] == 1) & (df['set_keeper'] == 1), 1, 0)
+    return df
 
-            lstvals = np.repeat(0, len(suit_frame))
+class Strategy(ABC):
+    
+    '''
+    Base class of parameterized strategies. An instance is called like a strategy function,
+    strategy(hand, deck, pile, anyone_knocked, turn), and is defined by its parameters: the names in PARAMS,
+    each held in a slot. So instances pickle as just their class and parameters (cheap to send to worker
+    processes), compare and hash by value, and have a config_hash that is the same in every process and run.
+    
+    Subclasses list their parameters in PARAMS (and __slots__, with any private caches after them)
+    and take them, in that order, as the arguments of __init__. They set decision to the decision they
+    make, 'knock', 'pile' or 'discard' (see decides), and define __call__.
+    '''
+    
+    __slots__ = ()
+    PARAMS = ()
+    
+    @abstractmethod
+    def __call__(self, hand, deck, pile, anyone_knocked, turn):
+        """Make the strategy's decision: whether to knock, whether to draw from the pile, or the Card to discard."""
+    
+    def params(self):
+        """Return the strategy's parameters as a dictionary."""
+        return {name: getattr(self, name) for name in self.PARAMS}
+    
+    def config(self):
+        """Return the strategy's class name and parameters, as plain JSON values."""
+        return {"strategy": type(self).__name__,
+                "params": {name: _json_value(value) for name, value in self.params().items()}}
+    
+    def config_hash(self):
+        """Return a short hash of the strategy's config, stable across processes and runs (unlike hash())."""
+        return hashlib.sha256(json.dumps(self.config(), sort_keys = True).encode()).hexdigest()[:16]
+    
+    def __eq__(self, other):
+        return type(self) is type(other) and self.params() == other.params()
+    
+    def __hash__(self):
+        return hash((type(self).__name__,) + tuple(self.params().values()))
+    
+    def __reduce__(self):
+        return (type(self), tuple(self.params().values()))
+    
+    def __repr__(self):
+        return type(self).__name__ + "(" + ", ".join(name + " = " + repr(value)
+                                                     for name, value in self.params().items()) + ")"
 
-            pass
 
-        else:
+def decides(decision):
+    """
+    Mark a strategy function with the decision it makes, 'knock', 'pile' or 'discard', as its decision
+    attribute (like Strategy.decision), so that StrategyRegistry.decision_names can find it.
+    """
+    def mark(function):
+        function.decision = decision
+        return function
+    return mark
 
-            lstvals = np.repeat(0, len(suit_frame))
 
-            for i in range(len(suit_frame) - 2):
+def _json_value(value):
+    """A parameter as a JSON value: tuples become lists, and bytes the hash of their contents."""
+    if isinstance(value, tuple):
+        return [_json_value(v) for v in value]
+    if isinstance(value, bytes):
+        return {"sha256": hashlib.sha256(value).hexdigest()}
+    return value
 
-                if (suit_frame['numeric_ranks'].iloc[i] - suit_frame['numeric_ranks'].iloc[i+1] == -1 and 
-                   suit_frame['numeric_ranks'].iloc[i+1] - suit_frame['numeric_ranks'].iloc[i+2] == -1):
 
-                    lstvals[i] = 1
-                    lstvals[i+1] = 1
-                    lstvals[i+2] = 1
-        keeper = np.append(keeper, lstvals)
+def config_hash(strategy):
+    """Return the stable config hash of a Strategy, or of a strategy function (from its name)."""
+    if isinstance(strategy, Strategy):
+        return strategy.config_hash()
+    return hashlib.sha256(json.dumps({"strategy": strategy.__module__ + "." + strategy.__qualname__,
+                                      "params": {}}).encode()).hexdigest()[:16]
 
 
-    df['run_keeper'] = keeper
+class ConstantKnock(Strategy):
+    """Knock if the hand's score is less than cutoff (the "Knock at N" strategies)."""
     
+    __slots__ = PARAMS = ("cutoff",)
+    decision = "knock"
     
-    ## checking if the cards are part of a set and overwriting keeper
+    def __init__(self, cutoff):
+        self.cutoff = cutoff
     
-    parts_of_sets = df['ranks'].value_counts()[df['ranks'].value_counts() >= 3].index.values
+    def __call__(self, hand, deck, pile, anyone_knocked, turn):
+        if anyone_knocked:
+            return False
+        return hand.score() < self.cutoff
 
-    df['set_keeper'] = np.where(df['ranks'].isin(parts_of_sets), 1, 0)
+
+class ListKnock(Strategy):
+    '''
+    Knock if the hand's score is less than a dynamic cutoff based on turns: cutoffs[turn - 1], and the last
+    cutoff once turn reaches len(cutoffs). Used for different levels of "aggressiveness" in knock strategies.
+    '''
     
-    # adding an either column and a both column
+    __slots__ = PARAMS = ("cutoffs",)
+    decision = "knock"
     
-    df['either'] = np.where((df['run_keeper'] == 1) | (df['set_keeper'] == 1), 1, 0)
-    df['both'] = np.where((df['run_keeper'] == 1) & (df['set_keeper'] == 1), 1, 0)
-    return df
+    def __init__(self, cutoffs):
+        self.cutoffs = tuple(cutoffs)
+    
+    def __call__(self, hand, deck, pile, anyone_knocked, turn):
+        if anyone_knocked:
+            return False
+        cutoffs = self.cutoffs
+        if turn < len(cutoffs): # indexed from 1
+            return hand.score() < cutoffs[turn - 1]
+        return hand.score() < cutoffs[-1]
+
 
 def make_constant_score_knock_strategy(cutoff):
     """Return a knock strategy where the player will knock if they can achieve a score less than cutoff."""
-    def knock_strategy(hand, deck, pile, anyone_knocked, turn):
-        if anyone_knocked:
-            return False
-        return hand.score() < cutoff
-    return knock_strategy
+    return ConstantKnock(cutoff)
 
 
 def make_list_knock_strategy(lst):
@@ -102,21 +190,92 @@ def make_list_knock_strategy(lst):
     Return a knock_strategy where the player will knock if they can achieve a score less than a dynamic cutoff based on turns. 
     The function will be used to for different levels of "aggressiveness" in knock strategies.
     '''
-    def strategy(hand, deck, pile, anyone_knocked, turn):
-        
-        if turn < len(lst): # indexed from 1
-            if anyone_knocked:
-                return False
-            return hand.score() < lst[turn - 1]
-        
-        else:
-            if anyone_knocked:
-                return False
-            return hand.score() < lst[len(lst) - 1]
-        
-    return strategy
+    return ListKnock(lst)
     
 
+# Knock tables (see knockTable.py) are indexed by (deadwood, turn, opponent pile draws), each clipped to these
+KNOCK_TABLE_MAX_DEADWOOD = 60
+KNOCK_TABLE_MAX_TURN = 40
+KNOCK_TABLE_MAX_PILE_DRAWS = 6
+KNOCK_TABLE_SHAPE = (KNOCK_TABLE_MAX_DEADWOOD + 1, KNOCK_TABLE_MAX_TURN + 1, KNOCK_TABLE_MAX_PILE_DRAWS + 1)
+DEFAULT_KNOCK_TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "knock_table.npz")
+
+
+def knock_state(hand, pile, turn):
+    """
+    Return the (deadwood, turn, opponent pile draws) state of a knock decision, clipped to the knock table.
+    The opponent pile draws are every draw from the pile this round that was not this hand's.
+    """
+    return (min(hand.score(), KNOCK_TABLE_MAX_DEADWOOD), min(turn, KNOCK_TABLE_MAX_TURN),
+            min(pile.draws - hand.pile_draws, KNOCK_TABLE_MAX_PILE_DRAWS))
+
+
+def load_knock_table(path = DEFAULT_KNOCK_TABLE):
+    """Load a knock table saved by knockTable.save_table, as a dictionary of arrays."""
+    import numpy as np
+    with np.load(path) as table:
+        return {key: table[key] for key in table.files}
+
+
+def load_knock_bytes(path = DEFAULT_KNOCK_TABLE):
+    '''
+    Read just the knock array of a saved knock table, flattened to one byte per state, without numpy
+    (a .npz file is a zip of .npy files: a short header, then the raw array).
+    Raises a ValueError if the array is not a boolean array of KNOCK_TABLE_SHAPE.
+    '''
+    import ast
+    import zipfile
+    with zipfile.ZipFile(path) as archive:
+        data = archive.read("knock.npy")
+    if data[:6] != b"\x93NUMPY":
+        raise ValueError(path + " does not hold a knock array")
+    if data[6] == 1:
+        header_end = 10 + struct.unpack("<H", data[8:10])[0]
+        header = ast.literal_eval(data[10:header_end].decode("latin1"))
+    else:
+        header_end = 12 + struct.unpack("<I", data[8:12])[0]
+        header = ast.literal_eval(data[12:header_end].decode("utf8"))
+    if header["descr"] != "|b1" or header["fortran_order"] or tuple(header["shape"]) != KNOCK_TABLE_SHAPE:
+        raise ValueError(path + " holds a knock array of the wrong type or shape: " + repr(header))
+    return data[header_end:]
+
+
+class TableKnock(Strategy):
+    '''
+    Knock wherever a knock table says to (see knockTable.py).
+    
+    knock: Bytes. The table's knock array flattened, one byte per state, so each decision is a single lookup.
+                  As a parameter it makes two strategies equal exactly when their tables are.
+    '''
+    
+    __slots__ = PARAMS = ("knock",)
+    decision = "knock"
+    
+    def __init__(self, knock):
+        self.knock = bytes(knock)
+    
+    def __call__(self, hand, deck, pile, anyone_knocked, turn):
+        if anyone_knocked:
+            return False
+        deadwood, turn, pile_draws = knock_state(hand, pile, turn)
+        return bool(self.knock[(deadwood * KNOCK_TABLE_SHAPE[1] + turn) * KNOCK_TABLE_SHAPE[2] + pile_draws])
+    
+    def __repr__(self):
+        return "TableKnock(" + self.config_hash() + ")"
+
+
+def make_table_knock_strategy(table = DEFAULT_KNOCK_TABLE):
+    '''
+    Return a knock strategy that looks its decision up in a knock table (see knockTable.py).
+    
+    table: String or Dictionary. Path of a saved table (read without numpy), or a table as returned by load_knock_table.
+    '''
+    if isinstance(table, str):
+        return TableKnock(load_knock_bytes(table))
+    return TableKnock(table["knock"].astype("uint8").ravel().tobytes())
+    
+
+@decides("pile")
 def always_draw_from_pile(hand, deck, pile, anyone_knocked, turn):
     
     '''
@@ -131,6 +290,7 @@ def always_draw_from_pile(hand, deck, pile, anyone_knocked, turn):
     
     return True
 
+@decides("pile")
 def never_draw_from_pile(hand, deck, pile, anyone_knocked, turn):
     
     '''
@@ -144,84 +304,32 @@ def never_draw_from_pile(hand, deck, pile, anyone_knocked, turn):
     return False
 
     
+@decides("pile")
 def draw_from_pile_if_completes(hand, deck, pile, anyone_knocked, turn):
     
-
-    
     '''
-    This function takes in the sorted data and whether or not we are planning to keep any of the cards
-    (i.e. the output from the add_keeper_column function), and adds in the new_card to see if increases the 
-    the number of cards we would keep.
-    
-    1. We first examine if it contributes anything to the runs we already have --
-    if so, we store the boolean True in adds_runs_value and return True because we already know we want to keep the card
-    if not, we store the boolean False and move onto sets:
+    Draw from the pile if the top card completes a run or a set with cards already in the hand.
     
-    2. if the new card contributes to a set, we store the boolean True in adds_sets_value and return True 
-    because this card adds value.
+    1. It completes a run if the hand holds two cards of its suit that, together with it,
+       make three consecutive ranks.
     
-    else, we store the boolean False. 
+    2. It completes a set if the hand holds at least two other cards of its rank.
     
     3. If it doesn't contribute to either sets nor runs, we return False
     
+    The hand's features come from its shared TurnContext, so nothing is recomputed
+    for the knock and discard decisions on the same turn.
     '''
-    # getting the new card object
     
     if not pile.length():
         return False
     
-    new_card = pile.view_top_card()
-    
-    
-    #getting info on new card
-    
-    suit = new_card.suit
-    value = new_card.value
-    rank = new_card.rank
-    numericrank = new_card.numeric_rank
-    
-    #checking to see if it adds value to runs (store answer in adds_runs_value)
-    
-    keeperdata = add_keeper_column(df = sort_hand(hand))
-    
-    suited_data = keeperdata[keeperdata['suits'] == suit] # getting the relevant suit data that the new card is in
-    
-    if len(suited_data) < 2:
-        adds_runs_value = False
-    else:
-        # this if statement checks whether or not the new card is part of a run
-        if (len(suited_data[suited_data['numeric_ranks'].isin([numericrank - 2, numericrank - 1])]) == 2 or
-            len(suited_data[suited_data['numeric_ranks'].isin([numericrank - 1, numericrank + 1])]) == 2 or
-            len(suited_data[suited_data['numeric_ranks'].isin([numericrank + 1, numericrank + 2])]) == 2):
-            
-            #print('adds value to runs')
-            return True
-            
-    
-        else: 
-            adds_runs_value = False
-            
-    #checking to see if it adds value to sets (store answer in adds_sets_value)
-    
-    
-    if len(keeperdata[keeperdata['numeric_ranks'] == numericrank]) >= 2:
-        
-        #print('adds value to sets')
-        return True
-        
-    else:
-        
-        adds_sets_value = False
-        
-    
-    #finally, if neither adds_runs_value nor adds_sets_value is True, we return False
-    
-    
-    return False
+    return hand.context().completes_meld(pile.view_top_card())
 
 
 
 #### not used after creating higher order function below, used initially for aggressive strategy ####
+@decides("pile")
 def half_length_near_runs_sets_draw_from_pile(hand, deck, pile, anyone_knocked, turn):
     
     '''
@@ -246,107 +354,54 @@ def half_length_near_runs_sets_draw_from_pile(hand, deck, pile, anyone_knocked,
     
     if deck.length()*2 > starting_deck_length: #i.e. more than half of the original cards in the deck to draw (after the cards are dealt)
         #look for near sets and near runs
-    
-        sorted_hand = sort_hand(hand)
-
-        new_card = pile.view_top_card()
-
-
-        #getting info on new card
-
-        suit = new_card.suit
-        value = new_card.value
-        rank = new_card.rank
-        numericrank = new_card.numeric_rank
-
-        #checking if part of near set:
-
-        if len(sorted_hand[sorted_hand['numeric_ranks'] == numericrank]) >= 1:
-
-            return True
-
-        else:
-            #checking if part of near run:
-
-            if len(sorted_hand[(sorted_hand['suits'] == suit) & (abs(sorted_hand['numeric_ranks'] - numericrank) == 1)] >= 1):
-
-                return True
-
-            return False
+        return hand.context().near_meld_with(pile.view_top_card())
        
     else: #i.e. there are less than or equal to half the cards remaining in the deck (after the cards are dealt)
         
         #only keep the card if it completes a set or a run
         return draw_from_pile_if_completes(hand, deck, pile, anyone_knocked, turn) # returns boolean     
         
-def generate_specific_turn_near_runs_sets_draw_from_pile(conservative_start_turn):
+class TurnNearRunsSetsDraw(Strategy):
     
+    '''
+    Before turn conservative_start_turn, draw from the pile if the top card is part of a near set/run with the hand.
+    From then on (or once anyone has knocked), only draw it if it completes a set or a run.
+    '''
     
-    def specific_turn_near_runs_sets_draw_from_pile(hand, deck, pile, anyone_knocked, turn):
-        
-        '''
-        Takes in the hand and the card we are considering.
-
-        If there is more than the deck fraction remaining, we figure out if it is part of a near set/run, and keep it if it is.
-
-        If less than the given deck fraction is remaining, we figure out if it is part of an actual set/run, and keep it if it is.
-
-        Return Boolean (whether to keep it or not).
+    __slots__ = PARAMS = ("conservative_start_turn",)
+    decision = "pile"
     
-        '''
-        
-        
+    def __init__(self, conservative_start_turn):
+        self.conservative_start_turn = conservative_start_turn
     
-        # getting the new card object
-
+    def __call__(self, hand, deck, pile, anyone_knocked, turn):
         if not pile.length():           
             return False
         
         if anyone_knocked:
             return draw_from_pile_if_completes(hand, deck, pile, anyone_knocked, turn) 
 
-        if turn < conservative_start_turn: #i.e. look for near runs and/or sets
-
-            sorted_hand = sort_hand(hand)
-
-            new_card = pile.view_top_card()
-
-
-            #getting info on new card
-
-            suit = new_card.suit
-            value = new_card.value
-            rank = new_card.rank
-            numericrank = new_card.numeric_rank
-
-            #checking if part of near set:
-
-            if len(sorted_hand[sorted_hand['numeric_ranks'] == numericrank]) >= 1:
-
-                return True
-
-            else:
-                #checking if part of near run:
-
-                if len(sorted_hand[(sorted_hand['suits'] == suit) & (abs(sorted_hand['numeric_ranks'] - numericrank) == 1)] >= 1):
-
-                    return True
+        if turn < self.conservative_start_turn: #i.e. look for near runs and/or sets
 
-                return False
+            return hand.context().near_meld_with(pile.view_top_card())
 
-        else: #i.e. there are less than or equal to half the cards remaining in the deck (after the cards are dealt)
+        else: #i.e. the conservative part of the round
 
             #only keep the card if it completes a set or a run
             return draw_from_pile_if_completes(hand, deck, pile, anyone_knocked, turn) # returns boolean
-        
-    return specific_turn_near_runs_sets_draw_from_pile
+
+
+def generate_specific_turn_near_runs_sets_draw_from_pile(conservative_start_turn):
+    """Return a TurnNearRunsSetsDraw strategy that turns conservative on turn conservative_start_turn."""
+    return TurnNearRunsSetsDraw(conservative_start_turn)
         
     
+@decides("discard")
 def discard_highest_useless(hand, deck, pile, anyone_knocked, turn):
     
     '''
-    this function takes in your hand (as a dataframe) and discards the highest card that isn't a "keeper" 
-    (i.e. has a 0 in the run_and_set_keeper column)
+    this function takes in your hand and discards the highest card that isn't a "keeper" 
+    (i.e. is not part of a run or a set, the same test as the either column of add_keeper_column)
     
     Note: if you drew from the pile, that card cannot be discarded 
     
@@ -354,30 +409,52 @@ def discard_highest_useless(hand, deck, pile, anyone_knocked, turn):
     
     Note: needs to return a card object'''
     
-    ten_card_hand = add_keeper_column(df = sort_hand(hand))
+    context = hand.context()
     
-    todiscard = ten_card_hand[ten_card_hand['either'] == 0]
+    todiscard = [c for c, keeper in zip(hand.cards, context.in_meld) if not keeper]
     
     #if all cards are part of a set or a run, discard a random card
     
     if len(todiscard) == 0:
         
-        strategy1 = ten_card_hand.sample(n = 1)
-        
-    else:
-        
-        strategy1 = todiscard[todiscard['values'] == todiscard['values'].max()].sample(n = 1)
+        return hand.rng.choice(hand.cards)
     
-    # card is now picked -- let's turn it into a card object and return it
+    highest_value = max(c.value for c in todiscard)
     
-    strategy1_card_object_return = Card(strategy1['ranks'].iloc[0], strategy1['suits'].iloc[0])
-    
-    return strategy1_card_object_return
+    return hand.rng.choice([c for c in todiscard if c.value == highest_value])
+
 
 
+def discard_highest_non_near(hand):
+    
+    '''
+    
+    HELPER FUNCTION:
+    
+    Discard the highest ranked card that is not part of a near set/run (i.e. the hand holds no other 
+    card of its rank and no card of the next or previous rank in its suit).
+    If every card is part of a near set/run (this is rare), discard a random card.
+    
+    Returns Card Object
+    
+    '''
+    
+    context = hand.context()
+    
+    candidates = [i for i, near in enumerate(context.near_meld) if not near]
+    
+    if not candidates:
+        
+        return hand.rng.choice(hand.cards)
+    
+    # a card that is not near a set can't share its rank, so the highest rank is unique
+    
+    return hand.cards[max(candidates, key = lambda i: context.ranks[i])]
+
 
 #### not used after creating higher order function below, used initially for aggressive strategy ####
 
+@decides("discard")
 def near_runs_sets_discarder(hand, deck, pile, anyone_knocked, turn):
     
     '''
@@ -399,47 +476,7 @@ def near_runs_sets_discarder(hand, deck, pile, anyone_knocked, turn):
     if deck.length()*2 > starting_deck_length: #i.e. more than half of the original cards in the deck to draw (after the cards are dealt)
         #look for near sets and near runs
         
-        #get the info about the cards
-        suits = np.array([c.suit for c in hand.cards])
-        ranks = np.array([c.rank for c in hand.cards])
-        values = np.array([c.value for c in hand.cards])
-        numeric_ranks = np.array([c.numeric_rank for c in hand.cards])
-        
-        # looking for near sets and near runs:
-        
-        bool_array = np.repeat(False, len(numeric_ranks))
-        
-        for i in range(len(numeric_ranks)):
-            
-            near_set_array = numeric_ranks == numeric_ranks[i] # generates boolean for card's near sets
-            near_set_array[i] = False # avoiding an incorrect True here: will get populated by a different element
-            near_run_array = (abs(numeric_ranks - numeric_ranks[i]) == 1) & (suits == suits[i]) # generates boolean for card's near runs
-            near_run_array[i] = False # # avoiding an incorrect True here: will get populated by a different element
-            bool_array = bool_array + near_set_array + near_run_array # adding booleans
-            # (once element is true, it's never false later (at the end we'll know which cards we can discard)
-            
-            
-            
-            
-        # selecting the card to discard
-        
-        ## getting all of the "false" indexes from bool_array, then selecting the max of those in numeric_ranks to discard
-               
-        if sum(bool_array) == len(bool_array): # i.e. if every value is True, then each card is part of a near set/run (this is rare)
-            
-            # discard a random card
-            
-            final_index = np.where(numeric_ranks == np.random.choice(numeric_ranks))[0][0] #the extra indexing breaks a tie if needed
-            
-            return Card(ranks[final_index], suits[final_index])
-            
-            
-            
-        relevant_indices = np.where(bool_array == False) # note, this should never return an empty array as per above condition
-        
-        final_index = np.where(numeric_ranks == max(numeric_ranks[relevant_indices]))[0][0] # the extra indexing breaks a tie if needed
-        
-        return Card(ranks[final_index], suits[final_index])
+        return discard_highest_non_near(hand)
         
         
     else:
@@ -447,76 +484,277 @@ def near_runs_sets_discarder(hand, deck, pile, anyone_knocked, turn):
         return discard_highest_useless(hand, deck, pile, anyone_knocked, turn)
     
 
-def generate_turn_near_runs_sets_discarder(conservative_start_turn):
-    
-    def near_turn_runs_sets_discarder(hand, deck, pile, anyone_knocked, turn):
+class TurnNearRunsSetsDiscard(Strategy):
 
-        '''
-
-        This function helps discard cards in a smarter way. (Note, the hand object here already has 10 cards, waiting for one to be discarded) 
+    '''
 
-        If there are more than the deck fraction of cards left in the deck, isolate all of the cards that are part of near sets/runs. 
-        Then discard the highest remaining card that is not part of a full set/run or near set/run.
-        If there are less than the deck fraction of cards in the deck left, discard the highest remaining card that is not a part of a set/run. 
+    This strategy helps discard cards in a smarter way. (Note, the hand object here already has 10 cards, waiting for one to be discarded) 
 
-        Returns Card Object
+    Before turn conservative_start_turn, isolate all of the cards that are part of near sets/runs. 
+    Then discard the highest remaining card that is not part of a full set/run or near set/run.
+    From then on (or once anyone has knocked), discard the highest remaining card that is not a part of a set/run. 
 
-        '''
+    Returns Card Object
 
+    '''
+    
+    __slots__ = PARAMS = ("conservative_start_turn",)
+    decision = "discard"
+    
+    def __init__(self, conservative_start_turn):
+        self.conservative_start_turn = conservative_start_turn
+    
+    def __call__(self, hand, deck, pile, anyone_knocked, turn):
         if anyone_knocked:
             return discard_highest_useless(hand, deck, pile, anyone_knocked, turn)
 
-        if turn < conservative_start_turn:  #look for near runs and/or sets
+        if turn < self.conservative_start_turn:  #look for near runs and/or sets
+
+            return discard_highest_non_near(hand)
+
+        else:
+
+            return discard_highest_useless(hand, deck, pile, anyone_knocked, turn)
+
 
-            #get the info about the cards
-            suits = np.array([c.suit for c in hand.cards])
-            ranks = np.array([c.rank for c in hand.cards])
-            values = np.array([c.value for c in hand.cards])
-            numeric_ranks = np.array([c.numeric_rank for c in hand.cards])
+def generate_turn_near_runs_sets_discarder(conservative_start_turn):
+    """Return a TurnNearRunsSetsDiscard strategy that turns conservative on turn conservative_start_turn."""
+    return TurnNearRunsSetsDiscard(conservative_start_turn)
 
-            # looking for near sets and near runs:
 
-            bool_array = np.repeat(False, len(numeric_ranks))
+@decides("discard")
+def discard_min_deadwood(hand, deck, pile, anyone_knocked, turn):
+    
+    '''
+    Discard the card that leaves the hand with the lowest score. 
+    Ties are broken by discarding the highest value card.
+    
+    Returns Card Object
+    '''
+    
+    after_discard = hand.deadwood_without_each()
+    best_index = min(range(len(hand.cards)), key = lambda i: (after_discard[i], -hand.cards[i].value))
+    return hand.cards[best_index]
 
-            for i in range(len(numeric_ranks)):
 
-                near_set_array = numeric_ranks == numeric_ranks[i] # generates boolean for card's near sets
-                near_set_array[i] = False # avoiding an incorrect True here: will get populated by a different element
-                near_run_array = (abs(numeric_ranks - numeric_ranks[i]) == 1) & (suits == suits[i]) # generates boolean for card's near runs
-                near_run_array[i] = False # # avoiding an incorrect True here: will get populated by a different element
-                bool_array = bool_array + near_set_array + near_run_array # adding booleans
-                # (once element is true, it's never false later (at the end we'll know which cards we can discard)
+@decides("pile")
+def draw_from_pile_if_lowers_deadwood(hand, deck, pile, anyone_knocked, turn):
+    
+    '''
+    Draw from the pile if taking the top card and then making the best discard
+    would leave the hand with a lower score than it has now.
+    
+    Returns Boolean
+    '''
+    
+    if not pile.length():
+        return False
+    
+    larger_hand = hand_masks(hand.cards + [pile.view_top_card()])
+    return min(deadwood_without_each(larger_hand).values()) < hand.score()
 
 
+@decides("knock")
+def random_knock(hand, deck, pile, anyone_knocked, turn):
+    """Knock (if no one has) on a coin flip. Strategy 0 in notes/strategies.md."""
+    return not anyone_knocked and hand.rng.random() < 0.5
 
 
-            # selecting the card to discard
+@decides("pile")
+def random_draw_from_pile(hand, deck, pile, anyone_knocked, turn):
+    """Draw from the pile (if it has a card) on a coin flip."""
+    return pile.length() > 0 and hand.rng.random() < 0.5
 
-            ## getting all of the "false" indexes from bool_array, then selecting the max of those in numeric_ranks to discard
 
-            if sum(bool_array) == len(bool_array): # i.e. if every value is True, then each card is part of a near set/run (this is rare)
+@decides("discard")
+def random_discard(hand, deck, pile, anyone_knocked, turn):
+    """Discard a card at random."""
+    return hand.rng.choice(hand.cards)
 
-                # discard a random card
 
-                final_index = np.where(numeric_ranks == np.random.choice(numeric_ranks))[0][0] #the extra indexing breaks a tie if needed
+def hand_memory(hand, pile):
+    """The hand's CardMemory, or (for a hand outside a Game) a memory of just the hand and the pile."""
+    return hand.memory if hand.memory is not None else CardMemory.from_view(hand, pile)
+
+
+class LiveOutsDraw(Strategy):
+    
+    '''
+    Take the top card of the pile if it completes a run or a set, or if it is worth at most max_value and
+    would sit in a near run or set that at least min_outs unseen cards could still complete.
+    After someone knocks, only a card that completes a run or a set is taken.
+    '''
+    
+    __slots__ = PARAMS = ("min_outs", "max_value")
+    decision = "pile"
+    
+    def __init__(self, min_outs, max_value = 10):
+        self.min_outs = min_outs
+        self.max_value = max_value
+    
+    def __call__(self, hand, deck, pile, anyone_knocked, turn):
+        if not pile.length():
+            return False
+        top = pile.view_top_card()
+        context = hand.context()
+        if context.completes_meld(top):
+            return True
+        if anyone_knocked or top.value > self.max_value:
+            return False
+        masks = list(context.masks)
+        masks[top.index // NUM_RANKS] |= 1 << (top.index % NUM_RANKS)
+        return hand_memory(hand, pile).count_card_outs(masks, top.index) >= self.min_outs
 
-                return Card(ranks[final_index], suits[final_index])
 
+class LiveOutsDiscard(Strategy):
+    
+    '''
+    Throw the card not in a run or set with the highest value minus outs_weight points for every unseen
+    card that could still put it in one. So dead cards (that nothing left can help) go first, and a live card
+    is kept unless it costs too much to hold.
+    Ties are broken at random; if every card is in a run or set, a random card is thrown.
+    '''
+    
+    __slots__ = PARAMS = ("outs_weight",)
+    decision = "discard"
+    
+    def __init__(self, outs_weight):
+        self.outs_weight = outs_weight
+    
+    def __call__(self, hand, deck, pile, anyone_knocked, turn):
+        context = hand.context()
+        useless = [i for i in range(len(hand.cards)) if not context.in_meld[i]]
+        if not useless:
+            return hand.rng.choice(hand.cards)
+        memory = hand_memory(hand, pile)
+        keys = {i: context.values[i] - self.outs_weight * memory.count_card_outs(context.masks, hand.cards[i].index)
+                for i in useless}
+        best = max(keys.values())
+        return hand.rng.choice([hand.cards[i] for i in useless if keys[i] == best])
 
 
-            relevant_indices = np.where(bool_array == False) # note, this should never return an empty array as per above condition
+def make_live_outs_draw_strategy(min_outs, max_value = 10):
+    """Return a LiveOutsDraw strategy."""
+    return LiveOutsDraw(min_outs, max_value)
 
-            final_index = np.where(numeric_ranks == max(numeric_ranks[relevant_indices]))[0][0] # the extra indexing breaks a tie if needed
 
-            return Card(ranks[final_index], suits[final_index])
+def make_live_outs_discard_strategy(outs_weight):
+    """Return a LiveOutsDiscard strategy."""
+    return LiveOutsDiscard(outs_weight)
 
 
-        else:
+# One MonteCarloBot per setting in each process, shared by its knock, pile and discard strategies
+_MONTE_CARLO_BOTS = {}
 
-            return discard_highest_useless(hand, deck, pile, anyone_knocked, turn)
-        
-    return near_turn_runs_sets_discarder
 
+class MonteCarloStrategy(Strategy):
     
+    '''
+    One decision ('knock', 'pile' or 'discard') of a MonteCarloBot with the given settings (see monteCarlo.py).
+    The strategies of every decision with the same settings share one bot, and so its search statistics (self.bot.stats()).
+    '''
+    
+    PARAMS = ("decision", "time_budget", "max_samples", "discard_candidates", "rollout_knock", "opponent_turns",
+              "confidence")
+    __slots__ = PARAMS + ("bot", "_decide")
+    
+    def __init__(self, decision, time_budget = 0.02, max_samples = None, discard_candidates = 4, rollout_knock = 25,
+                 opponent_turns = 6, confidence = 1.0):
+        if decision not in ("knock", "pile", "discard"):
+            raise ValueError("decision must be 'knock', 'pile' or 'discard', not " + repr(decision))
+        self.decision = decision
+        self.time_budget = time_budget
+        self.max_samples = max_samples
+        self.discard_candidates = discard_candidates
+        self.rollout_knock = rollout_knock
+        self.opponent_turns = opponent_turns
+        self.confidence = confidence
+        settings = tuple(self.params().values())[1:]
+        if settings not in _MONTE_CARLO_BOTS:
+            _MONTE_CARLO_BOTS[settings] = MonteCarloBot(*settings)
+        self.bot = _MONTE_CARLO_BOTS[settings]
+        self._decide = {"knock": self.bot.should_knock, "pile": self.bot.should_draw_pile,
+                        "discard": self.bot.pick_discard}[decision]
+    
+    def __call__(self, hand, deck, pile, anyone_knocked, turn):
+        return self._decide(hand, deck, pile, anyone_knocked, turn)
+
+
+class StrategyRegistry(dict):
+    
+    '''
+    A dictionary of strategy names to strategies, that also builds a strategy for any name following one of the
+    STRATEGY_PATTERNS (e.g. "Knock at 23") the first time it is looked up.
+    '''
+    
+    def __missing__(self, name):
+        for pattern, build in STRATEGY_PATTERNS:
+            match = pattern.fullmatch(name)
+            if match:
+                self[name] = build(*[int(g) for g in match.groups()])
+                return self[name]
+        raise KeyError(name)
+    
+    def decision_names(self, decision):
+        """
+        Return the names of the registered strategies that make one decision ('knock', 'pile' or 'discard'),
+        in order, going by each strategy's decision attribute (see Strategy and decides).
+        """
+        if decision not in ("knock", "pile", "discard"):
+            raise ValueError("decision must be 'knock', 'pile' or 'discard', not " + repr(decision))
+        return [name for name, strategy in self.items() if getattr(strategy, "decision", None) == decision]
+
+
+# Families of strategy names, and how to build a strategy from the numbers in the name
+STRATEGY_PATTERNS = [
+    (re.compile(r"Knock at (\d+)"), lambda k: ConstantKnock(max(k, 1))),
+    (re.compile(r"Turn (\d+) Near Runs and Sets Draw From Pile"), lambda t: TurnNearRunsSetsDraw(t + 1)),
+    (re.compile(r"Turn (\d+) Near Runs and Sets Discard"), lambda t: TurnNearRunsSetsDiscard(t + 1))]
+
+
+# The standard registry used by resolve_strategy, built the first time it is needed
+_standard_strategies = None
 
 
+def resolve_strategy(name):
+    """Return the standard strategy called name (see make_strategy_dict). Raises a KeyError for an unknown name."""
+    global _standard_strategies
+    if _standard_strategies is None:
+        _standard_strategies = make_strategy_dict()
+    return _standard_strategies[name]
+
+
+def make_strategy_dict():
+    
+    '''
+    Return the standard mapping of strategy names to strategies used in our analyses, as a StrategyRegistry
+    (so any "Knock at N" or "Turn N Near Runs and Sets ..." name also resolves).
+    
+    This is a module level function (rather than a dictionary built in a notebook) so that
+    worker processes can rebuild the same dictionary by name, see tournament.py.
+    '''
+    
+    strat_dict = StrategyRegistry({"Knock at " + str(k): ConstantKnock(max(k, 1)) for k in range(0, 65, 5)})
+    strat_dict.update({
+        "DynamicKnockHigh vs conservative knock 25": ListKnock([45, 40, 36, 32, 30, 28, 26, 26, 25]),
+        "No Pile": never_draw_from_pile,
+        "Always Pile": always_draw_from_pile,
+        "Pile if Completes": draw_from_pile_if_completes,
+        "Pile if Lowers Deadwood": draw_from_pile_if_lowers_deadwood,
+        "Half Length Near Runs and Sets Draw From Pile": half_length_near_runs_sets_draw_from_pile,
+        "Turn 4 Near Runs and Sets Draw From Pile": TurnNearRunsSetsDraw(5),
+        "Turn 4 Near Runs and Sets Discard": TurnNearRunsSetsDiscard(5),
+        "Discard Highest Non-Near Runs and Sets": near_runs_sets_discarder,
+        "Discard Highest Useless": discard_highest_useless,
+        "Discard Min Deadwood": discard_min_deadwood,
+        "Random Knock": random_knock,
+        "Random Pile": random_draw_from_pile,
+        "Random Discard": random_discard,
+        "Pile if Live Outs": LiveOutsDraw(3, max_value = 6),
+        "Discard Highest Dead": LiveOutsDiscard(2),
+        "Monte Carlo Knock": MonteCarloStrategy("knock"),
+        "Monte Carlo Pile": MonteCarloStrategy("pile"),
+        "Monte Carlo Discard": MonteCarloStrategy("discard")})
+    if os.path.exists(DEFAULT_KNOCK_TABLE):
+        strat_dict["Knock Table"] = make_table_knock_strategy(DEFAULT_KNOCK_TABLE)
+    return strat_dict
@@ -0,0 +1,337 @@
+# ---------------------------------------------------------
+# Sweeps across several machines through a shared directory.
+#
+# A sweep is a tournament (see tournament.py) split into work
+# units of a few matchups each. Its directory, on a file system
+# every machine can reach, is the whole coordinator:
+#   sweep.json             the matchups, seeds and units
+#   leases/unit_00003.json who is playing unit 3. Created in one
+#                          step (so only one worker gets it) and
+#                          touched as a heartbeat while they play.
+#   units/unit_00003.json  unit 3's result rows, once finished
+#   checkpoints/           each running game's checkpoint (see
+#                          Game.checkpoint)
+#   merged.json            the sim_id each matchup was saved as
+# A worker takes any unit that is neither finished nor leased,
+# or whose lease has not been touched for lease_seconds (its
+# worker died): that unit is leased again and its games resume
+# from their checkpoints. Every matchup has its own seed, so a
+# unit played twice gives the same rows both times, and merging
+# saves each matchup once, however often it was played.
+#
+#   create_sweep("/shared/sweep", strategy_grid([...], [...], [...], 1000))
+#   run_worker("/shared/sweep")                # on every machine
+#   merge_sweep("/shared/sweep", "../data/results.db")
+#
+# or from a shell, python sweep.py create|work|status|merge.
+# The machines' clocks should agree to well within lease_seconds.
+# ---------------------------------------------------------
+
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+
+from results import append_results
+from stopping import StoppingRule
+from strategies import make_strategy_dict
+from tournament import _settings_value, _write_json, cell_seed, play_matchup, strategy_grid
+
+
+def create_sweep(directory, matchups, base_seed = 0, cells_per_unit = 1, checkpoint_every = 100):
+
+    '''
+    Write a sweep's settings to directory, ready for workers (see run_worker).
+
+    matchups: List of Dictionaries. See run_tournament, including the default seeds.
+    base_seed: Int. Seed that the per matchup seeds are derived from.
+    cells_per_unit: Int. Matchups per work unit, the most work a dead worker loses.
+    checkpoint_every: Int. Rounds between a game's checkpoints.
+
+    Creating a sweep that already exists does nothing, so every machine may run the same script.
+    Raises a ValueError if directory holds a sweep with different settings.
+    Returns the number of work units.
+    '''
+
+    cells = []
+    for index, matchup in enumerate(matchups):
+        cell = dict(matchup)
+        if cell.get("random_seed") is None:
+            cell["random_seed"] = cell_seed(base_seed, index)
+        cells.append(cell)
+    units = [list(range(i, min(i + cells_per_unit, len(cells)))) for i in range(0, len(cells), cells_per_unit)]
+    settings = json.loads(json.dumps({"cells": cells, "units": units, "checkpoint_every": checkpoint_every},
+                                     default = _settings_value))
+    for subdirectory in ["leases", "units", "checkpoints"]:
+        os.makedirs(os.path.join(directory, subdirectory), exist_ok = True)
+    settings_path = os.path.join(directory, "sweep.json")
+    if os.path.exists(settings_path):
+        with open(settings_path) as f:
+            if json.load(f) != settings:
+                raise ValueError(directory + " holds a sweep with different settings")
+    else:
+        _write_json(settings, settings_path)
+    return len(units)
+
+
+class WorkQueue:
+    """
+    One worker's view of a sweep directory (see the module notes): leasing, renewing and finishing units.
+
+    lease_seconds: Float. How long a lease lasts without a heartbeat before the unit is given to another worker.
+    worker_id: String. Written into this worker's leases, defaults to host name:process id.
+    """
+
+    def __init__(self, directory, lease_seconds = 60.0, worker_id = None):
+        self.directory = directory
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id or socket.gethostname() + ":" + str(os.getpid())
+        with open(os.path.join(directory, "sweep.json")) as f:
+            settings = json.load(f)
+        self.cells = settings["cells"]
+        self.units = settings["units"]
+        self.checkpoint_every = settings["checkpoint_every"]
+
+    def lease_path(self, unit):
+        return os.path.join(self.directory, "leases", "unit_{:05d}.json".format(unit))
+
+    def unit_path(self, unit):
+        return os.path.join(self.directory, "units", "unit_{:05d}.json".format(unit))
+
+    def checkpoint_path(self, cell):
+        return os.path.join(self.directory, "checkpoints", "cell_{:05d}.game.json".format(cell))
+
+    def is_finished(self, unit):
+        return os.path.exists(self.unit_path(unit))
+
+    def lease_owner(self, unit, path = None):
+        """Return the worker_id holding unit's lease (or the lease file at path), or None if it is not leased."""
+        try:
+            with open(path or self.lease_path(unit)) as f:
+                return json.load(f)["worker"]
+        except (FileNotFoundError, ValueError):
+            # Gone, or caught between being created and being written
+            return None
+
+    def is_stale(self, unit, path = None):
+        """Has unit's lease (or the lease file at path) gone lease_seconds without a heartbeat?"""
+        try:
+            return time.time() - os.path.getmtime(path or self.lease_path(unit)) > self.lease_seconds
+        except FileNotFoundError:
+            return False
+
+    def temp_suffix(self):
+        """Suffix of this worker's temporary files, so that two workers playing one unit never share one."""
+        return "." + self.worker_id.replace(os.sep, "_") + ".tmp"
+
+    def _try_lease(self, unit):
+        try:
+            descriptor = os.open(self.lease_path(unit), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(descriptor, "w") as f:
+            json.dump({"worker": self.worker_id, "unit": unit}, f)
+        return True
+
+    def _break_lease(self, unit, stale_owner):
+        # Renaming succeeds for only one worker, so only one of them gets to lease the unit again
+        broken_path = self.lease_path(unit) + "." + self.worker_id.replace(os.sep, "_") + ".broken"
+        try:
+            os.rename(self.lease_path(unit), broken_path)
+        except FileNotFoundError:
+            return False
+        # Between seeing the stale lease and renaming it, another worker may have broken it and taken a fresh one.
+        # That fresh lease is what got renamed, so put it back (unless yet another worker has leased the unit since)
+        if not self.is_stale(unit, broken_path) or self.lease_owner(unit, broken_path) != stale_owner:
+            try:
+                os.link(broken_path, self.lease_path(unit))
+            except FileExistsError:
+                pass
+            os.remove(broken_path)
+            return False
+        os.remove(broken_path)
+        return True
+
+    def claim(self):
+        """Lease the first unit that is not finished and not leased (or whose lease is stale). None if there is none."""
+        for unit in range(len(self.units)):
+            if self.is_finished(unit):
+                continue
+            if self._try_lease(unit):
+                return unit
+            owner = self.lease_owner(unit)
+            if self.is_stale(unit) and self._break_lease(unit, owner) and self._try_lease(unit):
+                return unit
+        return None
+
+    def renew(self, unit):
+        """Touch this worker's lease on unit. Returns False if the lease was broken and given to another worker."""
+        if self.lease_owner(unit) != self.worker_id:
+            return False
+        try:
+            os.utime(self.lease_path(unit))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def complete(self, unit, rows):
+        """Save unit's result rows (a list per matchup), then give up its lease and its games' checkpoints."""
+        # A worker that lost its lease may be finishing the same unit, so each writes through its own temporary file
+        _write_json({"cells": self.units[unit], "rows": rows}, self.unit_path(unit), self.temp_suffix())
+        if self.lease_owner(unit) == self.worker_id:
+            os.remove(self.lease_path(unit))
+        for cell in self.units[unit]:
+            if os.path.exists(self.checkpoint_path(cell)):
+                os.remove(self.checkpoint_path(cell))
+
+    def play(self, unit, strategy_factory = make_strategy_dict):
+        """Play (or resume) every matchup of unit and return their result rows, a list per matchup."""
+        rows = []
+        for cell in self.units[unit]:
+            matchup = dict(self.cells[cell], checkpoint_path = self.checkpoint_path(cell),
+                           checkpoint_every = self.checkpoint_every, checkpoint_temp_suffix = self.temp_suffix())
+            # sweep.json holds a stopping rule's settings, not the rule
+            if matchup.get("stopping_rule") is not None:
+                matchup["stopping_rule"] = StoppingRule.from_settings(matchup["stopping_rule"])
+            rows.append(play_matchup(matchup, strategy_factory))
+        return rows
+
+    def status(self):
+        """Count the units that are finished, leased, leased but stale (their worker died) and waiting."""
+        counts = {"units": len(self.units), "finished": 0, "leased": 0, "stale": 0, "waiting": 0}
+        for unit in range(len(self.units)):
+            if self.is_finished(unit):
+                counts["finished"] += 1
+            elif os.path.exists(self.lease_path(unit)):
+                counts["stale" if self.is_stale(unit) else "leased"] += 1
+            else:
+                counts["waiting"] += 1
+        return counts
+
+
+class Heartbeat:
+    """Renew a lease from a background thread, every third of lease_seconds, while a unit is played."""
+
+    def __init__(self, queue, unit):
+        self.queue = queue
+        self.unit = unit
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target = self._beat, daemon = True)
+
+    def _beat(self):
+        while not self._stop.wait(self.queue.lease_seconds / 3):
+            if not self.queue.renew(self.unit):
+                self.lost = True
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_worker(directory, lease_seconds = 60.0, poll_seconds = 1.0, strategy_factory = make_strategy_dict,
+               worker_id = None, verbose = False):
+
+    '''
+    Lease and play units of the sweep in directory until every unit is finished.
+    Run one on every core of every machine. Waits (checking every poll_seconds) while the only units left
+    are leased by live workers, in case one of them dies.
+
+    strategy_factory: Function() returning a strategy dictionary (see run_tournament).
+    See WorkQueue for lease_seconds and worker_id.
+
+    Returns the number of units this worker finished.
+    '''
+
+    queue = WorkQueue(directory, lease_seconds, worker_id)
+    finished = 0
+    while True:
+        unit = queue.claim()
+        if unit is None:
+            if all(queue.is_finished(u) for u in range(len(queue.units))):
+                return finished
+            time.sleep(poll_seconds)
+            continue
+        with Heartbeat(queue, unit) as heartbeat:
+            rows = queue.play(unit, strategy_factory)
+        # A worker that lost its lease played the same seeded games as whoever took it, so either result will do
+        queue.complete(unit, rows)
+        finished += 1
+        if verbose:
+            print(queue.worker_id, "finished unit", unit, "after losing its lease" * heartbeat.lost)
+
+
+def merge_sweep(directory, data_path = None):
+
+    '''
+    Collect the result rows of a finished sweep, in matchup order.
+
+    data_path: String. If entered, every matchup not already saved is appended to this results csv or
+               database (see results.append_results) as its own sim_id. The sim_ids are recorded in
+               merged.json, so merging again (or after a crash) never saves a matchup twice.
+               Merge from one process at a time.
+
+    Raises a ValueError if some units are not finished.
+    Returns a dictionary with the result rows of every matchup (each row has its sim_id, or None if it was
+    never saved) and the total number of rounds played.
+    '''
+
+    queue = WorkQueue(directory)
+    missing = [unit for unit in range(len(queue.units)) if not queue.is_finished(unit)]
+    if missing:
+        raise ValueError(str(len(missing)) + " of " + str(len(queue.units)) + " units are not finished")
+    rows = [None] * len(queue.cells)
+    for unit in range(len(queue.units)):
+        with open(queue.unit_path(unit)) as f:
+            result = json.load(f)
+        for cell, cell_rows in zip(result["cells"], result["rows"]):
+            rows[cell] = cell_rows
+
+    merged_path = os.path.join(directory, "merged.json")
+    sim_ids = {}
+    if os.path.exists(merged_path):
+        with open(merged_path) as f:
+            sim_ids = {int(cell): sim_id for cell, sim_id in json.load(f).items()}
+    for cell, cell_rows in enumerate(rows):
+        if data_path is not None and cell not in sim_ids:
+            sim_ids[cell] = append_results(cell_rows, data_path)
+            _write_json(sim_ids, merged_path)
+        for row in cell_rows:
+            row["sim_id"] = sim_ids.get(cell)
+    return {"rows": rows, "rounds": sum(cell_rows[0]["rounds"] for cell_rows in rows)}
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Spread a strategy sweep across machines through a shared directory.")
+    parser.add_argument("command", choices = ["create", "work", "status", "merge"])
+    parser.add_argument("directory")
+    parser.add_argument("--knock", nargs = "+", default = ["Knock at 25"], help = "Knock strategy names.")
+    parser.add_argument("--pile", nargs = "+", default = ["Pile if Completes"], help = "Pile strategy names.")
+    parser.add_argument("--discard", nargs = "+", default = ["Discard Highest Useless"], help = "Discard strategy names.")
+    parser.add_argument("--rounds", type = int, default = 1000, help = "Rounds per matchup.")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--cells-per-unit", type = int, default = 1)
+    parser.add_argument("--lease-seconds", type = float, default = 60.0)
+    parser.add_argument("--data-path", help = "Results csv or database to merge into.")
+    args = parser.parse_args(argv)
+    if args.command == "create":
+        matchups = strategy_grid(args.knock, args.pile, args.discard, args.rounds)
+        units = create_sweep(args.directory, matchups, args.seed, args.cells_per_unit)
+        print(len(matchups), "matchups in", units, "units")
+    elif args.command == "work":
+        print(run_worker(args.directory, args.lease_seconds, verbose = True), "units finished")
+    elif args.command == "status":
+        print(WorkQueue(args.directory, args.lease_seconds).status())
+    else:
+        result = merge_sweep(args.directory, args.data_path)
+        print(len(result["rows"]), "matchups,", result["rounds"], "rounds")
+
+
+if __name__ == "__main__":
+    main()
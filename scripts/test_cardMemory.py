@@ -0,0 +1,41 @@
+# ---------------------------------------------------------
+# Tests for the per-player card memory
+# ---------------------------------------------------------
+
+from cardMemory import *
+from strategies import *
+
+
+def mask_of(cards):
+    mask = 0
+    for card in cards:
+        mask |= 1 << card.index
+    return mask
+
+
+def test_outs():
+    hand = Hand()
+    hand.add_cards([Card("5", "H"), Card("6", "H"), Card("9", "S"), Card("9", "D"), Card("K", "C")])
+    masks = hand.context().masks
+    assert meld_outs(masks) == mask_of([Card("4", "H"), Card("7", "H"), Card("9", "H"), Card("9", "C")])
+    assert card_outs(masks, Card("5", "H").index) == mask_of([Card("4", "H"), Card("7", "H")])
+    assert card_outs(masks, Card("K", "C").index) == 0
+    memory = CardMemory.from_view(hand, Pile())
+    memory.seen |= mask_of([Card("7", "H")])
+    assert memory.count_live_outs(masks) == 3
+    assert memory.count_card_outs(masks, Card("9", "S").index) == 2
+
+
+def test_memory_tracks_the_round():
+    game = Game(player_names = ["Bailey", "Dan"], strategy_dict = make_strategy_dict(),
+                knock_strategies = ["Knock at 10"] * 2, pile_strategies = ["Pile if Live Outs", "Pile if Completes"],
+                discard_strategies = ["Discard Highest Dead", "Discard Highest Useless"], target_score = None,
+                total_rounds = 30, random_seed = 8, save_results = False)
+    for round_number in range(30):
+        game.play_round(round_number)
+        for me, other in [(0, 1), (1, 0)]:
+            memory = game.players[me].hand.memory
+            assert memory.pile == mask_of(game.pile.cards)
+            assert memory.seen & mask_of(game.players[me].hand.cards) == mask_of(game.players[me].hand.cards)
+            assert memory.opponent_known & ~mask_of(game.players[other].hand.cards) == 0
+            assert memory.unseen() & mask_of(game.deck.cards) == mask_of(game.deck.cards)
@@ -0,0 +1,147 @@
+# ---------------------------------------------------------
+# Tests for checkpointing and resuming games and tournaments
+# ---------------------------------------------------------
+
+import json
+import os
+import pytest
+from results import ResultsStore
+from stopping import StoppingRule
+from tournament import *
+
+TIMING = ("sim_id", "start_time", "elapsed_seconds")
+
+
+def new_game(path = None, knocks = ("Knock at 25", "Random Knock"), **kwargs):
+    return Game(player_names = ["Bailey", "Dan"], strategy_dict = make_strategy_dict(),
+                knock_strategies = list(knocks), pile_strategies = ["Pile if Live Outs", "Random Pile"],
+                discard_strategies = ["Discard Highest Dead", "Random Discard"], target_score = None,
+                total_rounds = 120, random_seed = 6, save_results = False, checkpoint_path = path,
+                checkpoint_every = 25, **kwargs)
+
+
+def untimed(rows):
+    return [{key: value for key, value in row.items() if key not in TIMING} for row in rows]
+
+
+def test_resumed_game_matches_an_uninterrupted_one(tmp_path):
+    path = str(tmp_path / "game.json")
+    expected = new_game(mode = 'turn score calculator')
+    expected.play_game()
+
+    interrupted = new_game(path, mode = 'turn score calculator')
+    for summary in interrupted.iter_rounds():
+        if summary["round"] == 60:
+            break # the kernel dies 10 rounds after the last checkpoint
+    resumed = new_game(path, mode = 'turn score calculator')
+    resumed.play_game()
+    assert [p.score for p in resumed.players] == [p.score for p in expected.players]
+    assert resumed.turn_score_dict == expected.turn_score_dict
+    assert untimed(resumed.result_rows()) == untimed(expected.result_rows())
+
+    # A finished game's checkpoint plays no more rounds
+    again = new_game(path, mode = 'turn score calculator')
+    assert list(again.iter_rounds()) == []
+    with pytest.raises(ValueError):
+        new_game(path, knocks = ("Knock at 30", "Random Knock"), mode = 'turn score calculator').play_game()
+
+
+def test_resumed_game_keeps_its_stopping_decision(tmp_path):
+    path = str(tmp_path / "game.json")
+    rule = StoppingRule(half_width = None, batch_size = 25, min_rounds = 25)
+    expected = new_game(knocks = ("Knock at 0", "Knock at 60"), stopping_rule = rule)
+    expected.play_game()
+    assert expected.stop_reason is not None
+    new_game(path, knocks = ("Knock at 0", "Knock at 60"), stopping_rule = rule).play_game()
+    resumed = new_game(path, knocks = ("Knock at 0", "Knock at 60"), stopping_rule = rule)
+    assert list(resumed.iter_rounds()) == []
+    assert resumed.stop_reason == expected.stop_reason and resumed.players[0].score == expected.players[0].score
+
+
+# Counts knock decisions in a worker process, to crash it part way through a tournament
+_knock_calls = [0]
+
+
+def crashing_strategies():
+    strategies = make_strategy_dict()
+    knock = strategies["Knock at 25"]
+
+    def crash_eventually(hand, deck, pile, anyone_knocked, turn):
+        _knock_calls[0] += 1
+        if _knock_calls[0] == 700:
+            raise RuntimeError("Simulated crash")
+        return knock(hand, deck, pile, anyone_knocked, turn)
+    strategies["Knock at 25"] = crash_eventually
+    return strategies
+
+
+def test_resumed_tournament_matches_an_uninterrupted_one(tmp_path):
+    matchups = knock_grid(["Knock at 25", "Knock at 35"], "Pile if Completes", "Discard Highest Useless", 60)
+    expected = run_tournament(matchups, base_seed = 3, max_workers = 1)
+
+    directory = str(tmp_path / "checkpoints")
+    data_path = str(tmp_path / "results.db")
+    with pytest.raises(RuntimeError):
+        run_tournament(matchups, base_seed = 3, max_workers = 1, data_path = data_path,
+                       strategy_factory = crashing_strategies, checkpoint_dir = directory, checkpoint_every = 20)
+    assert os.path.exists(os.path.join(directory, "cell_00000.json"))
+    # The pool may have gone on to other matchups before the crash reached it
+    saved_rounds = 0
+    for index in (1, 2):
+        if os.path.exists(os.path.join(directory, "cell_{:05d}.game.json".format(index))):
+            with open(os.path.join(directory, "cell_{:05d}.game.json".format(index))) as f:
+                saved_rounds += json.load(f)["rounds_played"]
+    assert saved_rounds >= 20
+
+    resumed = run_tournament(matchups, base_seed = 3, max_workers = 1, data_path = data_path,
+                             checkpoint_dir = directory, checkpoint_every = 20)
+    assert [untimed(rows) for rows in resumed["rows"]] == [untimed(rows) for rows in expected["rows"]]
+    # Only this run's rounds count towards its speed
+    assert resumed["rounds"] == expected["rounds"] and resumed["resumed_rounds"] == 60 + saved_rounds
+    assert expected["resumed_rounds"] == 0
+    with ResultsStore(data_path) as store:
+        assert [row["sim_id"] for row in store.query(player_number = 0)] == [1, 2, 3]
+    with pytest.raises(ValueError):
+        run_tournament(matchups, base_seed = 4, checkpoint_dir = directory)
+
+
+@pytest.mark.parametrize("data_name", ["results.csv", "results.db"])
+def test_resumed_games_and_tournaments_save_their_results_once(tmp_path, data_name):
+    path, data_path = str(tmp_path / "game.json"), str(tmp_path / data_name)
+    game = new_game(path, data_path = data_path)
+    game.save_results = True
+    assert game.play_game() and game.sim_id == 1
+    again = new_game(path, data_path = data_path)
+    again.save_results = True
+    again.play_game()
+    assert again.sim_id == 1
+
+    # The game stopped after appending its rows but before recording their sim_id
+    with open(path) as f:
+        state = json.load(f)
+    state["sim_id"] = None
+    with open(path, "w") as f:
+        json.dump(state, f)
+    crashed = new_game(path, data_path = data_path)
+    crashed.save_results = True
+    crashed.play_game()
+    assert crashed.sim_id == 1
+
+    # A tournament stopped between appending a finished cell's rows and recording its sim_id
+    matchups = knock_grid(["Knock at 25", "Knock at 35"], "Pile if Completes", "Discard Highest Useless", 30)
+    directory = str(tmp_path / "checkpoints")
+    first = run_tournament(matchups, base_seed = 3, max_workers = 1, data_path = data_path, checkpoint_dir = directory)
+    assert [rows[0]["sim_id"] for rows in first["rows"]] == [2, 3, 4]
+    with open(os.path.join(directory, "cell_00001.json")) as f:
+        cell = json.load(f)
+    cell["sim_id"] = None
+    with open(os.path.join(directory, "cell_00001.json"), "w") as f:
+        json.dump(cell, f)
+    resumed = run_tournament(matchups, base_seed = 3, max_workers = 1, data_path = data_path, checkpoint_dir = directory)
+    assert [rows[0]["sim_id"] for rows in resumed["rows"]] == [2, 3, 4]
+    if data_name.endswith(".db"):
+        with ResultsStore(data_path) as store:
+            assert [row["sim_id"] for row in store.query(player_number = 0)] == [1, 2, 3, 4]
+    else:
+        with open(data_path) as f:
+            assert len(f.readlines()) == 1 + 2 * 4
@@ -0,0 +1,33 @@
+# ---------------------------------------------------------
+# Tests for common random numbers (shared deals)
+# ---------------------------------------------------------
+
+import numpy as np
+from commonDecks import *
+from tournament import knock_grid
+
+
+def test_games_replay_the_given_deals():
+    orders = deal_orders(20, seed = 5)
+    assert all(sorted(order) == list(range(52)) for order in orders)
+    decks = []
+    for seed in [1, 2]:
+        game = make_game(dict(knock_grid(["Knock at 10"], "No Pile", "Discard Highest Useless", 20)[0],
+                              random_seed = seed, deck_orders = orders))
+        game.play_round(0)
+        decks.append(game.deck.order)
+    assert decks[0] == decks[1] == orders[0].tolist()
+
+
+def test_paired_tournament_plays_both_seatings_on_shared_decks():
+    matchups = knock_grid(["Knock at 10", "Knock at 40"], "Pile if Completes", "Discard Highest Useless", 60)
+    result = run_paired_tournament(matchups, base_seed = 4, max_workers = 2)
+    assert result["rounds"] == 2 * 3 * 60
+    for rows, differences in zip(result["rows"], result["differences"]):
+        as_given, swapped = rows
+        assert as_given[0]["knock_strategy"] == swapped[1]["knock_strategy"]
+        assert swapped[0]["notes"].endswith("(seats swapped)")
+        assert len(differences) == 60
+        # Averaged over both seatings, the paired differences add up to the two games' totals
+        total = (as_given[0]["avg_win"] - as_given[1]["avg_win"] + swapped[1]["avg_win"] - swapped[0]["avg_win"]) * 60
+        assert np.isclose(differences.sum() * 2, total)
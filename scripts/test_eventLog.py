@@ -0,0 +1,31 @@
+# ---------------------------------------------------------
+# Tests for the game event log
+# ---------------------------------------------------------
+
+from eventLog import read_events, turn_score_table
+from gameLogic import *
+from strategies import make_strategy_dict
+
+
+def test_event_log_rebuilds_turn_scores(tmp_path):
+    log_path = str(tmp_path / "game.log")
+    game = Game(player_names = ["Bailey", "Dan"], strategy_dict = make_strategy_dict(),
+                knock_strategies = ["Knock at 25", "Knock at 25"],
+                pile_strategies = ["Pile if Completes", "Pile if Completes"],
+                discard_strategies = ["Discard Highest Useless", "Discard Highest Useless"],
+                target_score = None, total_rounds = 30, random_seed = 8, save_results = False,
+                mode = 'turn score calculator', event_log_path = log_path)
+    rounds = list(game.iter_rounds())
+    assert [r["round"] for r in rounds] == list(range(30))
+    assert sum(r["score_changes"][0] for r in rounds) == game.players[0].get_score()
+    
+    events = read_events(log_path)
+    assert 0 < events["knocked"].sum() <= 30
+    table = turn_score_table(log_path, player = 0)
+    from_mode = {}
+    for turn_scores in game.turn_score_dict['player0']:
+        for turn, score in enumerate(turn_scores):
+            from_mode.setdefault(turn, []).append(score)
+    assert list(table["turn"]) == sorted(from_mode)
+    assert list(table["count"]) == [len(from_mode[t]) for t in sorted(from_mode)]
+    assert list(table["max"]) == [max(from_mode[t]) for t in sorted(from_mode)]
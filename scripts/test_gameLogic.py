@@ -0,0 +1,60 @@
+# ---------------------------------------------------------
+# Tests for the game engine: decks, players and seeded games
+# ---------------------------------------------------------
+
+import random
+import pytest
+from gameLogic import *
+from strategies import (discard_highest_useless, make_strategy_dict, never_draw_from_pile, random_discard,
+                        random_draw_from_pile, random_knock)
+
+
+def test_games_with_a_seed_do_not_disturb_each_other():
+    strategy_dict = make_strategy_dict()
+    
+    def new_game(seed):
+        return Game(player_names = ["Bailey", "Dan"], strategy_dict = strategy_dict,
+                    knock_strategies = ["Knock at 25", "Knock at 10"],
+                    pile_strategies = ["Pile if Completes", "Turn 4 Near Runs and Sets Draw From Pile"],
+                    discard_strategies = ["Discard Highest Useless", "Turn 4 Near Runs and Sets Discard"],
+                    target_score = None, total_rounds = 20, random_seed = seed, save_results = False)
+    
+    alone = new_game(5).play_game()
+    first, second = new_game(5), new_game(6)
+    for round_num in range(20):
+        first.play_round(round_num)
+        random.random()
+        second.play_round(round_num)
+    assert {p.name: p.score for p in first.players} == alone
+
+
+def test_deck_draws_every_card_once():
+    deck = Deck(random.Random(1))
+    drawn = deck.draw(9) + deck.draw(9)
+    assert deck.length() == 34 and len(deck.cards) == 34
+    drawn += deck.draw(40)
+    assert deck.length() == 0
+    assert len({c.index for c in drawn}) == 52
+    with pytest.raises(TypeError):
+        deck.add_cards(drawn[0])
+    with pytest.raises(TypeError):
+        Deck(random.Random(1)).remove_cards(drawn[0])
+    # The random stream is keyword only, so an old positional verbose flag is not taken for it
+    with pytest.raises(TypeError):
+        Player("Bailey", random_knock, random_draw_from_pile, random_discard, True, random.Random(1))
+
+
+def test_verbose_players_print_their_turns(capsys):
+    rng = random.Random(2)
+    player = Player("Bailey", random_knock, never_draw_from_pile, discard_highest_useless, True, rng = rng)
+    quiet = Player("Dan", random_knock, never_draw_from_pile, discard_highest_useless, verbose = False)
+    deck, pile = Deck(rng), Pile()
+    player.reset_hand()
+    player.draw_from_deck(deck, 9)
+    player.take_turn(deck, pile, True, 1)
+    quiet.reset_hand()
+    quiet.draw_from_deck(deck, 9)
+    quiet.take_turn(deck, pile, True, 2)
+    assert capsys.readouterr().out.splitlines() == ["There are no cards in the discard pile.",
+                                                    "Bailey drew a " + repr(player.last_draw) + " from the deck.",
+                                                    "Bailey discards the " + repr(player.last_discard)]
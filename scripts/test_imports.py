@@ -0,0 +1,13 @@
+# ---------------------------------------------------------
+# Tests that the core stays quick and small to import
+# ---------------------------------------------------------
+
+from benchmarks import measure_import
+
+
+def test_core_imports_only_the_standard_library():
+    result = measure_import()
+    assert result["heavy_modules"] == []
+    # numpy and pandas alone take about 0.25 seconds and 45 MB
+    assert result["seconds"] < 1.0
+    assert result["rss_mb"] is None or result["rss_mb"] < 25
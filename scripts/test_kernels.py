@@ -0,0 +1,62 @@
+# ---------------------------------------------------------
+# Tests for the optional compiled scoring kernels
+# ---------------------------------------------------------
+
+import random
+import numpy as np
+import scoring
+from kernels import *
+from strategies import *
+
+
+def random_hands(n, size, seed):
+    """Deal n hands of the given size from fresh decks."""
+    random.seed(seed)
+    hands = []
+    for _ in range(n):
+        hand = Hand()
+        hand.add_cards(Deck().draw(size))
+        hands.append(hand)
+    return hands
+
+
+def sample_masks():
+    """Suit masks of random hands and of hands crowded with sets (several ranks in 3 or 4 suits)."""
+    rng = np.random.default_rng(11)
+    hands = [np.argsort(rng.random(52))[:size] for size in (3, 9, 10, 11) for _ in range(300)]
+    hands += [np.array([s * 13 + r for r in rng.choice(13, 3, replace = False) for s in range(4)])[:size]
+              for size in (9, 10, 12) for _ in range(100)]
+    masks = np.zeros((len(hands), 4), dtype = np.int64)
+    for i, hand in enumerate(hands):
+        for index in hand:
+            masks[i, index // 13] |= 1 << (index % 13)
+    return masks
+
+
+def test_kernels_match_the_python_scorer():
+    # Run as plain Python here if Numba is not installed: the same code it would compile
+    masks = sample_masks()
+    expected = [scoring.deadwood(list(m)) for m in masks.tolist()]
+    assert [deadwood_kernel(*m) for m in masks.tolist()] == expected
+    np.testing.assert_array_equal(deadwood_many_kernel(masks), expected)
+    for m in masks.tolist():
+        runs, near_runs, sets, pairs, held = scoring.meld_features(m)
+        assert list(meld_features_kernel(*m)) == runs + near_runs + [sets, pairs, held]
+
+
+def test_installed_kernels_give_the_same_hands(monkeypatch):
+    hands = random_hands(200, 10, 5)
+    expected = [(hand.score(), hand.context().in_meld, hand.context().near_meld) for hand in hands]
+    masks = sample_masks()
+    expected_many = scoring.score_masks_many(masks)
+    assert install_kernels() == BACKEND
+    assert (scoring.KERNELS is not None) == NUMBA_AVAILABLE
+    # Installed whether or not they were compiled
+    monkeypatch.setattr(scoring, "KERNELS", CompiledKernels)
+    scoring.SCORE_CACHE.clear()
+    for hand, (score, in_meld, near_meld) in zip(random_hands(200, 10, 5), expected):
+        assert (hand.score(), hand.context().in_meld, hand.context().near_meld) == (score, in_meld, near_meld)
+        assert discard_highest_non_near(hand) in hand.cards
+    np.testing.assert_array_equal(scoring.score_masks_many(masks), expected_many)
+    uninstall_kernels()
+    assert scoring.KERNELS is None
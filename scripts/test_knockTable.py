@@ -0,0 +1,45 @@
+# ---------------------------------------------------------
+# Tests for knock tables
+# ---------------------------------------------------------
+
+import os
+import numpy as np
+import pytest
+from knockTable import *
+from strategies import *
+
+
+def test_resumed_generation_matches_a_fresh_one(tmp_path):
+    resumed, fresh = str(tmp_path / "resumed"), str(tmp_path / "fresh")
+    generate_table(resumed, num_chunks = 2, rounds_per_chunk = 100, max_workers = 1)
+    first_chunk = os.path.join(resumed, "chunk_00000.npz")
+    written = os.path.getmtime(first_chunk)
+    table = generate_table(resumed, num_chunks = 3, rounds_per_chunk = 100, max_workers = 1, min_count = 5)
+    assert os.path.getmtime(first_chunk) == written
+    expected = generate_table(fresh, num_chunks = 3, rounds_per_chunk = 100, max_workers = 2, min_count = 5)
+    for key in table:
+        np.testing.assert_array_equal(table[key], expected[key])
+    assert table["knock_count"].sum() + table["continue_count"].sum() > 300
+    with pytest.raises(ValueError):
+        generate_table(resumed, num_chunks = 3, rounds_per_chunk = 50)
+
+
+def test_table_strategy_looks_up_the_state(tmp_path):
+    table = {key: np.zeros(KNOCK_TABLE_SHAPE) for key in ["knock_gain", "knock_win_rate",
+                                                          "knock_count", "continue_count"]}
+    table["knock"] = np.zeros(KNOCK_TABLE_SHAPE, dtype = bool)
+    table["knock"][12, 3, 1] = True
+    path = str(tmp_path / "table.npz")
+    save_table(table, path)
+    strategy = make_table_knock_strategy(path)
+
+    hand, pile = Hand(), Pile()
+    hand.add_cards([Card(r, "S") for r in "A23456"] + [Card("2", "H"), Card("K", "D")])
+    pile.add_cards([Card("5", "C"), Card("9", "C")])
+    pile.remove_top_card()
+    assert hand.score() == 12
+    assert strategy(hand, None, pile, False, 3)
+    assert not strategy(hand, None, pile, True, 3)
+    assert not strategy(hand, None, pile, False, 4)
+    hand.pile_draws = 1
+    assert not strategy(hand, None, pile, False, 3)
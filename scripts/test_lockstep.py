@@ -0,0 +1,48 @@
+# ---------------------------------------------------------
+# Tests for the lockstep engine
+# ---------------------------------------------------------
+
+import numpy as np
+import pytest
+from lockstep import *
+from strategies import make_strategy_dict
+
+
+def new_game(cls, total_rounds, knocks, piles, **kwargs):
+    return cls(player_names = ["Bailey", "Dan"], strategy_dict = make_strategy_dict(),
+               knock_strategies = knocks, pile_strategies = piles,
+               discard_strategies = ["Discard Highest Useless"] * 2, target_score = None,
+               total_rounds = total_rounds, random_seed = 3, save_results = False, **kwargs)
+
+
+def summarize(game):
+    rounds = list(game.iter_rounds())
+    return {key: np.array([r[key] if key == "turns" else r[key][0] for r in rounds])
+            for key in ["turns", "score_changes", "round_scores"]}
+
+
+def test_lockstep_matches_game_in_distribution():
+    knocks, piles = ["Knock at 10", "Knock at 40"], ["Pile if Completes", "Always Pile"]
+    fast = summarize(new_game(LockstepGame, 20000, knocks, piles, batch_size = 5000))
+    slow = summarize(new_game(Game, 1500, knocks, piles))
+    for key in fast:
+        error = np.sqrt(fast[key].var() / len(fast[key]) + slow[key].var() / len(slow[key]))
+        assert abs(fast[key].mean() - slow[key].mean()) < 4 * error, key
+
+
+def test_lockstep_rounds_follow_the_rules():
+    batch = play_rounds(2000, [20, 30], [PILE_NEVER, PILE_IF_COMPLETES], np.random.default_rng(0))
+    assert (batch["score_changes"].sum(axis = 1) == 0).all()
+    assert (batch["dealer"] == np.arange(2000) % 2).all()
+    knocker = batch["knocker"]
+    rows = np.arange(2000)
+    # The knocker wins the difference in deadwood, which is negative if they were undercut
+    assert (batch["score_changes"][rows, knocker] ==
+            batch["round_scores"][rows, 1 - knocker] - batch["round_scores"][rows, knocker]).all()
+
+
+def test_unsupported_strategies_are_refused():
+    with pytest.raises(ValueError):
+        new_game(LockstepGame, 10, ["DynamicKnockHigh vs conservative knock 25", "Knock at 25"], ["No Pile"] * 2)
+    with pytest.raises(ValueError):
+        new_game(LockstepGame, 10, ["Knock at 25"] * 2, ["No Pile", "Pile if Lowers Deadwood"])
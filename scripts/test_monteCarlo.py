@@ -0,0 +1,124 @@
+# ---------------------------------------------------------
+# Tests for the Monte Carlo search bot
+# ---------------------------------------------------------
+
+import random
+import pytest
+from cardMemory import deck_mask
+from monteCarlo import *
+from strategies import *
+
+
+def mask_of(cards):
+    mask = 0
+    for card in cards:
+        mask |= 1 << card.index
+    return mask
+
+
+def test_rollout_policies():
+    hand = Hand()
+    hand.add_cards([Card(r, "S") for r in "456"] + [Card("9", "H"), Card("9", "D"), Card("K", "C"), Card("2", "C")])
+    masks = list(hand.context().masks)
+    assert completes_meld(masks, Card("7", "S").index) and completes_meld(masks, Card("9", "C").index)
+    assert not completes_meld(masks, Card("Q", "C").index)
+    # The 9s are a near set, so the king goes first, then (once the king is gone) a 9 over the run
+    assert highest_useless(masks) == Card("K", "C").index
+    masks[3] &= ~(1 << Card("K", "C").index % NUM_RANKS) & ~(1 << Card("2", "C").index % NUM_RANKS)
+    assert highest_useless(masks) == Card("9", "H").index
+
+    # The opponent takes their last turn after the knock: they draw the 7 of spades and throw the king
+    opponent = Hand()
+    opponent.add_cards([Card(r, "S") for r in "89T"] + [Card("K", "H")])
+    hands = [list(hand.context().masks), list(opponent.context().masks)]
+    deck = [Card("A", "D").index, Card("7", "S").index]
+    assert rollout(hands, [], deck, 1, 0, 25) == -hand.score()
+    assert deck == [Card("A", "D").index]
+
+
+def test_sampled_worlds_match_what_the_bot_saw():
+    bot = MonteCarloBot(time_budget = None, max_samples = 2)
+    checked = []
+
+    def knock(hand, deck, pile, anyone_knocked, turn):
+        opponent = game.players[1].hand
+        world = bot.sample_world(hand, deck, pile, anyone_knocked, turn, random.Random(turn))
+        dealt = deck_mask(world.hands[1])
+        assert bin(dealt).count("1") == opponent.length()
+        assert dealt & hand.memory.opponent_known == hand.memory.opponent_known
+        assert dealt & hand.memory.seen == hand.memory.opponent_known
+        assert len(world.deck) == deck.length() and not mask_of(CARD_TEMPLATE[i] for i in world.deck) & dealt
+        assert not mask_of(CARD_TEMPLATE[i] for i in world.deck) & hand.memory.seen
+        checked.append(turn)
+        return bot.should_knock(hand, deck, pile, anyone_knocked, turn)
+
+    strategy_dict = make_strategy_dict()
+    strategy_dict["Checked Knock"] = knock
+    game = Game(player_names = ["Bailey", "Dan"], strategy_dict = strategy_dict,
+                knock_strategies = ["Checked Knock", "Knock at 25"], pile_strategies = ["Pile if Completes"] * 2,
+                discard_strategies = ["Discard Highest Useless"] * 2, target_score = None, total_rounds = 5,
+                random_seed = 2, save_results = False)
+    game.play_game()
+    assert len(checked) > 10
+    assert bot.stats()["rollouts"] == 4 * bot.stats()["decisions"] and bot.rollouts_per_second() > 0
+
+
+def test_worlds_sampled_at_draw_and_discard_time_do_not_share_cards():
+    bot = MonteCarloBot(time_budget = None, max_samples = 2)
+    checked = []
+
+    def check(hand, deck, pile, anyone_knocked, turn):
+        world = bot.sample_world(hand, deck, pile, anyone_knocked, turn, random.Random(turn))
+        mine, theirs = deck_mask(world.hands[0]), deck_mask(world.hands[1])
+        dealt = mask_of(CARD_TEMPLATE[i] for i in world.deck)
+        piled = mask_of(CARD_TEMPLATE[i] for i in world.pile)
+        assert mine == mask_of(hand.cards) and bin(theirs).count("1") == game.players[1].hand.length()
+        assert len(world.deck) == deck.length()
+        assert not mine & theirs and not mine & dealt and not theirs & dealt
+        assert not (mine | theirs | dealt) & piled
+        assert bin(mine | theirs | dealt | piled).count("1") == 52
+        checked.append(hand.length())
+
+    def pile_strategy(hand, deck, pile, anyone_knocked, turn):
+        check(hand, deck, pile, anyone_knocked, turn)
+        return bot.should_draw_pile(hand, deck, pile, anyone_knocked, turn)
+
+    def discard_strategy(hand, deck, pile, anyone_knocked, turn):
+        check(hand, deck, pile, anyone_knocked, turn)
+        return bot.pick_discard(hand, deck, pile, anyone_knocked, turn)
+
+    strategy_dict = make_strategy_dict()
+    strategy_dict.update({"Checked Pile": pile_strategy, "Checked Discard": discard_strategy})
+    game = Game(player_names = ["Bailey", "Dan"], strategy_dict = strategy_dict,
+                knock_strategies = ["Knock at 25"] * 2, pile_strategies = ["Checked Pile", "Pile if Completes"],
+                discard_strategies = ["Checked Discard", "Discard Highest Useless"], target_score = None,
+                total_rounds = 10, random_seed = 3, save_results = False)
+    game.play_game()
+    assert checked.count(9) > 10 and checked.count(10) > 10
+
+
+def test_sample_limited_bot_is_reproducible():
+    def play():
+        bot = MonteCarloBot(time_budget = None, max_samples = 5)
+        strategy_dict = make_strategy_dict()
+        strategy_dict.update({"MC Knock": bot.should_knock, "MC Pile": bot.should_draw_pile,
+                              "MC Discard": bot.pick_discard})
+        game = Game(player_names = ["Bailey", "Dan"], strategy_dict = strategy_dict,
+                    knock_strategies = ["MC Knock", "Knock at 25"], pile_strategies = ["MC Pile", "Pile if Completes"],
+                    discard_strategies = ["MC Discard", "Discard Highest Useless"], target_score = None,
+                    total_rounds = 5, random_seed = 4, save_results = False)
+        game.play_game()
+        return game.players[0].score
+    assert play() == play()
+
+
+def test_rounds_with_more_than_two_players_are_refused():
+    bot = MonteCarloBot(time_budget = None, max_samples = 5)
+    strategy_dict = make_strategy_dict()
+    strategy_dict["MC Pile"] = bot.should_draw_pile
+    game = Game(player_names = ["Bailey", "Dan", "Cy"], strategy_dict = strategy_dict,
+                knock_strategies = ["Knock at 25"] * 3, pile_strategies = ["MC Pile"] * 3,
+                discard_strategies = ["Discard Highest Useless"] * 3, target_score = None,
+                total_rounds = 1, random_seed = 4, save_results = False)
+    with pytest.raises(ValueError):
+        game.play_game()
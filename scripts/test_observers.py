@@ -0,0 +1,50 @@
+# ---------------------------------------------------------
+# Tests for game observers
+# ---------------------------------------------------------
+
+from gameLogic import *
+from observers import GameObserver
+from strategies import make_strategy_dict
+
+
+def test_observers_see_every_turn_and_knock():
+    class Counter(GameObserver):
+        def __init__(self):
+            self.deals, self.turns, self.knocks, self.ends = 0, [], [], []
+        def on_deal(self, game, round_number):
+            self.deals += 1
+        def on_turn(self, game, round_number, turn, player_number):
+            self.turns.append((round_number, turn))
+        def on_knock(self, game, round_number, turn, player_number, deck_ran_out):
+            self.knocks.append((round_number, player_number))
+        def on_round_end(self, game, summary):
+            self.ends.append(summary)
+
+    counter = Counter()
+    game = Game(player_names = ["Bailey", "Dan"], strategy_dict = make_strategy_dict(),
+                knock_strategies = ["Knock at 20"] * 2, pile_strategies = ["Pile if Completes"] * 2,
+                discard_strategies = ["Discard Highest Useless"] * 2, target_score = None,
+                total_rounds = 40, random_seed = 6, save_results = False, observers = [counter])
+    game.play_game()
+    assert counter.deals == len(counter.ends) == 40
+    assert [(r, s["knocker"]) for r, s in enumerate(counter.ends)] == counter.knocks
+    # Every turn is observed, except the last one if it only found that its player had already knocked
+    for summary in counter.ends:
+        turns = [t for r, t in counter.turns if r == summary["round"]]
+        assert turns == list(range(1, len(turns) + 1)) and len(turns) in (summary["turns"] - 1, summary["turns"])
+
+
+def test_verbose_games_print_each_hand_as_the_turn_starts(capsys):
+    game = Game(player_names = ["Bailey", "Dan"], strategy_dict = make_strategy_dict(),
+                knock_strategies = ["Knock at 20"] * 2, pile_strategies = ["Pile if Completes"] * 2,
+                discard_strategies = ["Discard Highest Useless"] * 2, target_score = None,
+                total_rounds = 3, random_seed = 6, save_results = False, verbose = True)
+    game.play_game()
+    lines = capsys.readouterr().out.splitlines()
+    starts = [i for i, line in enumerate(lines) if line.startswith("It is ")]
+    assert len(starts) > 6
+    for i in starts:
+        name = lines[i].split()[2][:-2]
+        assert lines[i + 2].startswith(name + "'s hand to start the turn is: ")
+        assert lines[i + 3].startswith((name + " has already knocked", name + " decided to knock!",
+                                        "The top card on the pile is a", "There are no cards in the discard pile."))
@@ -0,0 +1,37 @@
+# ---------------------------------------------------------
+# Tests for the exact opening hand deadwood distribution
+# ---------------------------------------------------------
+
+from itertools import combinations
+from math import comb
+import numpy as np
+import pytest
+from openingHands import *
+from scoring import score_many
+
+
+def test_enumeration_matches_every_hand_dealt(tmp_path):
+    hands = np.array(list(combinations(range(52), 4)))
+    deadwood = score_many(hands)
+    distribution = generate_distribution(str(tmp_path), num_chunks = 3, hand_size = 4, max_workers = 1)
+    np.testing.assert_array_equal(distribution["counts"], np.bincount(deadwood, minlength = 41))
+    # Rank r in the first suit is card index r
+    for r in range(13):
+        holds = (hands == r).any(axis = 1)
+        np.testing.assert_array_equal(distribution["holding"][r], np.bincount(deadwood[holds], minlength = 41))
+    without_king = deadwood_probabilities(distribution, up_card = "K")
+    expected = np.bincount(deadwood[~(hands == 12).any(axis = 1)], minlength = 41) / comb(51, 4)
+    np.testing.assert_allclose(without_king, expected)
+    with pytest.raises(ValueError):
+        generate_distribution(str(tmp_path), num_chunks = 3, hand_size = 5)
+
+
+def test_stored_distribution_counts_every_opening_hand():
+    distribution = load_distribution()
+    assert distribution["counts"].sum() == comb(52, 9)
+    assert (distribution["holding"].sum(axis = 1) == comb(51, 8)).all()
+    probabilities = deadwood_probabilities(distribution)
+    assert 52 < mean_deadwood(probabilities) < 53
+    # A king face up is one fewer high card that could have been dealt
+    assert mean_deadwood(deadwood_probabilities(distribution, up_card = "K")) < mean_deadwood(probabilities)
+    assert mean_deadwood(holding_probabilities(distribution, "K")) > mean_deadwood(probabilities)
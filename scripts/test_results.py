@@ -0,0 +1,45 @@
+# ---------------------------------------------------------
+# Tests for the results store
+# ---------------------------------------------------------
+
+import csv
+from concurrent.futures import ProcessPoolExecutor
+from results import *
+
+
+def fake_rows(notes, players = 2):
+    return [{"seed": 1, "player_number": i, "draw_strategy": "No Pile", "discard_strategy": "Discard Highest Useless",
+             "knock_strategy": "Knock at 25", "rounds": 10, "wins": 5, "avg_win": 0.5, "var_win": 2.0,
+             "start_time": "2020-06-28 13:53:27", "elapsed_seconds": 0.1, "notes": notes} for i in range(players)]
+
+
+def append_many(db_path, notes, n):
+    return [append_results(fake_rows(notes), db_path) for _ in range(n)]
+
+
+def test_concurrent_writers_get_unique_sim_ids(tmp_path):
+    db_path = str(tmp_path / "results.db")
+    with ProcessPoolExecutor(max_workers = 4) as pool:
+        ids = [i for chunk in pool.map(append_many, [db_path] * 4, ["w" + str(i) for i in range(4)], [10] * 4)
+               for i in chunk]
+    assert sorted(ids) == list(range(1, 41))
+    with ResultsStore(db_path) as store:
+        assert len(store.query()) == 80
+        assert {row["sim_id"] for row in store.query(notes = "w2")} <= set(ids)
+        store.export_csv(str(tmp_path / "export.csv"), notes = "w1")
+    with open(tmp_path / "export.csv") as f:
+        assert len(list(csv.DictReader(f))) == 20
+
+
+def test_csv_append_keeps_existing_column_order(tmp_path):
+    csv_path = str(tmp_path / "results.csv")
+    columns = sorted(RESULT_COLUMNS)
+    with open(csv_path, "w", newline = "") as f:
+        writer = csv.DictWriter(f, fieldnames = columns)
+        writer.writeheader()
+        for row in fake_rows("old"):
+            writer.writerow(dict(row, sim_id = 7.0))
+    assert append_results(fake_rows("new"), csv_path) == 8
+    rows = read_csv_rows(csv_path)
+    assert [row["sim_id"] for row in rows] == [7, 7, 8, 8]
+    assert rows[-1]["notes"] == "new" and rows[-1]["knock_strategy"] == "Knock at 25"
@@ -0,0 +1,122 @@
+# ---------------------------------------------------------
+# Tests for the scoring engine
+# ---------------------------------------------------------
+
+import random
+from gameLogic import *
+
+
+def legacy_score(hand):
+    """Score a hand with the original recursive F algorithm."""
+    hand_boof, suitStarts, sz = give_me_handBoof_suitStarts_and_sz(hand)
+    return sum([c.value for c in hand.cards]) - F(sz, hand_boof, suitStarts)
+
+
+def make_hand(names):
+    """Build a hand from strings like '4S' or 'TD'."""
+    hand = Hand()
+    hand.add_cards([Card(name[0], name[1]) for name in names])
+    return hand
+
+
+def test_run_beats_set_example():
+    # Example from the Hand.score docstring
+    hand = make_hand(['4D', '4C', '4S', '5S', '6S'])
+    assert hand.score() == 8
+    assert [[str(c) for c in meld] for meld in hand.melds()] == [['4 of S', '5 of S', '6 of S']]
+
+
+def test_four_of_a_kind_and_shared_card():
+    hand = make_hand(['7S', '7H', '7D', '7C', '8C', '9C', 'KH'])
+    # 7C can go to the run 7-8-9C, leaving the 7S/7H/7D set: only KH is left
+    assert hand.score() == 10
+    assert hand.score() == legacy_score(hand)
+
+
+def test_run_table_edges():
+    # Aces are low only, and runs do not wrap around
+    assert deadwood(hand_masks(make_hand(['QH', 'KH', 'AH']).cards)) == 21
+    assert deadwood(hand_masks(make_hand(['AH', '2H', '3H']).cards)) == 0
+    assert RUN_DEADWOOD[FULL_SUIT_MASK] == 0
+
+
+def test_melds_account_for_deadwood():
+    random.seed(7)
+    for _ in range(200):
+        deck = Deck()
+        hand = Hand()
+        hand.add_cards(deck.draw(10))
+        melded = hand.melds()
+        melded_cards = [c for meld in melded for c in meld]
+        assert len(melded_cards) == len({(c.rank, c.suit) for c in melded_cards})
+        assert hand.score() == sum(c.value for c in hand.cards) - sum(c.value for c in melded_cards)
+
+
+def test_matches_legacy_scorer():
+    random.seed(2020)
+    for _ in range(25):
+        deck = Deck()
+        hand = Hand()
+        hand.add_cards(deck.draw(9))
+        assert hand.score() == legacy_score(hand)
+
+
+def test_cache_shares_suit_permutations():
+    cache = DeadwoodCache(maxsize = 2)
+    spades = hand_masks(make_hand(['4S', '5S', '6S', '9D']).cards)
+    hearts = hand_masks(make_hand(['4H', '5H', '6H', '9C']).cards)
+    assert cache.deadwood(spades) == cache.deadwood(hearts) == 9
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.deadwood(hand_masks(make_hand(['KS']).cards))
+    cache.deadwood(hand_masks(make_hand(['QS']).cards))
+    assert cache.info()["evictions"] == 1
+    cache.resize(0)
+    assert cache.info()["size"] == 0
+
+
+def test_deadwood_without_each_matches_rescoring():
+    random.seed(11)
+    pool = [Card(r, s) for r in '34567' for s in 'SHDC']
+    for _ in range(100):
+        hand = Hand()
+        hand.add_cards(random.sample(pool, 10))
+        after_discard = hand.deadwood_without_each()
+        for i, card in enumerate(hand.cards):
+            smaller = Hand()
+            smaller.add_cards([c for c in hand.cards if c != card])
+            assert after_discard[i] == smaller.score()
+            assert smaller.deadwood_with(card) == hand.score()
+
+
+def test_deadwood_with_each_matches_rescoring():
+    random.seed(12)
+    pool = [Card(r, s) for r in '34567' for s in 'SHDC']
+    for size in [8, 9, 10]:
+        for _ in range(30):
+            hand = Hand()
+            hand.add_cards(random.sample(pool, size))
+            masks = hand.context().masks
+            with_each = deadwood_with_each(masks, range(52))
+            for card in CARD_TEMPLATE:
+                larger = list(masks)
+                larger[card.index // NUM_RANKS] |= 1 << (card.index % NUM_RANKS)
+                assert with_each[card.index] == deadwood(larger) == hand.deadwood_with(card)
+
+
+def test_score_many_matches_deadwood():
+    import numpy as np
+    rng = np.random.default_rng(4)
+    # Draw from a narrow band of ranks so that sets and runs are common
+    pool = np.array([CARD_INDEX[(r, s)] for r in '34567' for s in suits])
+    index_hands = np.array([rng.choice(pool, 10, replace = False) for _ in range(300)])
+    expected = []
+    for row in index_hands:
+        masks = [0, 0, 0, 0]
+        for idx in row:
+            masks[idx // NUM_RANKS] |= 1 << (idx % NUM_RANKS)
+        expected.append(deadwood(masks))
+    assert list(score_many(index_hands)) == expected
+    
+    bool_hands = np.zeros((len(index_hands), 52), dtype = bool)
+    bool_hands[np.arange(len(index_hands))[:, None], index_hands] = True
+    assert list(score_many(bool_hands)) == expected
@@ -0,0 +1,83 @@
+# ---------------------------------------------------------
+# Tests for the game server
+# ---------------------------------------------------------
+
+import asyncio
+import json
+from server import *
+
+
+def test_load_test_finishes_every_table():
+    result = asyncio.run(load_test(clients = 8, rounds = 2, bot_workers = 2))
+    assert result["games"] == 8 and len(result["tables"]) == 8
+    assert all(table["finished"] for table in result["tables"].values())
+    assert result["bot"]["decisions"] > 0
+    assert result["bot"]["p50_ms"] <= result["bot"]["p99_ms"] <= result["bot"]["max_ms"]
+
+
+def test_invalid_decisions_are_asked_again():
+    async def play():
+        server = await GameServer(port = 0, bot_workers = 1).start()
+        reader, writer = await asyncio.open_connection(server.host, server.port)
+
+        async def receive(kind):
+            while True:
+                message = json.loads(await reader.readline())
+                if message["type"] == kind:
+                    return message
+
+        def send(message):
+            writer.write(json.dumps(message).encode() + b"\n")
+
+        send({"type": "join", "difficulty": "nightmare"})
+        assert "Unknown difficulty" in (await receive("error"))["error"]
+        send({"type": "join", "difficulty": "random", "seed": 3})
+        table = (await receive("joined"))["table"]
+        ask = await receive("decide")
+        if ask["decision"] == "knock":
+            send({"type": "decision", "table": table, "knock": False})
+            ask = await receive("decide")
+        assert ask["decision"] == "draw"
+        send({"type": "decision", "table": table, "draw": "deck"})
+        ask = await receive("decide")
+        missing = next(r + s for r in "A23456789TJQK" for s in "SHDC" if r + s not in ask["hand"])
+        send({"type": "decision", "table": table, "discard": missing})
+        assert "not in your hand" in (await receive("error"))["error"]
+        send({"type": "decision", "table": table, "discard": ask["hand"][0]})
+        turn = await receive("turn")
+        assert turn["player"] == 0 and turn["discarded"] == ask["hand"][0]
+        writer.close()
+        await server.close()
+    asyncio.run(play())
+
+
+def test_decisions_for_other_connections_tables_are_rejected():
+    async def play():
+        server = await GameServer(port = 0, bot_workers = 1, max_rounds = 5).start()
+        owner = await asyncio.open_connection(server.host, server.port)
+        intruder = await asyncio.open_connection(server.host, server.port)
+
+        async def receive(connection, kind):
+            while True:
+                message = json.loads(await connection[0].readline())
+                if message["type"] == kind:
+                    return message
+
+        def send(connection, message):
+            connection[1].write(json.dumps(message).encode() + b"\n")
+
+        send(owner, {"type": "join", "difficulty": "random", "seed": 3, "rounds": 6})
+        assert "between 1 and 5" in (await receive(owner, "error"))["error"]
+        send(owner, {"type": "join", "difficulty": "random", "seed": 3})
+        table = (await receive(owner, "joined"))["table"]
+        ask = await receive(owner, "decide")
+        send(intruder, {"type": "decision", "table": table, "knock": True, "draw": "deck"})
+        assert "No table" in (await receive(intruder, "error"))["error"]
+        # The owner's table is still waiting for the owner's decision
+        assert server.tables[table].decisions.empty()
+        send(owner, {"type": "decision", "table": table, "knock": False, "draw": "deck"})
+        assert (await receive(owner, "decide"))["decision"] != ask["decision"]
+        for connection in (owner, intruder):
+            connection[1].close()
+        await server.close()
+    asyncio.run(play())
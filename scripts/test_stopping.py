@@ -0,0 +1,40 @@
+# ---------------------------------------------------------
+# Tests for adaptive early stopping
+# ---------------------------------------------------------
+
+import numpy as np
+from stopping import *
+from strategies import *
+
+
+def new_game(knocks, total_rounds, rule):
+    return Game(player_names = ["Bailey", "Dan"], strategy_dict = make_strategy_dict(),
+                knock_strategies = knocks, pile_strategies = ["Pile if Completes"] * 2,
+                discard_strategies = ["Discard Highest Useless"] * 2, target_score = None,
+                total_rounds = total_rounds, random_seed = 11, save_results = False, stopping_rule = rule)
+
+
+def test_rule_only_stops_on_batch_boundaries():
+    rule = StoppingRule(half_width = None, batch_size = 50, min_rounds = 100)
+    rng = np.random.default_rng(0)
+    clear = rng.normal(10, 30, 150)
+    assert rule.check(clear[:50]) is None
+    assert rule.check(clear[:149]) is None
+    assert rule.check(clear) == DECIDED
+    assert StoppingRule(alpha = None, half_width = 0.5).check(rng.normal(0, 1, 200)) == PRECISE
+
+
+def test_lopsided_matchup_stops_early_and_records_rounds():
+    game = new_game(["Knock at 0", "Knock at 60"], 2000, StoppingRule())
+    game.play_game()
+    rounds = len(game.players[0].score) - 1
+    assert game.stop_reason == DECIDED
+    assert rounds < 2000 and rounds % 50 == 0
+    assert all(row["rounds"] == rounds for row in game.result_rows())
+
+
+def test_even_matchup_plays_to_the_most_rounds():
+    game = new_game(["Knock at 25", "Knock at 25"], 200, StoppingRule(half_width = None))
+    game.play_game()
+    assert game.stop_reason is None
+    assert game.result_rows()[0]["rounds"] == 200
@@ -0,0 +1,83 @@
+# ---------------------------------------------------------
+# Tests for the strategy helpers
+# ---------------------------------------------------------
+
+import pickle
+import random
+import pytest
+from strategies import *
+
+
+def random_hands(n, size, seed):
+    """Deal n hands of the given size from fresh decks."""
+    random.seed(seed)
+    hands = []
+    for _ in range(n):
+        hand = Hand()
+        hand.add_cards(Deck().draw(size))
+        hands.append(hand)
+    return hands
+
+
+def test_context_matches_keeper_columns():
+    for hand in random_hands(100, 10, 3):
+        keepers = add_keeper_column(df = sort_hand(hand))
+        context = hand.context()
+        by_card = {(c.rank, c.suit): i for i, c in enumerate(hand.cards)}
+        for _, row in keepers.iterrows():
+            i = by_card[(row['ranks'], row['suits'])]
+            assert context.in_run[i] == bool(row['run_keeper'])
+            assert context.in_set[i] == bool(row['set_keeper'])
+            assert context.in_meld[i] == bool(row['either'])
+
+
+def test_context_is_invalidated_when_hand_changes():
+    hand = Hand()
+    hand.add_cards([Card('4', 'S'), Card('5', 'S')])
+    context = hand.context()
+    assert hand.context() is context
+    assert context.completes_meld(Card('6', 'S'))
+    assert not context.completes_meld(Card('6', 'H'))
+    assert context.near_meld_with(Card('4', 'D'))
+    hand.add_cards(Card('6', 'S'))
+    assert hand.context() is not context
+    assert hand.score() == 0
+
+
+def test_strategies_pickle_compare_and_hash_by_value():
+    strategies = make_strategy_dict()
+    for name in ["Knock at 25", "DynamicKnockHigh vs conservative knock 25", "Turn 4 Near Runs and Sets Discard",
+                 "Pile if Live Outs", "Monte Carlo Pile", "Pile if Completes"]:
+        strategy = strategies[name]
+        copy = pickle.loads(pickle.dumps(strategy))
+        assert copy == strategy and hash(copy) == hash(strategy)
+        assert config_hash(copy) == config_hash(strategy)
+    assert len(pickle.dumps(strategies["Knock at 25"])) < 100
+    assert ListKnock([30, 25]) == ListKnock((30, 25)) != ListKnock([30, 20])
+    assert ConstantKnock(25) != ListKnock([25])
+    # Config hashes never change from run to run
+    assert ConstantKnock(25).config_hash() == "080982a0292fd25c"
+    # Bots with the same settings are shared
+    assert strategies["Monte Carlo Knock"].bot is MonteCarloStrategy("discard").bot
+    assert MonteCarloStrategy("discard", time_budget = 0.1).bot is not strategies["Monte Carlo Knock"].bot
+
+
+def test_registry_resolves_strategy_names():
+    strategies = make_strategy_dict()
+    assert strategies["Knock at 23"] == ConstantKnock(23) and "Knock at 23" in strategies
+    assert resolve_strategy("Knock at 0") == ConstantKnock(1)
+    assert strategies["Turn 6 Near Runs and Sets Draw From Pile"] == TurnNearRunsSetsDraw(7)
+    assert resolve_strategy("Turn 4 Near Runs and Sets Discard") == generate_turn_near_runs_sets_discarder(5)
+    with pytest.raises(KeyError):
+        strategies["Knock sometimes"]
+    # Every registered strategy makes exactly one decision
+    names = {decision: strategies.decision_names(decision) for decision in ("knock", "pile", "discard")}
+    assert sorted(sum(names.values(), [])) == sorted(strategies)
+    assert "Monte Carlo Knock" in names["knock"] and "Pile if Live Outs" in names["pile"]
+    assert "Discard Highest Dead" in names["discard"]
+    # Strategies say which decision they make, whatever they are called
+    assert ConstantKnock(25).decision == "knock" and discard_min_deadwood.decision == "discard"
+    with pytest.raises(TypeError):
+        Strategy()
+    # The standard registry is only built once
+    assert resolve_strategy("Monte Carlo Knock") is resolve_strategy("Monte Carlo Knock")
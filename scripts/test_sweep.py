@@ -0,0 +1,116 @@
+# ---------------------------------------------------------
+# Tests for sweeps spread across workers through a shared directory
+# ---------------------------------------------------------
+
+import multiprocessing
+import os
+import signal
+import time
+import pytest
+from results import ResultsStore
+from stopping import StoppingRule
+from sweep import *
+from tournament import run_tournament
+
+TIMING = ("sim_id", "start_time", "elapsed_seconds")
+
+
+def untimed(rows):
+    return [[{key: value for key, value in row.items() if key not in TIMING} for row in cell_rows]
+            for cell_rows in rows]
+
+
+def sweep_matchups(total_rounds):
+    return strategy_grid(["Knock at 20", "Knock at 30"], ["Pile if Completes"],
+                         ["Discard Highest Useless", "Discard Min Deadwood"], total_rounds)
+
+
+def test_dead_workers_units_are_leased_again_and_merged_once(tmp_path):
+    directory, data_path = str(tmp_path / "sweep"), str(tmp_path / "results.db")
+    matchups = sweep_matchups(100)
+    assert len(matchups) == 10
+    assert create_sweep(directory, matchups, base_seed = 3, cells_per_unit = 4) == 3
+    assert create_sweep(directory, matchups, base_seed = 3, cells_per_unit = 4) == 3
+    with pytest.raises(ValueError):
+        create_sweep(directory, matchups, base_seed = 4, cells_per_unit = 4)
+
+    # A worker leases unit 0 and dies
+    dead = WorkQueue(directory, lease_seconds = 5, worker_id = "dead")
+    assert dead.claim() == 0
+    live = WorkQueue(directory, lease_seconds = 5, worker_id = "live")
+    assert live.claim() == 1
+    live.complete(1, live.play(1))
+    assert live.status() == {"units": 3, "finished": 1, "leased": 1, "stale": 0, "waiting": 1}
+    with pytest.raises(ValueError):
+        merge_sweep(directory)
+    stale = time.time() - 10
+    os.utime(dead.lease_path(0), (stale, stale))
+    assert live.status()["stale"] == 1
+
+    assert run_worker(directory, lease_seconds = 5, worker_id = "live") == 2
+    assert not dead.renew(0)
+    merged = merge_sweep(directory, data_path)
+    assert merge_sweep(directory, data_path)["rows"] == merged["rows"]
+    expected = run_tournament(matchups, base_seed = 3, max_workers = 1)
+    assert untimed(merged["rows"]) == untimed(expected["rows"])
+    assert merged["rounds"] == expected["rounds"]
+    with ResultsStore(data_path) as store:
+        assert [row["sim_id"] for row in store.query(player_number = 0)] == list(range(1, 11))
+    assert os.listdir(os.path.join(directory, "leases")) == []
+
+
+def test_workers_on_separate_processes_survive_a_killed_one(tmp_path):
+    directory = str(tmp_path / "sweep")
+    matchups = sweep_matchups(1500)[:4]
+    create_sweep(directory, matchups, base_seed = 5, checkpoint_every = 100)
+    queue = WorkQueue(directory)
+
+    doomed = multiprocessing.Process(target = run_worker, args = (directory, 1.0, 0.1))
+    doomed.start()
+    while not os.path.exists(queue.lease_path(0)):
+        time.sleep(0.01)
+    time.sleep(0.3)
+    os.kill(doomed.pid, signal.SIGKILL)
+    doomed.join()
+    assert not queue.is_finished(0) and os.path.exists(queue.checkpoint_path(0))
+
+    workers = [multiprocessing.Process(target = run_worker, args = (directory, 1.0, 0.1)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout = 120)
+        assert worker.exitcode == 0
+    assert queue.status()["finished"] == 4
+    expected = run_tournament(matchups, base_seed = 5, max_workers = 1)
+    assert untimed(merge_sweep(directory)["rows"]) == untimed(expected["rows"])
+
+
+def test_sweeps_with_a_stopping_rule_stop_like_a_tournament(tmp_path):
+    directory = str(tmp_path / "sweep")
+    matchups = strategy_grid(["Knock at 10", "Knock at 40"], ["Pile if Completes"], ["Discard Highest Useless"], 2000,
+                             stopping_rule = StoppingRule(half_width = 3.0, batch_size = 50))
+    create_sweep(directory, matchups, base_seed = 2)
+    assert run_worker(directory, worker_id = "only") == 3
+    merged = merge_sweep(directory)
+    expected = run_tournament(matchups, base_seed = 2, max_workers = 1)
+    assert untimed(merged["rows"]) == untimed(expected["rows"])
+    assert merged["rounds"] == expected["rounds"] < 3 * 2000
+
+
+def test_a_fresh_lease_is_not_broken_by_a_worker_that_saw_it_stale(tmp_path):
+    directory = str(tmp_path / "sweep")
+    create_sweep(directory, sweep_matchups(100)[:1])
+    dead = WorkQueue(directory, lease_seconds = 5, worker_id = "dead")
+    first = WorkQueue(directory, lease_seconds = 5, worker_id = "first")
+    second = WorkQueue(directory, lease_seconds = 5, worker_id = "second")
+    assert dead.claim() == 0
+    stale = time.time() - 10
+    os.utime(dead.lease_path(0), (stale, stale))
+    # The first worker sees dead's stale lease, but the second breaks it and leases the unit before the first acts
+    owner = first.lease_owner(0)
+    assert owner == "dead" and first.is_stale(0)
+    assert second.claim() == 0
+    assert not first._break_lease(0, owner)
+    assert first.lease_owner(0) == "second" and second.renew(0)
+    assert first.claim() is None
+    assert os.listdir(os.path.join(directory, "leases")) == ["unit_00000.json"]
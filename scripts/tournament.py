@@ -0,0 +1,219 @@
+# ---------------------------------------------------------
+# Run many independent games (a strategy grid search)
+# across a pool of worker processes.
+# ---------------------------------------------------------
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from gameLogic import *
+from strategies import make_strategy_dict
+
+# Strategy dictionaries already built in this (worker) process, keyed by factory
+_worker_strategies = {}
+
+
+def cell_seed(base_seed, index):
+    """Return a deterministic 32 bit seed for cell number index of a tournament."""
+    digest = hashlib.sha256((str(base_seed) + ":" + str(index)).encode()).digest()
+    return int.from_bytes(digest[:4], "big")
+
+
+def knock_grid(knock_strategies, pile_strategy, discard_strategy, total_rounds, notes = "", stopping_rule = None):
+    
+    '''
+    Build the matchups of a knock grid search: every pairing of knock strategies
+    where player 0's strategy comes no later in the list than player 1's.
+    Both players use the same pile and discard strategies. With a stopping_rule (see stopping.py),
+    total_rounds is the most rounds a matchup plays and each one stops as soon as it is decided.
+    
+    Returns List of matchup dictionaries (see run_tournament)
+    '''
+    
+    matchups = []
+    for i in range(len(knock_strategies)):
+        for j in range(i, len(knock_strategies)):
+            matchups.append({"knock_strategies": [knock_strategies[i], knock_strategies[j]],
+                             "pile_strategies": [pile_strategy, pile_strategy],
+                             "discard_strategies": [discard_strategy, discard_strategy],
+                             "total_rounds": total_rounds,
+                             "extra_comments": notes,
+                             "stopping_rule": stopping_rule})
+    return matchups
+
+
+def strategy_grid(knock_strategies, pile_strategies, discard_strategies, total_rounds, notes = "", stopping_rule = None):
+
+    '''
+    Build the matchups of a full strategy sweep: every player is one combination of a knock, a pile and a
+    discard strategy, and every pairing of combinations plays (player 0's coming no later in the list than
+    player 1's, as in knock_grid).
+
+    Returns List of matchup dictionaries (see run_tournament)
+    '''
+
+    combinations = [(k, p, d) for k in knock_strategies for p in pile_strategies for d in discard_strategies]
+    matchups = []
+    for i in range(len(combinations)):
+        for j in range(i, len(combinations)):
+            pair = (combinations[i], combinations[j])
+            matchups.append({"knock_strategies": [c[0] for c in pair],
+                             "pile_strategies": [c[1] for c in pair],
+                             "discard_strategies": [c[2] for c in pair],
+                             "total_rounds": total_rounds,
+                             "extra_comments": notes,
+                             "stopping_rule": stopping_rule})
+    return matchups
+
+
+def play_matchup(matchup, strategy_factory = make_strategy_dict, player_names = ("Bailey", "Dan")):
+    
+    '''
+    Play one matchup to completion and return its result rows (see Game.result_rows).
+    Runs in a worker process, so the strategies are rebuilt there from strategy_factory.
+    '''
+    
+    game = make_game(matchup, strategy_factory, player_names)
+    game.play_game()
+    return game.result_rows()
+
+
+def make_game(matchup, strategy_factory = make_strategy_dict, player_names = ("Bailey", "Dan")):
+    """Build (without playing) the Game of a matchup, reusing this process's strategy dictionary."""
+    if strategy_factory not in _worker_strategies:
+        _worker_strategies[strategy_factory] = strategy_factory()
+    return Game(player_names = list(player_names),
+                strategy_dict = _worker_strategies[strategy_factory],
+                knock_strategies = matchup["knock_strategies"],
+                pile_strategies = matchup["pile_strategies"],
+                discard_strategies = matchup["discard_strategies"],
+                target_score = matchup.get("target_score"),
+                total_rounds = matchup["total_rounds"],
+                random_seed = matchup["random_seed"],
+                extra_comments = matchup.get("extra_comments", ""),
+                save_results = False,
+                stopping_rule = matchup.get("stopping_rule"),
+                deck_orders = matchup.get("deck_orders"),
+                checkpoint_path = matchup.get("checkpoint_path"),
+                checkpoint_every = matchup.get("checkpoint_every", 100),
+                checkpoint_temp_suffix = matchup.get("checkpoint_temp_suffix", ".tmp"))
+
+
+def _settings_value(value):
+    """JSON stand-in for a matchup value that is not plain JSON (a stopping rule's settings, a deck array's list)."""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return vars(value)
+
+
+def _write_json(value, path, temp_suffix = ".tmp"):
+    """Write value to path as JSON, replacing the file in one step (through path + temp_suffix)."""
+    temp_path = path + temp_suffix
+    with open(temp_path, "w") as f:
+        json.dump(value, f, default = _settings_value)
+    os.replace(temp_path, path)
+
+
+def _cell_path(directory, index):
+    return os.path.join(directory, "cell_{:05d}.json".format(index))
+
+
+def run_tournament(matchups, base_seed = 0, strategy_factory = make_strategy_dict,
+                   max_workers = None, data_path = None, verbose = False, checkpoint_dir = None,
+                   checkpoint_every = 100):
+    
+    '''
+    Play every matchup on a process pool.
+    
+    matchups: List of Dictionaries. Each has knock_strategies, pile_strategies and discard_strategies
+              (lists of strategy names, one per player) and total_rounds. Optional keys are random_seed
+              (defaults to cell_seed(base_seed, index)), extra_comments and stopping_rule.
+    base_seed: Int. Seed that the per cell seeds are derived from.
+    strategy_factory: Function() returning a strategy dictionary. Must be defined at module level
+                      so that it can be sent to the workers.
+    max_workers: Int. Number of worker processes, defaults to the number of cores.
+    data_path: String. If entered, every matchup is appended to this results csv or database
+               (see results.append_results) as its own sim_id, in matchup order.
+    verbose: Boolean. If true, print each matchup as it finishes.
+    checkpoint_dir: String. If entered, the tournament can be stopped and run again to pick up where it left off,
+                    with the same results as if it had never stopped. Each finished matchup's rows are saved here
+                    (cell_00012.json), and each running game checkpoints itself every checkpoint_every rounds
+                    (cell_00012.game.json, see Game.checkpoint). Running again skips finished matchups (without
+                    appending them to data_path twice) and resumes the rest. Raises a ValueError if the directory
+                    holds a tournament with different matchups or seeds.
+    checkpoint_every: Int. Rounds between a game's checkpoints.
+    
+    Returns a dictionary with the result rows of every matchup (in matchup order),
+    the total number of rounds actually played, how many of them were played before a resumed run
+    (resumed_rounds), the elapsed seconds and the rounds per second of this run alone.
+    '''
+    
+    cells = []
+    for index, matchup in enumerate(matchups):
+        cell = dict(matchup)
+        if cell.get("random_seed") is None:
+            cell["random_seed"] = cell_seed(base_seed, index)
+        cells.append(cell)
+    
+    finished = {}
+    if checkpoint_dir is not None:
+        os.makedirs(checkpoint_dir, exist_ok = True)
+        settings = json.loads(json.dumps({"cells": cells}, default = _settings_value))
+        settings_path = os.path.join(checkpoint_dir, "tournament.json")
+        if os.path.exists(settings_path):
+            with open(settings_path) as f:
+                if json.load(f) != settings:
+                    raise ValueError(checkpoint_dir + " holds a tournament with different matchups or seeds")
+        else:
+            _write_json(settings, settings_path)
+        for index, cell in enumerate(cells):
+            if os.path.exists(_cell_path(checkpoint_dir, index)):
+                with open(_cell_path(checkpoint_dir, index)) as f:
+                    finished[index] = json.load(f)
+            cell["checkpoint_path"] = _cell_path(checkpoint_dir, index)[:-len(".json")] + ".game.json"
+            cell["checkpoint_every"] = checkpoint_every
+    
+    # Rounds played before this run: those of finished matchups, and those saved in running games' checkpoints
+    resumed_rounds = 0
+    for index, cell in enumerate(cells):
+        if index in finished:
+            resumed_rounds += finished[index]["rows"][0]["rounds"]
+        elif checkpoint_dir is not None and os.path.exists(cell["checkpoint_path"]):
+            with open(cell["checkpoint_path"]) as f:
+                resumed_rounds += json.load(f)["rounds_played"]
+    
+    start = time.perf_counter()
+    rows = []
+    with ProcessPoolExecutor(max_workers = max_workers) as pool:
+        remaining = [cell for index, cell in enumerate(cells) if index not in finished]
+        results = pool.map(play_matchup, remaining, [strategy_factory] * len(remaining))
+        for index, cell in enumerate(cells):
+            if index in finished:
+                cell_rows, sim_id = finished[index]["rows"], finished[index]["sim_id"]
+            else:
+                cell_rows, sim_id = next(results), None
+                if verbose:
+                    print(" v. ".join(cell["knock_strategies"]), "done in", cell_rows[0]["elapsed_seconds"], "seconds")
+                if checkpoint_dir is not None:
+                    _write_json({"rows": cell_rows, "sim_id": None}, _cell_path(checkpoint_dir, index))
+                    os.remove(cell["checkpoint_path"])
+            if data_path is not None and sim_id is None:
+                # The cell file is written before its rows are appended, so a cell finished before a crash
+                # may have been appended without its sim_id being recorded
+                if index in finished:
+                    sim_id = stored_sim_id(cell_rows, data_path)
+                if sim_id is None:
+                    sim_id = append_results(cell_rows, data_path)
+                if checkpoint_dir is not None:
+                    _write_json({"rows": cell_rows, "sim_id": sim_id}, _cell_path(checkpoint_dir, index))
+            for row in cell_rows:
+                row["sim_id"] = sim_id
+            rows.append(cell_rows)
+    elapsed = time.perf_counter() - start
+    
+    total_rounds = sum(cell_rows[0]["rounds"] for cell_rows in rows)
+    played = total_rounds - resumed_rounds
+    return {"rows": rows, "rounds": total_rounds, "resumed_rounds": resumed_rounds, "elapsed_seconds": elapsed,
+            "rounds_per_second": played / elapsed if elapsed > 0 else float("inf")}